@@ -8,11 +8,16 @@ Responsibilities:
     - add_note
     - add_task
     - list_tasks
+    - complete_task
+    - remember
     - web_search
     - clarify
 
 - Uses GeminiClient for reasoning (LLM-based) if available.
 - Falls back to rule-based parsing if LLM fails.
+- The prompt file is a stable prefix (provider-cached where supported) and
+  only context + user text are sent per turn. Edits to the file are picked
+  up on the next call.
 
 Returns clean JSON dict with at least:
 {
@@ -20,24 +25,78 @@ Returns clean JSON dict with at least:
     "input": "...",
     "reasoning": "..."
 }
+
+Compound requests ("add task X, note Y and search Z") become a multi plan:
+{
+    "action": "multi",
+    "actions": [{"id": "1", "action": "...", "input": "...", "depends_on": []}, ...]
+}
+Steps without dependencies run concurrently in WorkerAgent.execute_plan.
+
+Plan calls use the "planner" generation profile (small max_tokens, stop after
+the closing brace); the truncated JSON is repaired before parsing.
+
+The LLM plan call must finish AGENT_ANSWER_RESERVE_S before the turn deadline;
+with less time left the rule-based plan is used directly.
 """
 
 import json
 import logging
+import re
 from pathlib import Path
 from agent.llm.gemini_client import GeminiClient
+from agent.tracing import span
+from agent.llm.usage import action_scope
+from agent.llm.generation import generation_scope, repair_json
+from agent.deadline import answer_reserve_s, deadline_scope, min_call_s, remaining
 
 logger = logging.getLogger(__name__)
 
+# Separator before a new command in a compound request: ", " / "; " / " and " / " then ".
+# Only splits when the next word starts a command, so "salt and pepper" stays whole.
+_COMMAND_START = r"(?:add\s+(?:a\s+)?(?:note|task)|note|remember|complete|finish|mark|list|show|search|find)\b"
+_SPLIT = re.compile(
+    r"\s*(?:;|,)\s*(?:and\s+)?(then\s+)?(?=" + _COMMAND_START + r")"
+    r"|\s+(?:and\s+)?(then)\s+(?=" + _COMMAND_START + r")"
+    r"|\s+and\s+(?=" + _COMMAND_START + r")",
+    re.IGNORECASE,
+)
+
+
+def normalize_plan(parsed) -> dict:
+    """Planner output → single-action dict, or {"action": "multi", "actions": [...]}."""
+    if isinstance(parsed, list):
+        parsed = {"actions": parsed}
+    if not isinstance(parsed, dict):
+        raise ValueError("Planner output must be a JSON object or list.")
+    steps = parsed.get("actions")
+    if steps is None:
+        if "action" not in parsed:
+            raise ValueError("Planner JSON missing 'action'.")
+        return parsed
+    if not isinstance(steps, list) or not steps or not all(isinstance(x, dict) and x.get("action") for x in steps):
+        raise ValueError("Planner 'actions' must be a non-empty list of steps with an action.")
+    if len(steps) == 1:
+        single = dict(steps[0])
+        single.pop("depends_on", None)
+        single.pop("id", None)
+        single.setdefault("reasoning", parsed.get("reasoning", ""))
+        return single
+    for i, step in enumerate(steps):
+        step.setdefault("id", str(i + 1))
+    return {"action": "multi", "actions": steps, "reasoning": parsed.get("reasoning", "")}
 
-def load_planner_prompt() -> str:
-    path = Path("agent/prompts/planner_prompt.txt")
+
+PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "planner_prompt.txt"
+
+
+def load_planner_prompt(path: Path = PROMPT_PATH) -> str:
     if path.exists():
         return path.read_text(encoding="utf-8")
     return (
         "You are a smart planner. Your job is to classify the user's intent and "
         "return a JSON dict with an action field.\n"
-        "Your options: answer_directly, add_note, add_task, list_tasks, web_search, clarify.\n"
+        "Your options: answer_directly, add_note, add_task, list_tasks, complete_task, remember, web_search, clarify.\n"
         "If unclear → return {\"action\": \"clarify\", \"input\": \"...\"}.\n"
     )
 
@@ -45,8 +104,24 @@ def load_planner_prompt() -> str:
 class SmartPlanner:
     def __init__(self, llm=None):
         self.llm = llm or GeminiClient()
+        self._prompt_mtime = self._stat_prompt()
         self.prompt_template = load_planner_prompt()
 
+    @staticmethod
+    def _stat_prompt():
+        try:
+            return PROMPT_PATH.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _prefix(self) -> str:
+        """Static part of every planner prompt; reloaded when the prompt file changes."""
+        mtime = self._stat_prompt()
+        if mtime != self._prompt_mtime:
+            self._prompt_mtime = mtime
+            self.prompt_template = load_planner_prompt()
+        return f"{self.prompt_template}\n\n"
+
     # -------------------------------------------------------------
     # Main planner call
     # -------------------------------------------------------------
@@ -56,56 +131,117 @@ class SmartPlanner:
         { "action": "...", "input": "...", "reasoning": "..." }
         """
 
-        prompt = (
-            f"{self.prompt_template}\n\n"
+        # not enough time for a plan call plus the answer: rules only
+        left = remaining()
+        if left is not None and left - answer_reserve_s() < min_call_s():
+            logger.info("SmartPlanner: %.2fs left, using rule-based plan", max(left, 0))
+            return self._fallback(user_input)
+
+        prefix = self._prefix()
+        suffix = (
             f"Context: {context or 'None'}\n"
             f"User: {user_input}\n"
             f"Return ONLY VALID JSON.\n"
         )
 
         try:
-            raw = self.llm.generate(prompt)
-            clean = raw.strip()
+            with action_scope("plan"), generation_scope("planner"), deadline_scope(None if left is None else left - answer_reserve_s()):
+                if isinstance(self.llm, GeminiClient):
+                    raw = self.llm.generate(suffix, prefix=prefix, cache_slot="planner")
+                else:
+                    raw = self.llm.generate(prefix + suffix)
 
-            # Strip code fences if LLM wrapped JSON
-            if clean.startswith("```"):
-                clean = clean.replace("```json", "").replace("```", "").strip()
+            with span("parse"):
+                clean = raw.strip()
 
-            parsed = json.loads(clean)
+                # Strip code fences if LLM wrapped JSON
+                if clean.startswith("```"):
+                    clean = clean.replace("```json", "").replace("```", "").strip()
 
-            if "action" not in parsed:
-                raise ValueError("Planner JSON missing 'action'.")
+                parsed = normalize_plan(json.loads(repair_json(clean)))
 
             return parsed
 
         except Exception as e:
-            logger.warning(f"SmartPlanner failed, falling back to rule-based: {e}")
+            logger.warning("SmartPlanner failed, falling back to rule-based: %s", e)
             return self._fallback(user_input)
 
     # -------------------------------------------------------------
     # Rule-based fallback
     # -------------------------------------------------------------
     def _fallback(self, text: str) -> dict:
+        plan = self._fallback_compound(text)
+        if plan is not None:
+            return plan
+        return self._fallback_one(text)
+
+    def _fallback_compound(self, text: str):
+        """Split "add task X, note Y and search Z" into steps; None if it is one request."""
+        parts, after_then, pos = [], [], 0
+        for m in _SPLIT.finditer(text):
+            parts.append(text[pos:m.start()])
+            after_then.append(bool(m.group(1) or m.group(2)))
+            pos = m.end()
+        if not parts:
+            return None
+        parts.append(text[pos:])
+
+        steps = []
+        for i, part in enumerate(parts):
+            step = self._fallback_one(part, compound=True)
+            step.pop("reasoning", None)
+            step["id"] = str(i + 1)
+            # "... then X": X waits for the previous step
+            step["depends_on"] = [str(i)] if i and after_then[i - 1] else []
+            steps.append(step)
+
+        # only a real compound when at least two parts are tool commands
+        if sum(1 for st in steps if st["action"] != "answer_directly") < 2:
+            return None
+        return {"action": "multi", "actions": steps, "reasoning": "Rule-based fallback"}
+
+    def _fallback_one(self, text: str, compound: bool = False) -> dict:
+        text = text.strip(" ,;.")
         t = text.lower().strip()
 
-        if t.startswith("add note:"):
+        # "add note: X" / "add a note X"; inside a compound also plain "note X"
+        m = re.match(r"add\s+(?:a\s+)?note\b[:\s]+(.+)" if not compound else
+                     r"(?:add\s+(?:a\s+)?)?note\b[:\s]+(.+)", text, re.IGNORECASE)
+        if m:
             return {
                 "action": "add_note",
-                "input": text.split(":", 1)[1].strip(),
+                "input": m.group(1).strip(),
                 "reasoning": "Rule-based fallback"
             }
 
-        if t.startswith("add task:"):
+        m = re.match(r"add\s+(?:a\s+)?task\b[:\s]+(.+)", text, re.IGNORECASE)
+        if m:
             return {
                 "action": "add_task",
-                "input": text.split(":", 1)[1].strip(),
+                "input": m.group(1).strip(),
+                "reasoning": "Rule-based fallback"
+            }
+
+        m = re.match(r"remember(?:\s+that)?[:\s]+(.+)", text.strip(), re.IGNORECASE)
+        if m:
+            return {
+                "action": "remember",
+                "input": m.group(1).strip(),
+                "reasoning": "Rule-based fallback"
+            }
+
+        m = re.match(r"(?:complete|finish|done|mark)\s+(?:task\s+)?#?(\d+)", t)
+        if m:
+            return {
+                "action": "complete_task",
+                "input": m.group(1),
                 "reasoning": "Rule-based fallback"
             }
 
-        if "list tasks" in t or "show tasks" in t:
+        if re.search(r"\b(list|show)\s+(?:my\s+)?(?:(pending|open|done|completed)\s+)?tasks\b", t):
             return {
                 "action": "list_tasks",
-                "input": "",
+                "input": t,
                 "reasoning": "Rule-based fallback"
             }
 
@@ -3,96 +3,181 @@
 WorkerAgent — executes actions decided by the SmartPlanner.
 
 Supported actions:
-- answer_directly  (uses GeminiClient which may fallback to OpenRouter)
+- answer_directly  (uses GeminiClient which may fallback to OpenRouter;
+                    relevant user facts are added to the prompt; tokens are
+                    streamed when a sink is active, see agent/llm/streaming.py;
+                    output length follows answer_profile(), see
+                    agent/llm/generation.py)
+- remember         (stores a long-term fact via FactsEngine)
 - add_note         (delegates to NotesEngine.add_note_raw)
-- add_task
-- list_tasks
-- list_notes       (delegates to NotesEngine.list_notes)
-- web_search       (placeholder)
+- add_task         (delegates to TasksEngine)
+- list_tasks       (filtered + paginated; input may name a status)
+- complete_task    (input: task id)
+- list_notes       (delegates to NotesEngine.list_notes_page; first page only)
+- web_search       (BM25 over the local corpus in CORPUS_DIR, see
+                    agent/tools/corpus_search.py; no network)
 - clarify
+- multi            (plan["actions"]: several steps, see execute_plan)
 
 Return format (successful):
     {"status": "ok", "action": "<action>", "output": <value>}
 
+Multi-action result ("output" holds one result dict per step, in plan order):
+    {"status": "ok" | "partial" | "error", "action": "multi", "output": [...]}
+
 Return format (error):
     {"status": "error", "error": "<message>"}
+
+Past the turn deadline (agent/deadline.py) no action is started and an answer
+cut short by it returns TIMEOUT_MESSAGE instead of an LLM error.
 """
 
-import json
-import os
+import contextvars
 import logging
-from typing import Any, Dict, Callable
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Callable, List
 
 from agent.notes_engine import NotesEngine
+from agent.tasks_engine import TasksEngine
+from agent.facts_engine import FactsEngine
 from agent.llm.gemini_client import GeminiClient
+from agent.llm.usage import action_scope
+from agent.llm.streaming import current_sink
+from agent.llm.generation import answer_profile, generation_scope
+from agent.listing import PAGE_SIZE
+from agent.tools.corpus_search import corpus_from_env
+from agent.tracing import span
+from agent.deadline import DeadlineExceeded, expired
 
 logger = logging.getLogger(__name__)
 
-# memory file base (used by tasks; notes handled by NotesEngine)
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-TASK_STORE = os.path.join(BASE_DIR, "memory", "memory_store.json")
+TIMEOUT_MESSAGE = "Sorry, that took too long — please try again."
 
+FACT_CACHE_SIZE = 64
 
-def _load_task_store() -> Dict[str, Any]:
-    # Ensure file exists and has tasks list
-    if not os.path.exists(os.path.dirname(TASK_STORE)):
-        os.makedirs(os.path.dirname(TASK_STORE), exist_ok=True)
-    if not os.path.exists(TASK_STORE):
-        with open(TASK_STORE, "w", encoding="utf-8") as f:
-            json.dump({"notes": [], "tasks": []}, f, indent=2, ensure_ascii=False)
-    try:
-        with open(TASK_STORE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.exception("Failed to load task store: %s", e)
-        return {"notes": [], "tasks": []}
+_step_pool = None
+_step_pool_lock = threading.Lock()
 
 
-def _save_task_store(data: Dict[str, Any]):
-    try:
-        with open(TASK_STORE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        logger.exception("Failed to save task store: %s", e)
+def step_pool() -> ThreadPoolExecutor:
+    """
+    Process-wide pool for the independent steps of multi-action plans. Shared by
+    every WorkerAgent, so idle threads do not multiply with the number of sessions
+    a server or worker process keeps. Steps never submit further work to it.
+    """
+    global _step_pool
+    with _step_pool_lock:
+        if _step_pool is None:
+            _step_pool = ThreadPoolExecutor(
+                max_workers=int(os.getenv("WORKER_MAX_PARALLEL", "4") or 4), thread_name_prefix="worker"
+            )
+        return _step_pool
+
+_STATUS_WORDS = {
+    "pending": "pending", "open": "pending", "todo": "pending", "outstanding": "pending",
+    "done": "done", "completed": "done", "finished": "done",
+}
+
+# What each action reads / writes in the memory store. Notes, tasks and facts share
+# one JSON file (load → modify → save), so writes never overlap each other, and a
+# read of a section waits for earlier writes to it.
+STEP_READS = {"list_notes": "notes", "list_tasks": "tasks", "answer_directly": "facts"}
+STEP_WRITES = {"add_note": "notes", "add_task": "tasks", "complete_task": "tasks", "remember": "facts"}
+MAX_PLAN_STEPS = 8
+
+
+def plan_levels(steps: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Group step indexes into levels: every step runs after all steps of earlier
+    levels, steps within a level run concurrently.
+
+    Order comes from explicit "depends_on" (step ids) plus implicit store
+    conflicts with earlier steps (see STEP_READS / STEP_WRITES).
+    Raises ValueError on unknown ids or cycles.
+    """
+    ids = {}
+    for i, step in enumerate(steps):
+        sid = str(step.get("id") or i + 1)
+        if sid in ids:
+            raise ValueError(f"Duplicate step id: {sid}")
+        ids[sid] = i
+
+    deps = []
+    for i, step in enumerate(steps):
+        d = set()
+        raw = step.get("depends_on") or []
+        for ref in [raw] if isinstance(raw, (str, int)) else raw:
+            if str(ref) not in ids:
+                raise ValueError(f"Step {i + 1} depends on unknown step {ref!r}")
+            d.add(ids[str(ref)])
+        action = step.get("action")
+        for j in range(i):
+            other = steps[j].get("action")
+            if action in STEP_WRITES and other in STEP_WRITES:
+                d.add(j)
+            elif STEP_READS.get(action) and STEP_READS.get(action) == STEP_WRITES.get(other):
+                d.add(j)
+        d.discard(i)
+        deps.append(d)
+
+    level_of: Dict[int, int] = {}
+    remaining = set(range(len(steps)))
+    levels: List[List[int]] = []
+    while remaining:
+        ready = sorted(i for i in remaining if deps[i] <= level_of.keys())
+        if not ready:
+            raise ValueError("Plan has a dependency cycle.")
+        for i in ready:
+            level_of[i] = len(levels)
+        remaining.difference_update(ready)
+        levels.append(ready)
+    return levels
 
 
 class WorkerAgent:
-    def __init__(self):
+    def __init__(self, store=None):
         # Notes engine (centralised note API)
-        self.notes = NotesEngine()
+        # store: a user's shard handle (agent/memory/shards.py); None → the shared memory file
+        self.notes = store.notes if store is not None else NotesEngine()
 
-        # Tasks live in the shared memory file (alongside notes)
-        self._store = _load_task_store()
+        # Tasks live in the memory file (alongside notes), indexed in memory
+        self.tasks = store.tasks if store is not None else TasksEngine()
+
+        # Long-term facts about the user; retrieval results cached for this session
+        self.facts = store.facts if store is not None else FactsEngine()
+        self._fact_cache: "OrderedDict[tuple, list]" = OrderedDict()
 
         # LLM client for generating direct answers
         self.llm = GeminiClient()
 
+        # Offline search index: build / refresh it in the background now, not in the first search
+        corpus_from_env()
+
+        # Independent steps of a multi-action plan run here (tools are I/O bound)
+        self._pool = step_pool()
+
         # tool map
         self.tools: Dict[str, Callable[[Any], Dict[str, Any]]] = {
             "add_note": self._add_note,
             "add_task": self._add_task,
             "list_tasks": self._list_tasks,
+            "complete_task": self._complete_task,
             "list_notes": self._list_notes,
             "web_search": self._web_search,
             "answer_directly": self._answer_directly,
+            "remember": self._remember,
             "clarify": self._clarify,
         }
 
-    # -------------------------
-    # Task helpers (persist to same file)
-    # -------------------------
-    @property
-    def tasks(self):
-        return self._store.get("tasks", [])
-
-    def _persist_tasks(self):
-        # keep notes untouched — NotesEngine handles notes persistence
-        # load current store to avoid stomping notes
-        store = _load_task_store()
-        store["tasks"] = self.tasks
-        _save_task_store(store)
-        # reload local copy
-        self._store = _load_task_store()
+    def bind_store(self, store):
+        """Switch to a (re)opened shard handle's engines."""
+        if store.facts is not self.facts:
+            self._fact_cache.clear()
+        self.notes, self.tasks, self.facts = store.notes, store.tasks, store.facts
 
     # -------------------------
     # Tool implementations
@@ -120,8 +205,8 @@ class WorkerAgent:
 
     def _list_notes(self, _: Any) -> Dict[str, Any]:
         try:
-            notes = self.notes.list_notes()
-            return {"status": "ok", "action": "list_notes", "output": notes}
+            page = self.notes.list_notes_page(limit=PAGE_SIZE)
+            return {"status": "ok", "action": "list_notes", "output": page}
         except Exception as e:
             logger.exception("Failed to list notes: %s", e)
             return {"status": "error", "error": str(e)}
@@ -137,35 +222,82 @@ class WorkerAgent:
             return {"status": "error", "error": "Empty task text."}
 
         try:
-            tasks = self._store.setdefault("tasks", [])
-            new = {"id": (max((t.get("id", 0) for t in tasks), default=0) + 1), "text": txt.strip(), "done": False}
-            tasks.append(new)
-            self._persist_tasks()
+            new = self.tasks.add_task(txt)
             return {"status": "ok", "action": "add_task", "output": new}
         except Exception as e:
             logger.exception("Failed to add task: %s", e)
             return {"status": "error", "error": str(e)}
 
-    def _list_tasks(self, _: Any) -> Dict[str, Any]:
+    def _list_tasks(self, arg: Any) -> Dict[str, Any]:
+        """
+        arg: string ("pending tasks", "done") or dict with status / limit / cursor.
+        Returns one page: {"items": [...], "next_cursor": ..., "total": ...}
+        """
+        status, limit, cursor = None, PAGE_SIZE, None
+        if isinstance(arg, dict):
+            status = arg.get("status")
+            limit = arg.get("limit") or limit
+            cursor = arg.get("cursor")
+        else:
+            for word in re.findall(r"[a-z]+", str(arg or "").lower()):
+                if word in _STATUS_WORDS:
+                    status = _STATUS_WORDS[word]
+                    break
+
         try:
-            tasks = self._store.get("tasks", [])
-            return {"status": "ok", "action": "list_tasks", "output": tasks}
+            page = self.tasks.list_tasks(status=status, limit=limit, cursor=cursor)
+            page["status"] = status
+            return {"status": "ok", "action": "list_tasks", "output": page}
         except Exception as e:
             logger.exception("Failed to list tasks: %s", e)
             return {"status": "error", "error": str(e)}
 
+    def _complete_task(self, arg: Any) -> Dict[str, Any]:
+        raw = (arg.get("id") or arg.get("input")) if isinstance(arg, dict) else arg
+        m = re.search(r"\d+", str(raw or ""))
+        if not m:
+            return {"status": "error", "error": "Which task? Give its number, e.g. 'complete task 3'."}
+
+        try:
+            task = self.tasks.complete_task(int(m.group()))
+            if task is None:
+                return {"status": "error", "error": f"No task #{m.group()}."}
+            return {"status": "ok", "action": "complete_task", "output": task}
+        except Exception as e:
+            logger.exception("Failed to complete task: %s", e)
+            return {"status": "error", "error": str(e)}
+
+    def _remember(self, text: Any) -> Dict[str, Any]:
+        txt = text.get("input") if isinstance(text, dict) else str(text or "")
+        if not txt.strip():
+            return {"status": "error", "error": "Nothing to remember."}
+        try:
+            fact = self.facts.add_fact(txt)
+            return {"status": "ok", "action": "remember", "output": fact}
+        except Exception as e:
+            logger.exception("Failed to store fact: %s", e)
+            return {"status": "error", "error": str(e)}
+
+    def _relevant_facts(self, question: str) -> list:
+        """Top-k facts for this question, cached per session until the fact store changes."""
+        key = (self.facts.version, question.lower())
+        facts = self._fact_cache.get(key)
+        if facts is None:
+            facts = self.facts.relevant(question)
+            self._fact_cache[key] = facts
+            if len(self._fact_cache) > FACT_CACHE_SIZE:
+                self._fact_cache.popitem(last=False)
+        else:
+            self._fact_cache.move_to_end(key)
+        return facts
+
     def _web_search(self, query: Any) -> Dict[str, Any]:
-        # Placeholder; keep signature compatible for planner tests
+        """Top-k documents from the local corpus: [{"title", "snippet", "link", "score"}, ...]."""
         q = query.get("input") if isinstance(query, dict) else str(query or "")
-        return {
-            "status": "ok",
-            "action": "web_search",
-            "output": [{
-                "title": f"Dummy search result for '{q}'",
-                "snippet": "This is a placeholder search result.",
-                "link": "https://example.com"
-            }]
-        }
+        if not q.strip():
+            return {"status": "error", "error": "Nothing to search for."}
+        k = int(os.getenv("WEB_SEARCH_TOP_K", "5") or 5)
+        return {"status": "ok", "action": "web_search", "output": corpus_from_env().search(q, k=k)}
 
     def _answer_directly(self, plan: Any) -> Dict[str, Any]:
         """
@@ -185,15 +317,36 @@ class WorkerAgent:
             if not user_text:
                 return {"status": "ok", "action": "answer_directly", "output": "I didn't receive a clear question. Please repeat."}
 
+            # Only the facts relevant to this question (bounded by FACTS_TOKEN_BUDGET)
+            try:
+                facts = self._relevant_facts(user_text)
+            except Exception as e:
+                logger.warning("Fact lookup failed: %s", e)
+                facts = []
+            about_user = ""
+            if facts:
+                about_user = "About the user:\n" + "\n".join(f"- {f}" for f in facts) + "\n\n"
+
             # Build minimal prompt that avoids tool/meta leak and asks for clean answer
             prompt = (
                 "You are a helpful, concise assistant. Answer directly and briefly.\n\n"
+                f"{about_user}"
                 f"Context:\n{context}\n\n"
                 f"Question:\n{user_text}\n\n"
                 "Return ONLY the answer text (no JSON, no tags)."
             )
 
-            resp = self.llm.generate(prompt)
+            sink = current_sink()
+            with generation_scope(answer_profile(user_text)):
+                if sink is not None and hasattr(self.llm, "generate_stream"):
+                    # a streaming front-end is listening: forward tokens as they arrive
+                    pieces = []
+                    for piece in self.llm.generate_stream(prompt):
+                        pieces.append(piece)
+                        sink(piece)
+                    resp = "".join(pieces)
+                else:
+                    resp = self.llm.generate(prompt)
             answer = (resp or "").strip()
 
             if not answer:
@@ -201,6 +354,9 @@ class WorkerAgent:
 
             return {"status": "ok", "action": "answer_directly", "output": answer}
 
+        except DeadlineExceeded as e:
+            logger.warning("Answer cancelled: %s", e)
+            return {"status": "error", "error": TIMEOUT_MESSAGE}
         except Exception as e:
             logger.exception("Answer generation failed: %s", e)
             return {"status": "error", "error": f"LLM error: {e}"}
@@ -224,6 +380,12 @@ class WorkerAgent:
         if not isinstance(plan, dict):
             return {"status": "error", "error": "Plan must be a dict."}
 
+        if expired():
+            return {"status": "error", "error": TIMEOUT_MESSAGE}
+
+        if plan.get("action") == "multi" or "actions" in plan:
+            return self.execute_plan(plan)
+
         action = plan.get("action")
         if not action:
             return {"status": "error", "error": "Plan missing 'action'."}
@@ -233,14 +395,71 @@ class WorkerAgent:
             return {"status": "error", "error": f"Unknown action: {action}"}
 
         try:
-            # For answer_directly we pass the whole plan so fn can use context
-            if action == "answer_directly":
-                return fn(plan)
-            # For list_notes we don't need an input argument
-            if action == "list_notes":
-                return fn(None)
-            # For other actions, pass the input
-            return fn(plan.get("input", ""))
+            with action_scope(action):
+                # For answer_directly we pass the whole plan so fn can use context
+                if action == "answer_directly":
+                    return fn(plan)
+                # For list_notes we don't need an input argument
+                if action == "list_notes":
+                    return fn(None)
+                # For other actions, pass the input
+                return fn(plan.get("input", ""))
         except Exception as e:
             logger.exception("Worker execution error for action %s: %s", action, e)
             return {"status": "error", "error": str(e)}
+
+    def execute_plan(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a multi-action plan: {"actions": [{"id", "action", "input", "depends_on"}, ...]}.
+
+        Steps are grouped by plan_levels(); each level runs in the thread pool,
+        so a compound request takes about as long as its slowest chain of steps.
+        A step whose dependency failed is skipped. Results are merged in plan order.
+        """
+        steps = plan.get("actions")
+        if not isinstance(steps, list) or not steps or not all(isinstance(s, dict) for s in steps):
+            return {"status": "error", "error": "Plan 'actions' must be a non-empty list of steps."}
+        if len(steps) > MAX_PLAN_STEPS:
+            return {"status": "error", "error": f"Too many actions in one plan (max {MAX_PLAN_STEPS})."}
+        try:
+            levels = plan_levels(steps)
+        except ValueError as e:
+            return {"status": "error", "error": str(e)}
+
+        ids = [str(s.get("id") or i + 1) for i, s in enumerate(steps)]
+        results: List[Dict[str, Any]] = [None] * len(steps)
+        failed = set()
+
+        for level in levels:
+            running = {}
+            for i in level:
+                step = dict(steps[i])
+                step.setdefault("context", plan.get("context", ""))
+                raw = step.get("depends_on") or []
+                blocked = [r for r in ([raw] if isinstance(raw, (str, int)) else raw) if str(r) in failed]
+                if blocked:
+                    results[i] = {"status": "error", "action": step.get("action"),
+                                  "error": f"Skipped: step {blocked[0]} failed."}
+                    failed.add(ids[i])
+                    continue
+                # copy_context: request id / session / action attribution follow each step
+                ctx = contextvars.copy_context()
+                running[i] = self._pool.submit(ctx.run, self._run_step, step)
+            for i, fut in running.items():
+                results[i] = fut.result()
+                results[i].setdefault("action", steps[i].get("action"))
+                if results[i].get("status") != "ok":
+                    failed.add(ids[i])
+
+        ok = sum(1 for r in results if r.get("status") == "ok")
+        status = "ok" if ok == len(results) else "partial" if ok else "error"
+        merged = {"status": status, "action": "multi", "output": results}
+        if status == "error":
+            merged["error"] = "; ".join(r.get("error", "failed") for r in results)
+        return merged
+
+    def _run_step(self, step: Dict[str, Any]) -> Dict[str, Any]:
+        if step.get("action") == "multi" or "actions" in step:
+            return {"status": "error", "error": "Nested multi-action plans are not supported."}
+        with span("step", action=step.get("action")):
+            return self.execute(step)
@@ -8,6 +8,8 @@ class Config:
         # --- Planner LLM (Gemini) ---
         self.gemini_key = os.getenv("GEMINI_API_KEY")
         self.gemini_model = os.getenv("GEMINI_MODEL", "models/gemini-2.0-flash")
+        # optional endpoint override (e.g. the local stub server in agent/llm/stub_server.py)
+        self.gemini_base_url = os.getenv("GEMINI_BASE_URL")
         if not self.gemini_key:
             raise RuntimeError("GEMINI_API_KEY missing in .env (required for SmartPlanner)")
 
@@ -0,0 +1,131 @@
+# Path: agent/context_buffer.py
+"""
+Fixed-capacity ring buffer of conversation turns.
+
+Replaces the old list of "role: text" strings:
+- O(1) append (oldest turn is overwritten once full; no re-slicing)
+- last(n) returns a zero-copy view over the newest n turns
+- iter_role("assistant") filters by role without re-parsing prefixes
+- each Turn caches its token estimate once, at append time
+"""
+
+import time
+from typing import Iterator, List, Optional
+
+from agent.llm.usage import estimate_tokens
+
+
+class Turn:
+    __slots__ = ("role", "text", "ts", "tokens")
+
+    def __init__(self, role: str, text: str, ts: Optional[float] = None, tokens: Optional[int] = None):
+        self.role = role
+        self.text = text
+        self.ts = time.time() if ts is None else ts
+        self.tokens = estimate_tokens(text) if tokens is None else tokens
+
+    def __str__(self) -> str:
+        return f"{self.role}: {self.text}"
+
+    def __repr__(self) -> str:
+        return f"Turn({self.role!r}, {self.text[:30]!r})"
+
+
+class ContextView:
+    """Read-only window over the newest `len` turns of a ContextBuffer (no copying)."""
+
+    __slots__ = ("_buf", "_offset", "_len")
+
+    def __init__(self, buf: "ContextBuffer", n: int):
+        self._buf = buf
+        self._len = max(0, min(n, len(buf)))
+        self._offset = len(buf) - self._len
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __getitem__(self, i: int) -> Turn:
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("context view index out of range")
+        return self._buf[self._offset + i]
+
+    def __iter__(self) -> Iterator[Turn]:
+        for i in range(self._len):
+            yield self._buf[self._offset + i]
+
+    def join(self, sep: str = " | ") -> str:
+        return sep.join(str(t) for t in self)
+
+
+class ContextBuffer:
+    __slots__ = ("_items", "_capacity", "_head", "_size", "appended")
+
+    def __init__(self, capacity: int = 20):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self._items: List[Optional[Turn]] = [None] * capacity
+        self._capacity = capacity
+        self._head = 0      # index of the oldest turn
+        self._size = 0
+        self.appended = 0   # total turns ever appended (monotonic; used for incremental saves)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __getitem__(self, i: int) -> Turn:
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError("context index out of range")
+        return self._items[(self._head + i) % self._capacity]
+
+    def __iter__(self) -> Iterator[Turn]:
+        for i in range(self._size):
+            yield self._items[(self._head + i) % self._capacity]
+
+    def append(self, role: str, text: str, ts: Optional[float] = None) -> Turn:
+        turn = Turn(role, text, ts)
+        self.append_turn(turn)
+        return turn
+
+    def append_turn(self, turn: Turn):
+        self.appended += 1
+        if self._size < self._capacity:
+            self._items[(self._head + self._size) % self._capacity] = turn
+            self._size += 1
+        else:
+            self._items[self._head] = turn
+            self._head = (self._head + 1) % self._capacity
+
+    def last(self, n: int) -> ContextView:
+        return ContextView(self, n)
+
+    def iter_role(self, role: str, last: Optional[int] = None) -> Iterator[Turn]:
+        turns = self.last(last) if last is not None else self
+        return (t for t in turns if t.role == role)
+
+    def token_count(self, last: Optional[int] = None) -> int:
+        turns = self.last(last) if last is not None else self
+        return sum(t.tokens for t in turns)
+
+    def clear(self):
+        self._items = [None] * self._capacity
+        self._head = 0
+        self._size = 0
+        self.appended = 0
+
+    def lines(self) -> List[str]:
+        """Legacy "role: text" strings (for callers that still expect List[str])."""
+        return [str(t) for t in self]
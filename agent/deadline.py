@@ -0,0 +1,102 @@
+# Path: agent/deadline.py
+"""
+Per-turn deadlines, propagated through contextvars.
+
+MainAgent opens a deadline_scope for every turn (AGENT_TURN_BUDGET_S). Every
+stage below reads what is left instead of using its own fixed timeout:
+
+    with deadline_scope(30):                 # MainAgent._turn
+        with deadline_scope(remaining() - 5):   # planner keeps 5s for the answer
+            ...
+        timeout_for(30)                      # LLM client: min(30, time left)
+
+- Scopes only ever shorten the deadline (an inner scope cannot extend it).
+- timeout_for() raises DeadlineExceeded once the budget is spent, so a call
+  that cannot finish in time is never started.
+- The deadline follows work into threads that copy the context (speculative
+  answers, multi-action steps).
+
+Environment:
+    AGENT_TURN_BUDGET_S=30        hard upper bound per turn (0 disables)
+    AGENT_ANSWER_RESERVE_S=5      planner leaves this much for the answer call
+    AGENT_MIN_CALL_S=0.5          don't start an LLM call with less time than this
+"""
+
+import contextvars
+import os
+import time
+from typing import Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("agent_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The turn's time budget is spent."""
+
+
+def turn_budget_s() -> Optional[float]:
+    budget = float(os.getenv("AGENT_TURN_BUDGET_S", "30") or 0)
+    return budget if budget > 0 else None
+
+
+def answer_reserve_s() -> float:
+    return float(os.getenv("AGENT_ANSWER_RESERVE_S", "5") or 0)
+
+
+def min_call_s() -> float:
+    return float(os.getenv("AGENT_MIN_CALL_S", "0.5") or 0)
+
+
+class deadline_scope:
+    """Limit the work inside the block to `budget_s` seconds (None: keep the current deadline)."""
+
+    __slots__ = ("budget_s", "_token")
+
+    def __init__(self, budget_s: Optional[float]):
+        self.budget_s = budget_s
+        self._token = None
+
+    def __enter__(self) -> Optional[float]:
+        current = _deadline.get()
+        if self.budget_s is not None:
+            at = time.monotonic() + max(0.0, self.budget_s)
+            current = at if current is None else min(current, at)
+        self._token = _deadline.set(current)
+        return current
+
+    def __exit__(self, exc_type, exc, tb):
+        _deadline.reset(self._token)
+        return False
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left (may be <= 0), or None without a deadline."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(stage: str = "turn"):
+    if expired():
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+def timeout_for(cap: Optional[float] = None, stage: str = "call") -> Optional[float]:
+    """
+    Timeout for one blocking call: the smaller of `cap` and the time left.
+    Raises DeadlineExceeded when less than AGENT_MIN_CALL_S remains.
+    """
+    left = remaining()
+    if left is None:
+        return cap
+    if left < min_call_s():
+        raise DeadlineExceeded(f"Deadline exceeded before {stage} ({max(left, 0):.2f}s left)")
+    return left if cap is None else min(cap, left)
@@ -0,0 +1,115 @@
+# Path: agent/dedup_index.py
+"""
+Near-duplicate detection for notes: 64-bit SimHash + banded LSH.
+
+- simhash(text): weighted fingerprint over words and word bigrams; similar
+  texts differ in few bits (Hamming distance).
+- SimHashIndex: the fingerprint is split into `bands` blocks, each block keyed
+  in its own hash table. Two fingerprints within `max_distance` bits share at
+  least one identical block when max_distance < bands (pigeonhole), so a query
+  only compares against the notes in its own buckets — no scan of the store.
+
+Defaults (8 bands of 8 bits, distance ≤ 7) catch re-saves of the same
+summary, punctuation/case changes and small edits to longer notes; unrelated
+64-bit fingerprints land within 7 bits with probability ~1e-10.
+"""
+
+import hashlib
+import re
+from typing import Dict, Hashable, List, Set, Tuple
+
+BITS = 64
+_MASK = (1 << BITS) - 1
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _features(text: str) -> Dict[str, int]:
+    words = _WORD.findall((text or "").lower())
+    feats: Dict[str, int] = {}
+    for w in words:
+        feats[w] = feats.get(w, 0) + 1
+    for a, b in zip(words, words[1:]):
+        k = f"{a} {b}"
+        feats[k] = feats.get(k, 0) + 1
+    return feats
+
+
+def _hash64(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def simhash(text: str) -> int:
+    weights = [0] * BITS
+    for feat, count in _features(text).items():
+        h = _hash64(feat)
+        for i in range(BITS):
+            weights[i] += count if (h >> i) & 1 else -count
+    fp = 0
+    for i, w in enumerate(weights):
+        if w > 0:
+            fp |= 1 << i
+    return fp
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & _MASK).bit_count()
+
+
+class SimHashIndex:
+    def __init__(self, bands: int = 8, max_distance: int = 7):
+        if BITS % bands:
+            raise ValueError("bands must divide 64")
+        if max_distance >= bands:
+            raise ValueError("max_distance must be < bands for banded lookup to be exact")
+        self.bands = bands
+        self.max_distance = max_distance
+        self._width = BITS // bands
+        self._band_mask = (1 << self._width) - 1
+        self._tables: List[Dict[int, Set[Hashable]]] = [{} for _ in range(bands)]
+        self._fps: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._fps)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._fps
+
+    def _blocks(self, fp: int):
+        for i in range(self.bands):
+            yield i, (fp >> (i * self._width)) & self._band_mask
+
+    def add(self, key: Hashable, fp: int):
+        if key in self._fps:
+            self.remove(key)
+        self._fps[key] = fp
+        for i, block in self._blocks(fp):
+            self._tables[i].setdefault(block, set()).add(key)
+
+    def remove(self, key: Hashable):
+        fp = self._fps.pop(key, None)
+        if fp is None:
+            return
+        for i, block in self._blocks(fp):
+            bucket = self._tables[i].get(block)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._tables[i][block]
+
+    def query(self, fp: int) -> List[Tuple[Hashable, int]]:
+        """Keys within max_distance of fp, closest first."""
+        candidates: Set[Hashable] = set()
+        for i, block in self._blocks(fp):
+            candidates |= self._tables[i].get(block, set())
+        hits = []
+        for key in candidates:
+            d = hamming(fp, self._fps[key])
+            if d <= self.max_distance:
+                hits.append((key, d))
+        hits.sort(key=lambda kv: kv[1])
+        return hits
+
+    def clear(self):
+        for t in self._tables:
+            t.clear()
+        self._fps.clear()
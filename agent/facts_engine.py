@@ -0,0 +1,180 @@
+# Path: agent/facts_engine.py
+"""
+FactsEngine — long-term facts about the user, indexed for retrieval.
+
+Fact record:
+    {"id": int, "text": str, "kind": "preference" | "fact", "created_at": iso8601}
+
+- Inverted index (term → fact ids) with IDF weighting: relevant(query) only
+  scores facts sharing a term with the query, never the whole store.
+- Preferences ("I prefer…", "call me…", "always/never…") apply to every
+  question, so the newest few are always offered first.
+- Results are cut to a token budget, so prompt size stays flat no matter how
+  many facts are stored.
+- Near-duplicate facts are rejected on add (SimHash, as for notes).
+
+Persistence via agent/memory/memory_store.json ("facts", shared with notes
+and tasks). The index is rebuilt only when the store file changes on disk.
+
+Environment:
+    FACTS_TOP_K=5   FACTS_TOKEN_BUDGET=200
+"""
+
+import heapq
+import math
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+import agent.notes_engine as notes_store
+from agent.dedup_index import SimHashIndex, simhash
+from agent.llm.usage import estimate_tokens
+from agent.summarizer import STOPWORDS
+from agent.tracing import span
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+_PREFERENCE = re.compile(
+    r"\b(prefer|prefers|preferred|like|likes|dislike|dislikes|always|never|call me|my name|"
+    r"i am|i'm|i work|i live|favou?rite)\b"
+)
+MAX_PREFERENCES = 3
+
+
+def _terms(text: str) -> Set[str]:
+    return {w for w in _WORD.findall((text or "").lower()) if w not in STOPWORDS and (len(w) > 1 or w.isdigit())}
+
+
+def classify(text: str) -> str:
+    return "preference" if _PREFERENCE.search((text or "").lower()) else "fact"
+
+
+class FactsEngine:
+    def __init__(self, top_k: Optional[int] = None, token_budget: Optional[int] = None,
+                 path: Optional[str] = None):
+        self.path = path                # None → the shared store (MEM_PATH)
+        self.top_k = top_k or int(os.getenv("FACTS_TOP_K", "5") or 5)
+        self.token_budget = token_budget or int(os.getenv("FACTS_TOKEN_BUDGET", "200") or 200)
+        self.version = 0                    # bumps on every change (callers key caches on it)
+        self._facts: Dict[int, Dict] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._prefs: List[int] = []         # preference ids, oldest first
+        self._dedup = SimHashIndex(max_distance=3)     # facts are short: stay close to exact repeats
+        self._mtime = None
+        self._load()
+
+    # --------------------------------------------
+    # Load / persist
+    # --------------------------------------------
+    def _load(self):
+        store = notes_store._load_store(self.path)
+        self._facts.clear()
+        self._postings.clear()
+        self._prefs.clear()
+        self._dedup.clear()
+        raws = store.get("facts", [])
+        # legacy facts (plain strings, or dicts without an id) are numbered after every explicit id
+        explicit = (r["id"] for r in raws if isinstance(r, dict) and isinstance(r.get("id"), int))
+        next_id = max(explicit, default=0) + 1
+        for raw in raws:
+            fact = raw if isinstance(raw, dict) else {"text": str(raw)}   # legacy: plain strings
+            if not isinstance(fact.get("id"), int):
+                fact["id"] = next_id
+                next_id += 1
+            fact.setdefault("kind", classify(fact.get("text", "")))
+            fact.setdefault("created_at", "")
+            self._index(fact)
+        self._mtime = self._stat()
+        self.version += 1
+
+    def _stat(self):
+        return notes_store.store_signature(self.path)
+
+    def _refresh(self):
+        """Pick up facts written by another process (cheap stat; reload only on change)."""
+        if self._stat() != self._mtime:
+            self._load()
+
+    def _index(self, fact: Dict):
+        self._facts[fact["id"]] = fact
+        for t in _terms(fact["text"]):
+            self._postings.setdefault(t, set()).add(fact["id"])
+        if fact.get("kind") == "preference":
+            self._prefs.append(fact["id"])
+        self._dedup.add(fact["id"], simhash(fact["text"]))
+
+    def _persist(self):
+        with span("store", kind="facts"):
+            store = notes_store._load_store(self.path)
+            store["facts"] = list(self._facts.values())
+            notes_store._save_store(store, self.path)
+        self._mtime = self._stat()
+
+    # --------------------------------------------
+    # Public API
+    # --------------------------------------------
+    def add_fact(self, text: str) -> Dict:
+        """Returns the stored fact; a near-duplicate returns the existing one flagged "duplicate"."""
+        text = (text or "").strip()
+        if not text:
+            raise ValueError("Empty fact.")
+        with notes_store.store_lock(self.path):
+            self._refresh()
+            for fact_id, _ in self._dedup.query(simhash(text)):
+                return dict(self._facts[fact_id], duplicate=True)
+
+            fact = {
+                "id": max(self._facts, default=0) + 1,
+                "text": text,
+                "kind": classify(text),
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            self._index(fact)
+            self._persist()
+        self.version += 1
+        return fact
+
+    def list_facts(self) -> List[Dict]:
+        self._refresh()
+        return list(self._facts.values())
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Dict]:
+        """Top-k facts by IDF-weighted term overlap with the query."""
+        self._refresh()
+        k = k or self.top_k
+        n = len(self._facts)
+        scores: Dict[int, float] = {}
+        for t in _terms(query):
+            ids = self._postings.get(t)
+            if not ids:
+                continue
+            idf = math.log((1 + n) / (1 + len(ids))) + 1
+            for fid in ids:
+                scores[fid] = scores.get(fid, 0.0) + idf
+        best = heapq.nlargest(k, scores.items(), key=lambda kv: (kv[1], kv[0]))
+        return [self._facts[fid] for fid, _ in best]
+
+    def relevant(self, query: str, k: Optional[int] = None, token_budget: Optional[int] = None) -> List[str]:
+        """
+        Facts to put in front of the answer model: the newest preferences, then
+        the facts most relevant to `query`, until `token_budget` is spent.
+        """
+        self._refresh()
+        budget = token_budget or self.token_budget
+        k = k or self.top_k
+
+        picked: List[str] = []
+        seen: Set[int] = set()
+        used = 0
+        candidates = [self._facts[i] for i in reversed(self._prefs[-MAX_PREFERENCES:])]
+        candidates += self.search(query, k)
+        for fact in candidates:
+            if fact["id"] in seen or len(picked) >= k + MAX_PREFERENCES:
+                continue
+            cost = estimate_tokens(fact["text"]) + 2
+            if used + cost > budget:
+                continue
+            seen.add(fact["id"])
+            picked.append(fact["text"])
+            used += cost
+        return picked
@@ -0,0 +1,96 @@
+# Path: agent/listing.py
+"""
+Lazy, paginated listings for notes and tasks.
+
+A Listing wraps a page fetcher — fetch(cursor, limit) → {"items", "next_cursor",
+"total"} — and only pulls the next page when asked ("more" / "next page").
+Each page is rendered as a PageStream: an iterable of display lines (so the CLI
+can print as it goes) plus a one-line summary, which is all MainAgent keeps in
+the conversation context.
+
+Environment:
+    AGENT_PAGE_SIZE=20
+"""
+
+import os
+from typing import Callable, Dict, Iterator, Optional
+
+PAGE_SIZE = int(os.getenv("AGENT_PAGE_SIZE", "20") or 20)
+
+MORE_COMMANDS = {"more", "next", "next page", "show more", "more please", "continue listing"}
+
+
+def is_more_cmd(text: str) -> bool:
+    return (text or "").lower().strip(" .!") in MORE_COMMANDS
+
+
+class PageStream:
+    """One rendered page. Iterate for lines; str() joins them."""
+
+    __slots__ = ("listing", "page", "start")
+
+    def __init__(self, listing: "Listing", page: Dict, start: int):
+        self.listing = listing
+        self.page = page
+        self.start = start      # 1-based position of the first item in the listing
+
+    def __iter__(self) -> Iterator[str]:
+        items = self.page["items"]
+        if not items:
+            yield f"You have no {self.listing.label}."
+            return
+        render = self.listing.render
+        for item in items:
+            yield render(item)
+        if self.page.get("next_cursor") is not None:
+            yield f"(showing {self.start}-{self.end} of {self.page['total']} {self.listing.label} — say 'more' for the next page)"
+
+    def __str__(self) -> str:
+        return "\n".join(self)
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.page["items"]) - 1
+
+    @property
+    def summary(self) -> str:
+        """Short line for the conversation context (never the items themselves)."""
+        total = self.page["total"]
+        if not self.page["items"]:
+            return f"Listed {self.listing.label}: none."
+        more = "; more available" if self.page.get("next_cursor") is not None else ""
+        return f"Listed {self.listing.label} {self.start}-{self.end} of {total}{more}."
+
+
+class Listing:
+    def __init__(self, label: str, fetch: Callable[[Optional[int], int], Dict], render: Callable[[Dict], str],
+                 page_size: int = PAGE_SIZE, first_page: Optional[Dict] = None):
+        self.label = label
+        self.fetch = fetch
+        self.render = render
+        self.page_size = page_size
+        self._pending = first_page      # already fetched by the caller (e.g. the worker)
+        self._cursor: Optional[int] = None
+        self._shown = 0
+        self.exhausted = False
+
+    def next_page(self) -> Optional[PageStream]:
+        """Fetch (or reuse) the next page; None once the listing is exhausted."""
+        if self.exhausted:
+            return None
+        page, self._pending = self._pending, None
+        if page is None:
+            page = self.fetch(self._cursor, self.page_size)
+        self._cursor = page.get("next_cursor")
+        if self._cursor is None:
+            self.exhausted = True
+        stream = PageStream(self, page, self._shown + 1)
+        self._shown += len(page["items"])
+        return stream
+
+    def __iter__(self) -> Iterator[PageStream]:
+        while True:
+            stream = self.next_page()
+            if stream is None:
+                return
+            yield stream
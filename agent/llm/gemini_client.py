@@ -8,17 +8,44 @@ Uses config.py to decide:
 - provider = "dual" → try Gemini first, fallback to OpenRouter
 
 Exposes:
-    generate(prompt: str) -> str
+    generate(prompt: str, prefix: str = "") -> str
+    generate_stream(prompt: str, prefix: str = "") -> Iterator[str]
+
+A stable `prefix` (e.g. planner instructions) is sent through Gemini context
+caching when possible (agent/llm/prompt_cache.py); otherwise, and for
+OpenRouter, the prefix is simply prepended / sent as the system message.
+
+With LLM_CACHE_MODE set, generate() / generate_stream() are served from the
+persistent response cache (agent/llm/response_cache.py), keyed by provider
+setting, models, generation profile and prompt.
+
+Output length, temperature and stop sequences follow the active generation
+profile (agent/llm/generation.py).
+
+Every call is bounded by LLM_TIMEOUT_S and by the turn deadline
+(agent/deadline.py); past the deadline no fallback call is attempted.
 """
 
 import logging
+import os
+import time
+from typing import Iterator
 from agent.config import config
+from agent.tracing import span
+from agent.llm.usage import estimate_tokens, tracker as usage_tracker
+from agent.llm.rate_limiter import limiters
+from agent.llm.single_flight import flights, prompt_key
+from agent.llm.prompt_cache import PromptCache
+from agent.deadline import DeadlineExceeded, expired, timeout_for
+from agent.llm.generation import current_profile
+from agent.llm.response_cache import response_cache_from_env
 
 logger = logging.getLogger(__name__)
 
 # Try importing google.genai
 try:
     import google.genai as genai
+    from google.genai import types as genai_types
     GENAI_AVAILABLE = True
 except Exception:
     GENAI_AVAILABLE = False
@@ -32,11 +59,22 @@ class GeminiClient:
         self.provider = config.provider  # gemini / openrouter / dual
         self.gemini_key = config.gemini_key
         self.gemini_model = config.gemini_model
+        self.gemini_base_url = config.gemini_base_url
         self.or_key = config.openrouter_key
         self.or_model = config.openrouter_model
 
         self.client = None
         self.mode = None
+        self.prompt_cache: PromptCache = None
+
+        # per-call cap; the turn deadline can only shorten it
+        self.timeout_s = float(os.getenv("LLM_TIMEOUT_S", "30") or 30)
+
+        # on-disk response cache (None unless LLM_CACHE_MODE is set)
+        self.response_cache = response_cache_from_env()
+
+        # coalesce identical concurrent prompts (LLM_SINGLE_FLIGHT=0 disables)
+        self.single_flight = os.getenv("LLM_SINGLE_FLIGHT", "1").lower() not in {"0", "false", "no", "off"}
 
         # ----------------------------
         # Decide which engine to activate
@@ -73,11 +111,18 @@ class GeminiClient:
             return False
 
         try:
-            self.client = genai.Client(api_key=self.gemini_key)
+            if self.gemini_base_url:
+                self.client = genai.Client(
+                    api_key=self.gemini_key,
+                    http_options={"base_url": self.gemini_base_url}
+                )
+            else:
+                self.client = genai.Client(api_key=self.gemini_key)
             self.mode = "gemini"
+            self.prompt_cache = PromptCache(self.client, self.gemini_model)
             return True
         except Exception as e:
-            logger.warning(f"Gemini init failed: {e}")
+            logger.warning("Gemini init failed: %s", e)
             if require_key:
                 raise
             return False
@@ -93,7 +138,7 @@ class GeminiClient:
             self.mode = "openrouter"
             return True
         except Exception as e:
-            logger.error(f"OpenRouter init failed: {e}")
+            logger.error("OpenRouter init failed: %s", e)
             if require_key:
                 raise
             return False
@@ -101,26 +146,100 @@ class GeminiClient:
     # ----------------------------------------------------
     # GENERATE
     # ----------------------------------------------------
-    def generate(self, prompt: str) -> str:
+    def _cache_model(self) -> str:
+        # stable across a gemini → openrouter fallback, so recordings replay
+        return f"{self.gemini_model}|{self.or_model}"
+
+    def generate(self, prompt: str, prefix: str = "", cache_slot: str = "default") -> str:
         prompt = prompt or ""
+        if self.response_cache is None:
+            return self._generate_shared(prompt, prefix, cache_slot)
+        return self.response_cache.call(self.provider, self._cache_model(), prefix, prompt,
+                                        lambda: self._generate_shared(prompt, prefix, cache_slot))
+
+    def _generate_shared(self, prompt: str, prefix: str, cache_slot: str) -> str:
+        if not self.single_flight:
+            return self._generate(prompt, prefix, cache_slot)
+        model = self.gemini_model if self.mode == "gemini" else self.or_model
+        key = prompt_key(self.mode, model, current_profile().name, prefix, prompt)
+        return flights.do(key, self._generate, prompt, prefix, cache_slot)
+
+    def _call_config(self, stage: str, **kwargs):
+        """
+        GenerateContentConfig for the active generation profile, with an HTTP
+        timeout of what is left of the turn (capped at LLM_TIMEOUT_S).
+        """
+        timeout = timeout_for(self.timeout_s, stage=stage)
+        profile = current_profile()
+        return genai_types.GenerateContentConfig(
+            http_options=genai_types.HttpOptions(timeout=max(1, int(timeout * 1000))),
+            max_output_tokens=profile.max_tokens,
+            temperature=profile.temperature,
+            stop_sequences=list(profile.stop) or None,
+            **kwargs,
+        )
+
+    def _gemini_call(self, prompt: str, prefix: str, cache_slot: str):
+        """Suffix-only call against a cached prefix; full prompt when no handle is available."""
+        handle = self.prompt_cache.handle(prefix, cache_slot) if prefix and self.prompt_cache else None
+        if handle:
+            try:
+                return self.client.models.generate_content(
+                    model=self.gemini_model,
+                    contents=[{"parts": [{"text": prompt}]}],
+                    config=self._call_config("gemini call", cached_content=handle),
+                )
+            except Exception as e:
+                if getattr(e, "code", None) not in (400, 403, 404):
+                    raise
+                # handle expired or was deleted server-side: drop it and resend in full
+                logger.info("Cached prefix %s rejected (%s); resending full prompt", handle, e)
+                self.prompt_cache.forget(handle)
+        return self.client.models.generate_content(
+            model=self.gemini_model,
+            contents=[{"parts": [{"text": prefix + prompt}]}],
+            config=self._call_config("gemini call"),
+        )
 
+    def _generate(self, prompt: str, prefix: str = "", cache_slot: str = "default") -> str:
         # ------------------
         # GEMINI MODE
         # ------------------
         if self.mode == "gemini":
+            limiter = limiters.get("gemini", self.gemini_model)
+            est_tokens = estimate_tokens(prefix + prompt) + current_profile().max_tokens
             try:
-                response = self.client.models.generate_content(
-                    model=self.gemini_model,
-                    contents=[{"parts": [{"text": prompt}]}]
+                limiter.acquire(est_tokens)
+                started = time.perf_counter()
+                with span("llm", provider="gemini", model=self.gemini_model):
+                    response = self._gemini_call(prompt, prefix, cache_slot)
+                text = response.text
+                meta = getattr(response, "usage_metadata", None)
+                limiter.settle(est_tokens, getattr(meta, "total_token_count", None))
+                usage_tracker.record(
+                    "gemini", self.gemini_model,
+                    getattr(meta, "prompt_token_count", None),
+                    getattr(meta, "candidates_token_count", None),
+                    (time.perf_counter() - started) * 1000,
+                    prompt=prefix + prompt, completion=text or "",
                 )
-                return response.text
+                return text
             except Exception as e:
-                logger.error(f"Gemini generate failed: {e}")
+                logger.error("Gemini generate failed: %s", e)
+                if getattr(e, "code", None) == 429:
+                    # quota hit: pause other queued Gemini calls briefly
+                    limiter.backoff(1.0)
+
+                # out of time: no fallback call, the turn is over
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                if expired():
+                    raise DeadlineExceeded(f"Gemini call cancelled at deadline: {e}") from e
 
                 # fallback if dual
                 if self.provider == "dual" and self.or_key:
                     self._init_openrouter(require_key=True)
-                    return self.client.generate(prompt)
+                    return self.client.complete(prompt, prefix)
 
                 raise
 
@@ -128,7 +247,70 @@ class GeminiClient:
         # OPENROUTER MODE
         # ------------------
         elif self.mode == "openrouter":
-            return self.client.generate(prompt)
+            return self.client.complete(prompt, prefix)
 
         else:
             raise RuntimeError("GeminiClient: no active mode")
+
+    # ----------------------------------------------------
+    # STREAMING (answer tokens for agent/server.py; no single-flight, no prefix cache)
+    # ----------------------------------------------------
+    def generate_stream(self, prompt: str, prefix: str = "") -> Iterator[str]:
+        prompt = prompt or ""
+        if self.response_cache is None:
+            return self._stream(prompt, prefix)
+        return self.response_cache.stream(self.provider, self._cache_model(), prefix, prompt,
+                                          lambda: self._stream(prompt, prefix))
+
+    def _stream(self, prompt: str, prefix: str) -> Iterator[str]:
+        if self.mode == "openrouter":
+            yield from self.client.generate_stream(prompt, prefix)
+            return
+        if self.mode != "gemini":
+            raise RuntimeError("GeminiClient: no active mode")
+
+        limiter = limiters.get("gemini", self.gemini_model)
+        est_tokens = estimate_tokens(prefix + prompt) + current_profile().max_tokens
+        pieces, meta = [], None
+        limiter.acquire(est_tokens)
+        started = time.perf_counter()
+        try:
+            with span("llm", provider="gemini", model=self.gemini_model):
+                stream = self.client.models.generate_content_stream(
+                    model=self.gemini_model,
+                    contents=[{"parts": [{"text": prefix + prompt}]}],
+                    config=self._call_config("gemini stream"),
+                )
+                for chunk in stream:
+                    if expired():
+                        stream.close()
+                        raise DeadlineExceeded("Gemini stream cancelled at deadline")
+                    meta = getattr(chunk, "usage_metadata", None) or meta
+                    piece = chunk.text
+                    if piece:
+                        pieces.append(piece)
+                        yield piece
+        except Exception as e:
+            logger.error("Gemini stream failed: %s", e)
+            if getattr(e, "code", None) == 429:
+                limiter.backoff(1.0)
+            if isinstance(e, DeadlineExceeded):
+                raise
+            if expired():
+                raise DeadlineExceeded(f"Gemini stream cancelled at deadline: {e}") from e
+            # nothing sent yet: fall back like generate() does
+            if not pieces and self.provider == "dual" and self.or_key:
+                self._init_openrouter(require_key=True)
+                yield from self.client.generate_stream(prompt, prefix)
+                return
+            raise
+        finally:
+            if pieces or meta is not None:
+                limiter.settle(est_tokens, getattr(meta, "total_token_count", None))
+                usage_tracker.record(
+                    "gemini", self.gemini_model,
+                    getattr(meta, "prompt_token_count", None),
+                    getattr(meta, "candidates_token_count", None),
+                    (time.perf_counter() - started) * 1000,
+                    prompt=prefix + prompt, completion="".join(pieces),
+                )
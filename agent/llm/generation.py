@@ -0,0 +1,156 @@
+# Path: agent/llm/generation.py
+"""
+Per-call generation profiles (max tokens, temperature, stop sequences).
+
+Output tokens dominate LLM latency, so each kind of call asks for only as many
+as it needs:
+
+    planner   small JSON plan; generation stops after the closing brace
+    short     factual / one-line answers
+    explain   "explain / compare / how do I ..." questions
+    default   anything without a profile (summaries, tools)
+
+The profile is ambient, like action_scope in agent/llm/usage.py:
+
+    with generation_scope("planner"):
+        llm.generate(prompt)            # both clients read current_profile()
+
+answer_profile(query) picks "short" or "explain" from simple query features.
+The planner's stop sequence drops the closing brace, and a plan cut off by
+max_tokens may be missing some closers; repair_json() closes open strings,
+arrays and objects before parsing.
+
+Environment:
+    LLM_GENERATION_PROFILES=1       0 → every call uses "default"
+    LLM_MAX_TOKENS_PLANNER=256
+    LLM_MAX_TOKENS_SHORT=192
+    LLM_MAX_TOKENS_EXPLAIN=1024
+    LLM_MAX_TOKENS_DEFAULT=512
+"""
+
+import contextvars
+import os
+import re
+from typing import Optional, Tuple
+
+
+class GenerationProfile:
+    __slots__ = ("name", "max_tokens", "temperature", "stop")
+
+    def __init__(self, name: str, max_tokens: int, temperature: float, stop: Tuple[str, ...] = ()):
+        self.name = name
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop = stop
+
+    def __repr__(self):
+        return f"GenerationProfile({self.name!r}, max_tokens={self.max_tokens}, temperature={self.temperature})"
+
+
+# name -> (max_tokens, temperature, stop sequences)
+# "}\n\n" ends a plan (single line or pretty-printed); "\n```" ends a fenced one.
+_DEFAULTS = {
+    "planner": (256, 0.0, ("}\n\n", "\n```")),
+    "short": (192, 0.2, ()),
+    "explain": (1024, 0.3, ()),
+    "default": (512, 0.2, ()),
+}
+
+_profile: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_generation_profile", default=None)
+
+
+def profiles_enabled() -> bool:
+    return os.getenv("LLM_GENERATION_PROFILES", "1").lower() not in {"0", "false", "no", "off"}
+
+
+def get_profile(name: Optional[str]) -> GenerationProfile:
+    if not profiles_enabled() or name not in _DEFAULTS:
+        name = "default"
+    max_tokens, temperature, stop = _DEFAULTS[name]
+    max_tokens = int(os.getenv(f"LLM_MAX_TOKENS_{name.upper()}", max_tokens) or max_tokens)
+    return GenerationProfile(name, max_tokens, temperature, stop)
+
+
+def current_profile() -> GenerationProfile:
+    return get_profile(_profile.get())
+
+
+class generation_scope:
+    """Tag LLM calls inside the block with a generation profile."""
+
+    __slots__ = ("name", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._token = None
+
+    def __enter__(self):
+        self._token = _profile.set(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _profile.reset(self._token)
+        return False
+
+
+# -------------------------------------------------------------
+# Choosing a profile
+# -------------------------------------------------------------
+_EXPLAIN = re.compile(
+    r"\b(explain|describe|why|how (?:do|does|can|to|should|would)|compare|difference|differences|"
+    r"versus|vs\.?|pros and cons|step[- ]by[- ]step|steps|guide|tutorial|overview|elaborate|detail|detailed|"
+    r"in depth|write|draft|summari[sz]e|example|examples|outline|plan for)\b",
+    re.IGNORECASE,
+)
+_LONG_QUESTION_WORDS = 25
+
+
+def answer_profile(query: str) -> str:
+    """'explain' for open-ended questions, 'short' for factual / one-line ones."""
+    text = query or ""
+    if _EXPLAIN.search(text) or len(text.split()) > _LONG_QUESTION_WORDS:
+        return "explain"
+    return "short"
+
+
+# -------------------------------------------------------------
+# JSON repair for stop-sequence / max_tokens truncation
+# -------------------------------------------------------------
+def repair_json(text: str) -> str:
+    """
+    Trim to the first "{" or "[" (a plan may be a bare list of steps) and
+    close whatever is still open (string, arrays, objects); a trailing comma
+    is dropped first.
+    Well-formed JSON is returned unchanged apart from surrounding text.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    text = text[start:]
+
+    closers, in_string, escaped = [], False, False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if closers:
+                closers.pop()
+            if not closers:
+                return text[:i + 1]
+
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1].rstrip()
+    return text + "".join(reversed(closers))
@@ -2,39 +2,137 @@
 OpenRouter minimal client wrapper.
 
 Expects OPENROUTER_API_KEY in env (or .env loaded by your config)
+
+max_tokens / temperature / stop come from the active generation profile
+(agent/llm/generation.py). generate() goes through the persistent response
+cache when LLM_CACHE_MODE is set (agent/llm/response_cache.py); complete() is
+the uncached call.
 """
 
 import os
+import time
 import requests
 import json
 
+from agent.tracing import current_request_id, span
+from agent.llm.usage import estimate_tokens, tracker as usage_tracker
+from agent.llm.rate_limiter import limiters, parse_retry_after
+from agent.deadline import DeadlineExceeded, expired, remaining, timeout_for
+from agent.llm.generation import current_profile
+from agent.llm.response_cache import response_cache_from_env
+
 class OpenRouterClient:
     def __init__(self):
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         # pick a reasonable default model; user can override via env
         self.model = os.getenv("OPENROUTER_MODEL", "gpt-4o-mini")  # set a safe default name; change as needed
         self.url = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+        # 429s are retried after Retry-After (the shared limiter pauses other callers too)
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
+        # per-call cap; the turn deadline (agent/deadline.py) can only shorten it
+        self.timeout_s = float(os.getenv("LLM_TIMEOUT_S", "30") or 30)
+        # on-disk response cache (None unless LLM_CACHE_MODE is set)
+        self.response_cache = response_cache_from_env()
 
         if not self.api_key:
             raise RuntimeError("OPENROUTER_API_KEY missing in environment")
 
-    def generate(self, prompt: str) -> str:
+    def _request(self, prompt: str, prefix: str, stream: bool = False):
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        request_id = current_request_id()
+        if request_id:
+            headers["X-Request-ID"] = request_id
+        profile = current_profile()
         data = {
             "model": self.model,
-            "messages": [
+            "messages": (
+                [{"role": "system", "content": prefix}] if prefix else []
+            ) + [
                 {"role": "user", "content": prompt}
             ],
-            # keep default params lightweight
-            "max_tokens": 512,
-            "temperature": 0.2
+            "max_tokens": profile.max_tokens,
+            "temperature": profile.temperature,
         }
-        resp = requests.post(self.url, headers=headers, json=data, timeout=30)
+        if profile.stop:
+            data["stop"] = list(profile.stop)
+        if stream:
+            data["stream"] = True
+        limiter = limiters.get("openrouter", self.model)
+        est_tokens = estimate_tokens(prefix + prompt) + data["max_tokens"]
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire(est_tokens)
+            timeout = timeout_for(self.timeout_s, stage="openrouter call")
+            started = time.perf_counter()
+            with span("llm", provider="openrouter", model=self.model):
+                try:
+                    resp = requests.post(self.url, headers=headers, json=data, timeout=timeout, stream=stream)
+                except requests.Timeout as e:
+                    if expired():
+                        raise DeadlineExceeded(f"OpenRouter call cancelled at deadline: {e}") from e
+                    raise
+            if resp.status_code == 429 and attempt < self.max_retries:
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                limiter.backoff(retry_after)
+                left = remaining()
+                if left is None or left > retry_after:
+                    continue
+            break
         if resp.status_code != 200:
             raise RuntimeError(f"OpenRouter API error: {resp.text}")
+        return resp, limiter, est_tokens, started
+
+    def generate_stream(self, prompt: str, prefix: str = ""):
+        """Yields the completion piece by piece (server-sent events); usage is recorded at the end."""
+        resp, limiter, est_tokens, started = self._request(prompt, prefix, stream=True)
+        pieces, usage, model = [], {}, self.model
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                if expired():
+                    # closing the response (finally) cancels the HTTP call
+                    raise DeadlineExceeded("OpenRouter stream cancelled at deadline")
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    event = json.loads(payload)
+                except ValueError:
+                    continue
+                usage = event.get("usage") or usage
+                model = event.get("model") or model
+                for choice in event.get("choices") or []:
+                    piece = (choice.get("delta") or {}).get("content")
+                    if piece:
+                        pieces.append(piece)
+                        yield piece
+        finally:
+            resp.close()
+            text = "".join(pieces)
+            limiter.settle(est_tokens, usage.get("total_tokens"))
+            usage_tracker.record(
+                "openrouter", model,
+                usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                (time.perf_counter() - started) * 1000, prompt=prefix + prompt, completion=text,
+            )
+
+    def generate(self, prompt: str, prefix: str = "") -> str:
+        """
+        prefix: stable instructions, sent as a separate system message so
+        providers with automatic prefix caching can reuse it across calls.
+        """
+        if self.response_cache is None:
+            return self.complete(prompt, prefix)
+        return self.response_cache.call("openrouter", self.model, prefix, prompt,
+                                        lambda: self.complete(prompt, prefix))
+
+    def complete(self, prompt: str, prefix: str = "") -> str:
+        """One provider call, bypassing the response cache."""
+        resp, limiter, est_tokens, started = self._request(prompt, prefix)
+        latency_ms = (time.perf_counter() - started) * 1000
         j = resp.json()
         # Expect "choices"[0]["message"]["content"] or choices[0].get("message",{}).get("content")
         try:
@@ -42,4 +140,12 @@ class OpenRouterClient:
         except Exception:
             # fallback to other possible shapes
             text = j["choices"][0].get("text") if j.get("choices") else ""
+
+        usage = j.get("usage") or {}
+        limiter.settle(est_tokens, usage.get("total_tokens"))
+        usage_tracker.record(
+            "openrouter", j.get("model") or self.model,
+            usage.get("prompt_tokens"), usage.get("completion_tokens"),
+            latency_ms, prompt=prefix + prompt, completion=text or "",
+        )
         return text or ""
@@ -0,0 +1,166 @@
+# Path: agent/llm/prompt_cache.py
+"""
+Provider-side caching of a stable prompt prefix (Gemini context caching).
+
+Callers split a prompt into a large prefix that rarely changes (e.g. the
+planner instructions) and a small per-turn suffix. The prefix is uploaded once
+as a CachedContent handle with a TTL; later calls send only the suffix plus the
+handle name, so the provider neither re-bills nor re-reads the prefix.
+
+- handle(prefix, slot) returns a live handle name, or None → caller resends
+  the full prompt (transparent fallback).
+- TTL refresh: a handle close to expiry is extended (caches.update) instead of
+  re-created.
+- Invalidation: handles are keyed by a hash of the prefix. When a slot's prefix
+  changes (prompt file edited) the old handle is deleted.
+- Creation failures back off for a while (no retry storm), and a handle the
+  provider no longer knows is dropped via forget(name).
+- Prefixes below the provider's minimum cacheable size are never uploaded.
+
+Environment:
+    LLM_PROMPT_CACHE=1               enable (default on)
+    GEMINI_CACHE_TTL_S=3600
+    GEMINI_CACHE_MIN_TOKENS=1024     provider minimum (model dependent)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from agent.llm.usage import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+try:
+    from google.genai import types as genai_types
+    GENAI_TYPES_AVAILABLE = True
+except Exception:
+    GENAI_TYPES_AVAILABLE = False
+
+FAILURE_BACKOFF_S = 600.0
+
+
+class _Handle:
+    __slots__ = ("name", "key", "expires")
+
+    def __init__(self, name: str, key: str, expires: float):
+        self.name = name
+        self.key = key
+        self.expires = expires
+
+
+class PromptCache:
+    def __init__(self, client, model: str, ttl_s: Optional[float] = None, min_tokens: Optional[int] = None,
+                 refresh_margin_s: float = 60.0, enabled: Optional[bool] = None):
+        self.client = client
+        self.model = model
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("GEMINI_CACHE_TTL_S", "3600"))
+        self.min_tokens = min_tokens if min_tokens is not None else int(os.getenv("GEMINI_CACHE_MIN_TOKENS", "1024"))
+        self.refresh_margin_s = min(refresh_margin_s, self.ttl_s / 2)
+        if enabled is None:
+            enabled = os.getenv("LLM_PROMPT_CACHE", "1").lower() not in {"0", "false", "no", "off"}
+        self.enabled = enabled and GENAI_TYPES_AVAILABLE and hasattr(client, "caches")
+
+        self._slots: Dict[str, _Handle] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "creates": 0, "refreshes": 0, "fallbacks": 0, "errors": 0, "invalidations": 0}
+
+    @staticmethod
+    def _key(model: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model}\x00{prefix}".encode("utf-8")).hexdigest()
+
+    def handle(self, prefix: str, slot: str = "default") -> Optional[str]:
+        if not self.enabled or not prefix or estimate_tokens(prefix) < self.min_tokens:
+            return None
+
+        key = self._key(self.model, prefix)
+        with self._lock:
+            now = time.monotonic()
+            current = self._slots.get(slot)
+
+            if current is not None and current.key != key:
+                # prefix changed (prompt edited): the old handle is dead weight
+                self._delete(current)
+                self._slots.pop(slot, None)
+                self.stats["invalidations"] += 1
+                current = None
+
+            if current is not None:
+                if now < current.expires - self.refresh_margin_s:
+                    self.stats["hits"] += 1
+                    return current.name
+                if now < current.expires and self._refresh(current, now):
+                    self.stats["hits"] += 1
+                    return current.name
+                self._slots.pop(slot, None)
+
+            if self._failed_until.get(key, 0.0) > now:
+                self.stats["fallbacks"] += 1
+                return None
+
+            created = self._create(prefix, key, slot, now)
+            if created is None:
+                self.stats["fallbacks"] += 1
+                return None
+            self._slots[slot] = created
+            return created.name
+
+    def forget(self, name: str):
+        """Provider rejected a handle (expired / deleted server-side): stop using it."""
+        with self._lock:
+            for slot, h in list(self._slots.items()):
+                if h.name == name:
+                    del self._slots[slot]
+
+    def invalidate(self, slot: Optional[str] = None):
+        with self._lock:
+            slots = [slot] if slot else list(self._slots)
+            for s in slots:
+                h = self._slots.pop(s, None)
+                if h is not None:
+                    self._delete(h)
+                    self.stats["invalidations"] += 1
+
+    # --------------------------------------------
+    # Provider calls (made under the lock: one upload per prefix, not one per caller)
+    # --------------------------------------------
+    def _create(self, prefix: str, key: str, slot: str, now: float) -> Optional[_Handle]:
+        try:
+            cached = self.client.caches.create(
+                model=self.model,
+                config=genai_types.CreateCachedContentConfig(
+                    system_instruction=prefix,
+                    ttl=f"{int(self.ttl_s)}s",
+                    display_name=f"agent-{slot}",
+                ),
+            )
+            self.stats["creates"] += 1
+            return _Handle(cached.name, key, now + self.ttl_s)
+        except Exception as e:
+            self.stats["errors"] += 1
+            self._failed_until[key] = now + FAILURE_BACKOFF_S
+            logger.info("Prompt cache create failed (resending full prompt for %.0fs): %s", FAILURE_BACKOFF_S, e)
+            return None
+
+    def _refresh(self, h: _Handle, now: float) -> bool:
+        try:
+            self.client.caches.update(
+                name=h.name, config=genai_types.UpdateCachedContentConfig(ttl=f"{int(self.ttl_s)}s")
+            )
+            h.expires = now + self.ttl_s
+            self.stats["refreshes"] += 1
+            return True
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.info("Prompt cache refresh failed for %s: %s", h.name, e)
+            return False
+
+    def _delete(self, h: _Handle):
+        try:
+            self.client.caches.delete(name=h.name)
+        except Exception as e:
+            logger.debug("Prompt cache delete failed for %s: %s", h.name, e)
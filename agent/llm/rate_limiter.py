@@ -0,0 +1,261 @@
+# Path: agent/llm/rate_limiter.py
+"""
+Client-side rate limiting and priority scheduling for LLM calls.
+
+One ProviderLimiter per provider (or provider:model) holds two token buckets:
+- requests per second
+- tokens per minute (estimated before the call, settled with real usage after)
+
+Callers queue in priority order (INTERACTIVE before BATCH, then FIFO) and only
+the head of the queue may take capacity, so interactive turns jump ahead of
+batch work (MainAgent.handle_many). The queue is bounded: when full, the lowest-priority
+waiter is shed (RateLimitExceeded) to make room for a more important call, or
+the new call itself is rejected.
+
+A provider 429 calls backoff(retry_after), pausing the whole limiter instead
+of letting every queued caller hit the same wall.
+
+Waiting is bounded by the caller's timeout, or else by the turn deadline
+(agent/deadline.py): a call that cannot get capacity in time fails fast.
+
+Configuration (env, JSON):
+    LLM_RATE_LIMITS='{"gemini": {"rps": 10, "tpm": 1000000, "max_queue": 64},
+                      "openrouter:meta-llama/llama-3.1-70b-instruct": {"rps": 5}}'
+Unconfigured providers are unlimited (no queueing overhead).
+"""
+
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from agent.deadline import remaining
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BATCH = 1
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when a call is shed from (or cannot enter) a full queue, or times out waiting."""
+
+
+class priority_scope:
+    __slots__ = ("priority", "_token")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self._token = None
+
+    def __enter__(self):
+        self._token = _priority.set(self.priority)
+        return self.priority
+
+    def __exit__(self, exc_type, exc, tb):
+        _priority.reset(self._token)
+        return False
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class TokenBucket:
+    """Not thread-safe on its own; ProviderLimiter guards it."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float, now: float) -> float:
+        self._refill(now)
+        n = min(n, self.capacity)    # oversize requests wait for a full bucket, never forever
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+    def take(self, n: float):
+        self.tokens -= min(n, self.capacity)
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "tokens", "shed")
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.shed = False
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, rps: Optional[float] = None, tpm: Optional[float] = None, max_queue: int = 64):
+        self.name = name
+        self.requests = TokenBucket(rps, max(1.0, rps)) if rps else None
+        self.tokens = TokenBucket(tpm / 60.0, tpm) if tpm else None
+        self.max_queue = max_queue
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._paused_until = 0.0
+        self.stats = {"acquired": 0, "shed": 0, "rejected": 0, "timeouts": 0, "backoffs": 0}
+
+    # --------------------------------------------
+    def acquire(self, est_tokens: int = 0, priority: Optional[int] = None, timeout: Optional[float] = None):
+        prio = current_priority() if priority is None else priority
+        if timeout is None:
+            timeout = remaining()       # turn deadline, if any
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            ticket = _Ticket(prio, next(self._seq), est_tokens)
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue)
+                if worst.priority <= prio:
+                    self.stats["rejected"] += 1
+                    raise RateLimitExceeded(f"{self.name}: queue full ({self.max_queue})")
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                worst.shed = True
+                self.stats["shed"] += 1
+            heapq.heappush(self._queue, ticket)
+            self._cond.notify_all()
+
+            try:
+                while True:
+                    if ticket.shed:
+                        raise RateLimitExceeded(f"{self.name}: shed for higher-priority work")
+                    now = time.monotonic()
+                    wait = 0.0
+                    if self._queue[0] is ticket:
+                        wait = max(
+                            self._paused_until - now,
+                            self.requests.wait_time(1, now) if self.requests else 0.0,
+                            self.tokens.wait_time(ticket.tokens, now) if self.tokens else 0.0,
+                        )
+                        if wait <= 0:
+                            if self.requests:
+                                self.requests.take(1)
+                            if self.tokens:
+                                self.tokens.take(ticket.tokens)
+                            heapq.heappop(self._queue)
+                            self.stats["acquired"] += 1
+                            self._cond.notify_all()
+                            return
+                    if deadline is not None:
+                        left = deadline - now
+                        if left <= 0:
+                            self.stats["timeouts"] += 1
+                            raise RateLimitExceeded(f"{self.name}: timed out waiting for capacity")
+                        wait = min(wait, left) if wait else left
+                    self._cond.wait(wait or None)
+            except BaseException:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                raise
+
+    def settle(self, est_tokens: int, actual_tokens: Optional[int]):
+        """Correct the TPM bucket once the provider reports real usage."""
+        if not self.tokens or actual_tokens is None:
+            return
+        with self._cond:
+            self.tokens.tokens -= (actual_tokens - est_tokens)
+
+    def backoff(self, seconds: float):
+        """Provider said 429: pause everyone for Retry-After seconds."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, seconds))
+            self.stats["backoffs"] += 1
+            self._cond.notify_all()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+
+class _Unlimited:
+    """Fast path for unconfigured providers."""
+
+    name = "unlimited"
+    stats: Dict[str, int] = {}
+    queue_depth = 0
+
+    def acquire(self, est_tokens: int = 0, priority: Optional[int] = None, timeout: Optional[float] = None):
+        return None
+
+    def settle(self, est_tokens: int, actual_tokens: Optional[int]):
+        return None
+
+    def backoff(self, seconds: float):
+        return None
+
+
+_UNLIMITED = _Unlimited()
+
+
+class RateLimiterRegistry:
+    def __init__(self, limits: Optional[Dict[str, Dict]] = None):
+        self.limits = limits if limits is not None else self._from_env()
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _from_env() -> Dict[str, Dict]:
+        raw = os.getenv("LLM_RATE_LIMITS")
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            logger.warning("Ignoring invalid LLM_RATE_LIMITS: %s", e)
+            return {}
+
+    def get(self, provider: str, model: str = ""):
+        key = f"{provider}:{model}" if f"{provider}:{model}" in self.limits else provider
+        cfg = self.limits.get(key)
+        if not cfg:
+            return _UNLIMITED
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    limiter = ProviderLimiter(
+                        key, rps=cfg.get("rps"), tpm=cfg.get("tpm"), max_queue=int(cfg.get("max_queue", 64))
+                    )
+                    self._limiters[key] = limiter
+        return limiter
+
+    def configure(self, limits: Dict[str, Dict]):
+        with self._lock:
+            self.limits = limits
+            self._limiters.clear()
+
+
+limiters = RateLimiterRegistry()
+
+
+def parse_retry_after(value, default: float = 1.0) -> float:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,235 @@
+# Path: agent/llm/response_cache.py
+"""
+Persistent, content-addressed cache of LLM responses (SQLite).
+
+Key = sha256 of (provider, model(s), generation profile, prefix, prompt), so
+a different model, max_tokens / temperature / stop or prompt never reuses an
+answer. Entries survive restarts and are shared by every process that opens
+the same file (WAL mode), e.g. the workers of agent/worker_pool.py.
+
+Modes (LLM_CACHE_MODE):
+    off            no cache (default)
+    record         always call the provider, store the response
+    replay         serve from the cache only; a miss raises CacheMiss
+                   (deterministic, offline runs of recorded flows)
+    read-through   serve hits, call + store on a miss (production)
+
+Eviction:
+- TTL: entries older than LLM_CACHE_TTL_S are ignored and purged
+  (replay ignores the TTL: a recording never goes stale).
+- Size: when stored responses exceed LLM_CACHE_MAX_MB, the least recently
+  used entries are deleted down to 90% of the limit, so a full cache does
+  not evict on every write.
+- Cost per write stays O(log n): the byte total is a running count
+  (re-synced from the table every RESYNC_PUTS writes, since other processes
+  write the same file) and expired rows are swept through an index at most
+  every SWEEP_INTERVAL_S.
+
+Empty responses are never stored. Streaming calls are served from the cache
+as a single chunk and recorded once the stream completes.
+
+Environment:
+    LLM_CACHE_MODE=off
+    LLM_CACHE_PATH=data/llm_cache.sqlite3
+    LLM_CACHE_TTL_S=604800        0 → never expire
+    LLM_CACHE_MAX_MB=256
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from agent.llm.generation import current_profile
+from agent.llm.single_flight import prompt_key
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "record", "replay", "read-through")
+RESYNC_PUTS = 256
+SWEEP_INTERVAL_S = 60.0
+LOW_WATER = 0.9
+
+
+class CacheMiss(LookupError):
+    """Replay mode: the call was not recorded."""
+
+
+class ResponseCache:
+    def __init__(self, path: str, mode: str = "read-through", ttl_s: float = 7 * 86400,
+                 max_bytes: int = 256 * 1024 * 1024):
+        if mode not in MODES or mode == "off":
+            raise ValueError(f"Unknown cache mode: {mode!r} (expected one of {MODES[1:]})")
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.mode = mode
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " provider TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " response TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created)")
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+        self._bytes = self._total()
+        self._puts = 0
+        self._next_sweep = 0.0
+
+    # --------------------------------------------
+    # Keys
+    # --------------------------------------------
+    @staticmethod
+    def key(provider: str, model: str, prefix: str, prompt: str) -> str:
+        p = current_profile()
+        return prompt_key("llm-cache/1", provider, model, p.max_tokens, p.temperature, p.stop, prefix, prompt)
+
+    # --------------------------------------------
+    # Storage
+    # --------------------------------------------
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created, size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            if self.mode != "replay" and self.ttl_s and now - row[1] > self.ttl_s:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bytes -= row[2]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+            return row[0]
+
+    def put(self, key: str, provider: str, model: str, response: str):
+        if not response:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, created, accessed, size, response)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, now, now, size, response),
+            )
+            self._bytes += size - (old[0] if old else 0)
+            self._puts += 1
+            self.stats["stores"] += 1
+            self._evict(now)
+
+    def _total(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self, now: float):
+        if self.ttl_s and self.mode != "replay" and now >= self._next_sweep:
+            self._next_sweep = now + min(SWEEP_INTERVAL_S, self.ttl_s)
+            cutoff = now - self.ttl_s
+            count, freed = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE created < ?", (cutoff,)
+            ).fetchone()
+            if count:
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+                self._bytes -= freed
+                self.stats["expired"] += count
+        if not self.max_bytes:
+            return
+        if self._puts % RESYNC_PUTS == 0 or self._bytes > self.max_bytes:
+            self._bytes = self._total()         # other processes write the same file
+        if self._bytes <= self.max_bytes:
+            return
+        # drop least recently used rows down to the low-water mark (headroom for the next writes)
+        target = int(self.max_bytes * LOW_WATER)
+        freed, doomed = 0, []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            doomed.append((key,))
+            freed += size
+            if self._bytes - freed <= target:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._bytes -= freed
+        self.stats["evicted"] += len(doomed)
+
+    def size(self) -> Tuple[int, int]:
+        """(entries, stored response bytes)"""
+        with self._lock:
+            return tuple(self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --------------------------------------------
+    # Call wrappers
+    # --------------------------------------------
+    def call(self, provider: str, model: str, prefix: str, prompt: str, fn: Callable[[], str]) -> str:
+        """Run `fn` (one provider call) according to the cache mode."""
+        key = self.key(provider, model, prefix, prompt)
+        if self.mode != "record":
+            hit = self.get(key)
+            if hit is not None:
+                return hit
+            if self.mode == "replay":
+                raise CacheMiss(f"No recorded response for {provider}:{model} (key {key[:12]})")
+        text = fn()
+        self.put(key, provider, model, text)
+        return text
+
+    def stream(self, provider: str, model: str, prefix: str, prompt: str,
+               fn: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Streaming variant: a hit is yielded as one chunk, a completed stream is stored."""
+        key = self.key(provider, model, prefix, prompt)
+        if self.mode != "record":
+            hit = self.get(key)
+            if hit is not None:
+                yield hit
+                return
+            if self.mode == "replay":
+                raise CacheMiss(f"No recorded response for {provider}:{model} (key {key[:12]})")
+        pieces = []
+        for piece in fn():
+            pieces.append(piece)
+            yield piece
+        self.put(key, provider, model, "".join(pieces))
+
+
+_shared: Dict[Tuple[str, str], ResponseCache] = {}
+_shared_lock = threading.Lock()
+
+
+def response_cache_from_env() -> Optional[ResponseCache]:
+    """Process-wide ResponseCache for LLM_CACHE_MODE / LLM_CACHE_PATH, or None when off."""
+    mode = (os.getenv("LLM_CACHE_MODE") or "off").strip().lower().replace("_", "-")
+    if mode == "off":
+        return None
+    if mode not in MODES:
+        logger.warning("Ignoring unknown LLM_CACHE_MODE=%s", mode)
+        return None
+    path = os.getenv("LLM_CACHE_PATH", os.path.join("data", "llm_cache.sqlite3"))
+    with _shared_lock:
+        cache = _shared.get((path, mode))
+        if cache is None:
+            cache = ResponseCache(
+                path, mode,
+                ttl_s=float(os.getenv("LLM_CACHE_TTL_S", str(7 * 86400)) or 0),
+                max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "256") or 0) * 1024 * 1024),
+            )
+            _shared[(path, mode)] = cache
+        return cache
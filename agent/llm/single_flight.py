@@ -0,0 +1,151 @@
+# Path: agent/llm/single_flight.py
+"""
+Request coalescing ("single-flight") for identical in-flight LLM prompts.
+
+When many sessions send the same prompt to the same model at the same time,
+only the first caller (the leader) hits the provider; concurrent callers with
+the same key (followers) wait for the leader's result. Nothing is cached once
+the flight lands — this only collapses *concurrent* duplicates.
+
+Works in both modes, and the two share flights:
+- threaded: flights.do(key, fn, *args)
+- asyncio : await flights.ado(key, coro_fn_or_fn, *args)
+            (plain functions run in the default executor through do(), so
+             async and threaded callers coalesce onto one call)
+
+Errors raised by the leader are re-raised in every waiter. A threaded
+follower stops waiting when its own turn deadline passes (agent/deadline.py).
+"""
+
+import asyncio
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from agent.deadline import DeadlineExceeded, remaining
+
+
+def prompt_key(*parts: Any) -> str:
+    """Stable hash of (provider, model, params..., prompt)."""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str = "llm"):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._async_flights: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "leaders": 0, "followers": 0, "errors": 0}
+
+    # --------------------------------------------
+    # Threaded
+    # --------------------------------------------
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            self._stats["calls"] += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self._stats["followers"] += 1
+                leader = False
+            else:
+                flight = _Flight()
+                self._flights[key] = flight
+                self._stats["leaders"] += 1
+                leader = True
+
+        if not leader:
+            # followers still honour their own turn deadline
+            left = remaining()
+            if not flight.done.wait(None if left is None else max(left, 0.0)):
+                raise DeadlineExceeded("Deadline exceeded waiting for a coalesced LLM call")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(*args, **kwargs)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    # --------------------------------------------
+    # asyncio
+    # --------------------------------------------
+    async def ado(self, key: Hashable, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        if not asyncio.iscoroutinefunction(fn):
+            return await loop.run_in_executor(None, lambda: self.do(key, fn, *args, **kwargs))
+
+        akey = (id(loop), key)
+        with self._lock:
+            self._stats["calls"] += 1
+            fut = self._async_flights.get(akey)
+            leader = fut is None
+            if leader:
+                fut = loop.create_future()
+                self._async_flights[akey] = fut
+                self._stats["leaders"] += 1
+            else:
+                self._stats["followers"] += 1
+
+        if not leader:
+            # shield: a cancelled follower must not cancel the shared flight
+            return await asyncio.shield(fut)
+
+        try:
+            result = await fn(*args, **kwargs)
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                fut.exception()     # mark retrieved; the leader re-raises it below
+            raise
+        finally:
+            with self._lock:
+                self._async_flights.pop(akey, None)
+
+    # --------------------------------------------
+    # Metrics
+    # --------------------------------------------
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            s = dict(self._stats)
+            s["in_flight"] = len(self._flights) + len(self._async_flights)
+        s["coalescing_ratio"] = round(s["followers"] / s["calls"], 4) if s["calls"] else 0.0
+        return s
+
+    def reset_stats(self):
+        with self._lock:
+            for k in self._stats:
+                self._stats[k] = 0
+
+
+flights = SingleFlight("llm")
@@ -0,0 +1,59 @@
+# Path: agent/llm/streaming.py
+"""
+Token streaming hook for answer generation.
+
+A front-end that can push partial output (agent/server.py over WebSocket)
+installs a sink for the duration of a turn:
+
+    with stream_scope(lambda piece: send(piece)):
+        agent.handle(question)
+
+WorkerAgent._answer_directly then calls llm.generate_stream(...) and passes
+each piece to the sink as it arrives. Without a sink (CLI, HTTP/JSON) answers
+are generated in one call as before. The sink is a contextvar, so it follows
+the turn into worker threads that copy the context, and it can be cleared
+(stream_scope(None)) for work whose output must not reach the client, such as
+speculative answers. replay() sends a finished answer to the sink in pieces,
+so a client sees the same chunked reply whether or not it was generated live.
+"""
+
+import contextvars
+import re
+from typing import Callable, Optional
+
+TokenSink = Callable[[str], None]
+
+_PIECE = re.compile(r"\s*\S+\s*")
+
+_sink: contextvars.ContextVar[Optional[TokenSink]] = contextvars.ContextVar("llm_token_sink", default=None)
+
+
+class stream_scope:
+    """Send streamed answer tokens made inside the block to `sink` (None disables streaming)."""
+
+    __slots__ = ("_sink", "_token")
+
+    def __init__(self, sink: Optional[TokenSink]):
+        self._sink = sink
+        self._token = None
+
+    def __enter__(self):
+        self._token = _sink.set(self._sink)
+        return self._sink
+
+    def __exit__(self, exc_type, exc, tb):
+        _sink.reset(self._token)
+        return False
+
+
+def current_sink() -> Optional[TokenSink]:
+    return _sink.get()
+
+
+def replay(text: str, sink: Optional[TokenSink] = None) -> None:
+    """Send an already generated answer to `sink` (default: the current one) word by word."""
+    sink = sink or current_sink()
+    if sink is None or not text:
+        return
+    for piece in _PIECE.findall(text) or [text]:
+        sink(piece)
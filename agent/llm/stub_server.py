@@ -0,0 +1,533 @@
+# Path: agent/llm/stub_server.py
+"""
+Local stand-in LLM server for load and fault-injection testing.
+
+Speaks two wire shapes so the *real* client code can be pointed at it:
+- OpenRouter chat completions:  POST /api/v1/chat/completions
+- Gemini generate_content:      POST /v1beta/models/<model>:generateContent
+                                POST /v1beta/models/<model>:streamGenerateContent
+- Gemini context caching:       POST/GET/PATCH/DELETE /v1beta/cachedContents[/<id>]
+                                (generate calls naming a cachedContent get its
+                                 prefix; unknown or expired handles → 404)
+
+Point the agent at it with:
+    OPENROUTER_URL=http://127.0.0.1:8089/api/v1/chat/completions
+    GEMINI_BASE_URL=http://127.0.0.1:8089
+
+Fault injection:
+- latency distributions (fixed / uniform / normal / exp, in ms)
+- random 500 errors (error_rate)
+- 429 responses with Retry-After (rate_limit_rps bucket and/or rate_limit_rate)
+- slow streaming (stream_chunk_delay_ms per chunk)
+- decode time (token_delay_ms per completion token)
+
+Generation limits are honoured like a real provider: the reply is cut at the
+first stop sequence (not included) and at max_tokens / maxOutputTokens words,
+with finish reason "length" / "MAX_TOKENS" when truncated.
+
+Responses:
+- echo   → "Echo: <prompt tail>"
+- canned → fixed text
+- auto   → planner prompts get a JSON plan, everything else is echoed
+
+Run:
+    python -m agent.llm.stub_server --port 8089 --latency uniform:50,200 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+GEMINI_PATH = re.compile(r"^/v1beta/(?:models/)?([^/:]+):(generateContent|streamGenerateContent)")
+CACHE_PATH = re.compile(r"^/v1beta/cachedContents(?:/([^/?]+))?")
+OPENROUTER_PATHS = {"/api/v1/chat/completions", "/v1/chat/completions", "/chat/completions"}
+
+
+# ======================================================
+# Settings
+# ======================================================
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Turn a latency spec into a sampler returning seconds.
+        fixed:MS | uniform:LO,HI | normal:MEAN,STD | exp:MEAN
+    """
+    kind, _, args = (spec or "fixed:0").partition(":")
+    nums = [float(a) for a in args.split(",") if a.strip()] or [0.0]
+
+    if kind == "fixed":
+        return lambda rng: nums[0] / 1000.0
+    if kind == "uniform":
+        lo, hi = nums[0], nums[1] if len(nums) > 1 else nums[0]
+        return lambda rng: rng.uniform(lo, hi) / 1000.0
+    if kind == "normal":
+        mean, std = nums[0], nums[1] if len(nums) > 1 else 0.0
+        return lambda rng: max(0.0, rng.gauss(mean, std)) / 1000.0
+    if kind == "exp":
+        mean = nums[0] or 1.0
+        return lambda rng: rng.expovariate(1.0 / mean) / 1000.0
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class StubSettings:
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        rate_limit_rps: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        mode: str = "auto",
+        canned: str = "This is a canned stub response.",
+        stream_chunk_delay_ms: float = 20.0,
+        token_delay_ms: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rps = rate_limit_rps
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.mode = mode
+        self.canned = canned
+        self.stream_chunk_delay_ms = stream_chunk_delay_ms
+        self.token_delay_ms = token_delay_ms
+        self.rng = random.Random(seed)
+
+
+class _Bucket:
+    """Token bucket used to emulate a provider request quota."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+# ======================================================
+# Response builders
+# ======================================================
+def _count_tokens(text: str) -> int:
+    return len((text or "").split())
+
+
+def _reply_text(settings: StubSettings, prompt: str) -> str:
+    if settings.mode == "canned":
+        return settings.canned
+
+    if settings.mode == "auto" and "Return ONLY VALID JSON" in prompt:
+        m = re.search(r"User:\s*(.*)", prompt)
+        user = m.group(1).strip() if m else ""
+        return json.dumps({"action": "answer_directly", "input": user, "reasoning": "stub planner"})
+
+    tail = " ".join(prompt.split()[-40:])
+    return f"Echo: {tail}"
+
+
+def _apply_limits(text: str, max_tokens: Optional[int], stop) -> Tuple[str, bool]:
+    """Cut at the first stop sequence, then at max_tokens words. Returns (text, hit_max_tokens)."""
+    if isinstance(stop, str):
+        stop = [stop]
+    cuts = [text.find(s) for s in stop or [] if s and s in text]
+    if cuts:
+        text = text[:min(cuts)]
+    words = text.split(" ")
+    if max_tokens and _count_tokens(text) > max_tokens:
+        kept, count = [], 0
+        for w in words:
+            count += 1 if w.strip() else 0
+            if count > max_tokens:
+                break
+            kept.append(w)
+        return " ".join(kept), True
+    return text, False
+
+
+def _chunks(text: str, size: int = 4):
+    words = text.split(" ")
+    for i in range(0, len(words), size):
+        piece = " ".join(words[i:i + size])
+        yield piece if i + size >= len(words) else piece + " "
+
+
+def _openrouter_body(model: str, text: str, prompt: str, finish: str = "stop") -> Dict:
+    p, c = _count_tokens(prompt), _count_tokens(text)
+    return {
+        "id": f"stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": finish,
+        }],
+        "usage": {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c},
+    }
+
+
+def _parse_ttl(ttl: Optional[str], default: float = 3600.0) -> float:
+    try:
+        return float(str(ttl).rstrip("s"))
+    except (TypeError, ValueError):
+        return default
+
+
+def _gemini_body(model: str, text: str, prompt: str, cached_tokens: int = 0, finish: str = "STOP") -> Dict:
+    p, c = _count_tokens(prompt), _count_tokens(text)
+    usage = {"promptTokenCount": p, "candidatesTokenCount": c, "totalTokenCount": p + c}
+    if cached_tokens:
+        usage["cachedContentTokenCount"] = cached_tokens
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": finish,
+            "index": 0,
+        }],
+        "usageMetadata": usage,
+        "modelVersion": model,
+    }
+
+
+def _openrouter_prompt(body: Dict) -> str:
+    msgs = body.get("messages") or []
+    return "\n".join(str(m.get("content", "")) for m in msgs)
+
+
+def _gemini_prompt(body: Dict) -> str:
+    texts = []
+    for content in body.get("contents") or []:
+        for part in content.get("parts") or []:
+            texts.append(str(part.get("text", "")))
+    system = body.get("systemInstruction") or {}
+    for part in system.get("parts") or []:
+        texts.insert(0, str(part.get("text", "")))
+    return "\n".join(texts)
+
+
+# ======================================================
+# HTTP handler
+# ======================================================
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "StubLLM/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # silence default stderr access log
+    def log_message(self, fmt, *args):
+        pass
+
+    @property
+    def settings(self) -> StubSettings:
+        return self.server.settings
+
+    def _count(self, key: str):
+        with self.server.stats_lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + 1
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+        raw = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _send_sse(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        delay = self.settings.stream_chunk_delay_ms / 1000.0
+        for event in events:
+            self.wfile.write(f"data: {event}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if delay:
+                time.sleep(delay)
+
+    def _decode_delay(self, text: str):
+        """Emulate generation time: token_delay_ms per completion token."""
+        if self.settings.token_delay_ms and text:
+            time.sleep(_count_tokens(text) * self.settings.token_delay_ms / 1000.0)
+
+    def _inject_faults(self) -> bool:
+        """Returns True when a fault response has been sent."""
+        s = self.settings
+        with self.server.rng_lock:
+            delay = s.sample_latency(s.rng)
+            forced_429 = s.rng.random() < s.rate_limit_rate
+            forced_500 = s.rng.random() < s.error_rate
+
+        if forced_429 or not self.server.bucket.take():
+            self._count("rate_limited")
+            self._send_json(
+                429,
+                {"error": {"code": 429, "message": "Rate limit exceeded (stub)", "status": "RESOURCE_EXHAUSTED"}},
+                headers={"Retry-After": f"{s.retry_after:g}"},
+            )
+            return True
+
+        if delay:
+            time.sleep(delay)
+
+        if forced_500:
+            self._count("errors")
+            self._send_json(500, {"error": {"code": 500, "message": "Injected failure (stub)", "status": "INTERNAL"}})
+            return True
+        return False
+
+    def _read_body(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return {}
+
+    # ---------------------------
+    def do_PATCH(self):
+        body = self._read_body()
+        cm = CACHE_PATH.match(self.path)
+        entry = self._cache_entry(cm.group(1) if cm else None)
+        if entry is None:
+            return
+        entry["expires"] = time.monotonic() + _parse_ttl(body.get("ttl"))
+        self._count("cache_refreshes")
+        self._send_json(200, self._cache_meta(entry))
+
+    def do_DELETE(self):
+        cm = CACHE_PATH.match(self.path)
+        if self._cache_entry(cm.group(1) if cm else None) is None:
+            return
+        with self.server.stats_lock:
+            self.server.caches.pop(f"cachedContents/{cm.group(1)}", None)
+        self._send_json(200, {})
+
+    def do_GET(self):
+        cm = CACHE_PATH.match(self.path)
+        if cm and cm.group(1):
+            entry = self._cache_entry(cm.group(1))
+            if entry is not None:
+                self._send_json(200, self._cache_meta(entry))
+        elif self.path.startswith("/health"):
+            self._send_json(200, {"status": "ok"})
+        elif self.path.startswith("/stats"):
+            with self.server.stats_lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_POST(self):
+        body = self._read_body()
+        self._count("requests")
+
+        gm = GEMINI_PATH.match(self.path)
+        cm = CACHE_PATH.match(self.path)
+        if cm and not cm.group(1):
+            self._create_cache(body)
+        elif self.path.split("?", 1)[0] in OPENROUTER_PATHS:
+            self._handle_openrouter(body)
+        elif gm:
+            self._handle_gemini(body, gm.group(1), stream=gm.group(2) == "streamGenerateContent")
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}"}})
+
+    # ---------------------------
+    # Context caching
+    # ---------------------------
+    @staticmethod
+    def _cache_meta(entry: Dict) -> Dict:
+        remaining = max(0.0, entry["expires"] - time.monotonic())
+        expire = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + remaining))
+        return {
+            "name": entry["name"],
+            "model": entry["model"],
+            "displayName": entry.get("displayName", ""),
+            "expireTime": expire,
+            "usageMetadata": {"totalTokenCount": _count_tokens(entry["prompt"])},
+        }
+
+    def _cache_entry(self, cache_id: Optional[str]) -> Optional[Dict]:
+        """Live cache entry, or None after sending a 404."""
+        name = cache_id if (cache_id or "").startswith("cachedContents/") else f"cachedContents/{cache_id}"
+        with self.server.stats_lock:
+            entry = self.server.caches.get(name)
+            if entry is not None and entry["expires"] <= time.monotonic():
+                del self.server.caches[name]
+                entry = None
+        if entry is None:
+            self._send_json(404, {"error": {"code": 404, "message": f"CachedContent not found: {name}", "status": "NOT_FOUND"}})
+        return entry
+
+    def _create_cache(self, body: Dict):
+        with self.server.stats_lock:
+            self.server.cache_seq += 1
+            name = f"cachedContents/stub{self.server.cache_seq}"
+            entry = {
+                "name": name,
+                "model": body.get("model") or "",
+                "displayName": body.get("displayName", ""),
+                "prompt": _gemini_prompt(body),
+                "expires": time.monotonic() + _parse_ttl(body.get("ttl")),
+            }
+            self.server.caches[name] = entry
+        self._count("cache_creates")
+        self._send_json(200, self._cache_meta(entry))
+
+    def _handle_openrouter(self, body: Dict):
+        if self._inject_faults():
+            return
+        self._count("ok")
+        model = body.get("model") or "stub-model"
+        prompt = _openrouter_prompt(body)
+        text, truncated = _apply_limits(_reply_text(self.settings, prompt), body.get("max_tokens"), body.get("stop"))
+        finish = "length" if truncated else "stop"
+
+        if not body.get("stream"):
+            self._decode_delay(text)
+            self._send_json(200, _openrouter_body(model, text, prompt, finish))
+            return
+
+        def events():
+            for piece in _chunks(text):
+                self._decode_delay(piece)
+                yield json.dumps({"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]})
+            final = _openrouter_body(model, "", prompt)
+            final["usage"]["completion_tokens"] = _count_tokens(text)
+            final["usage"]["total_tokens"] += _count_tokens(text)
+            final["choices"] = [{"index": 0, "delta": {}, "finish_reason": finish}]
+            yield json.dumps(final)
+            yield "[DONE]"
+
+        self._send_sse(events())
+
+    def _handle_gemini(self, body: Dict, model: str, stream: bool):
+        cached_prompt, cached_tokens = "", 0
+        if body.get("cachedContent"):
+            entry = self._cache_entry(body["cachedContent"])
+            if entry is None:
+                return
+            cached_prompt, cached_tokens = entry["prompt"] + "\n", _count_tokens(entry["prompt"])
+            self._count("cache_hits")
+        if self._inject_faults():
+            return
+        self._count("ok")
+        prompt = cached_prompt + _gemini_prompt(body)
+        config = body.get("generationConfig") or {}
+        text, truncated = _apply_limits(
+            _reply_text(self.settings, prompt), config.get("maxOutputTokens"), config.get("stopSequences"))
+        finish = "MAX_TOKENS" if truncated else "STOP"
+
+        if not stream:
+            self._decode_delay(text)
+            self._send_json(200, _gemini_body(model, text, prompt, cached_tokens, finish))
+            return
+
+        def events():
+            pieces = list(_chunks(text))
+            for i, piece in enumerate(pieces):
+                self._decode_delay(piece)
+                chunk = _gemini_body(model, piece, prompt, cached_tokens, finish)
+                if i < len(pieces) - 1:
+                    chunk["candidates"][0].pop("finishReason")
+                yield json.dumps(chunk)
+
+        self._send_sse(events())
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], settings: StubSettings):
+        super().__init__(address, StubHandler)
+        self.settings = settings
+        self.bucket = _Bucket(settings.rate_limit_rps)
+        self.rng_lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+        self.stats_lock = threading.Lock()
+        self.caches: Dict[str, Dict] = {}
+        self.cache_seq = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openrouter_url(self) -> str:
+        return f"{self.base_url}/api/v1/chat/completions"
+
+
+def start_stub_server(settings: Optional[StubSettings] = None, host: str = "127.0.0.1", port: int = 0) -> StubServer:
+    """Start the stub in a daemon thread (port=0 picks a free port). Call .shutdown() to stop."""
+    server = StubServer((host, port), settings or StubSettings())
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+
+# ======================================================
+# CLI
+# ======================================================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Local stand-in LLM server (OpenRouter + Gemini shapes)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", default="fixed:0", help="fixed:MS | uniform:LO,HI | normal:MEAN,STD | exp:MEAN")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rate-limit-rps", type=float, default=0.0)
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    ap.add_argument("--mode", choices=["auto", "echo", "canned"], default="auto")
+    ap.add_argument("--canned", default="This is a canned stub response.")
+    ap.add_argument("--stream-chunk-delay-ms", type=float, default=20.0)
+    ap.add_argument("--token-delay-ms", type=float, default=0.0, help="decode time per completion token")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    settings = StubSettings(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rps=args.rate_limit_rps,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        mode=args.mode,
+        canned=args.canned,
+        stream_chunk_delay_ms=args.stream_chunk_delay_ms,
+        token_delay_ms=args.token_delay_ms,
+        seed=args.seed,
+    )
+    server = StubServer((args.host, args.port), settings)
+    print(f"Stub LLM listening on {server.base_url}")
+    print(f"  OPENROUTER_URL={server.openrouter_url}")
+    print(f"  GEMINI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# Path: agent/llm/usage.py
+"""
+Token and cost accounting for every LLM call.
+
+Each provider call records:
+    provider, model, prompt/completion tokens, latency, action, session, request id
+
+Aggregates are kept per session, per action and per provider/model, priced with
+a configurable table (USD per 1M tokens). Budget alerts fire once per session
+(and once globally) when spend crosses the configured limit.
+
+Attribution uses contextvars, so callers only need to scope their work:
+    with session_scope(session_id):
+        with action_scope("plan"):
+            llm.generate(prompt)      # recorded under action="plan"
+
+Environment:
+    LLM_PRICES_FILE=prices.json   {"model-name": {"prompt": 0.10, "completion": 0.40}, "*": {...}}
+    LLM_SESSION_BUDGET_USD=0.50   per-session alert threshold
+    LLM_TOTAL_BUDGET_USD=20       process-wide alert threshold
+    LLM_USAGE_FILE=logs/usage.jsonl  append one JSON line per call
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent.tracing import current_request_id
+
+logger = logging.getLogger(__name__)
+
+_action: contextvars.ContextVar[str] = contextvars.ContextVar("llm_action", default="unknown")
+_session: contextvars.ContextVar[str] = contextvars.ContextVar("llm_session", default="")
+_capture: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("llm_capture", default=None)
+
+
+class _Scope:
+    __slots__ = ("_var", "_value", "_token")
+
+    def __init__(self, var: contextvars.ContextVar, value: str):
+        self._var = var
+        self._value = value
+        self._token = None
+
+    def __enter__(self):
+        self._token = self._var.set(self._value)
+        return self._value
+
+    def __exit__(self, exc_type, exc, tb):
+        self._var.reset(self._token)
+        return False
+
+
+class capture_usage(_Scope):
+    """Collect the UsageRecords of LLM calls made inside the block (yields the list)."""
+
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(_capture, [])
+
+
+def action_scope(action: str) -> _Scope:
+    """Attribute LLM calls made inside the block to this action."""
+    return _Scope(_action, action or "unknown")
+
+
+def session_scope(session_id: str) -> _Scope:
+    return _Scope(_session, session_id or "")
+
+
+def current_action() -> str:
+    return _action.get()
+
+
+def current_session() -> str:
+    return _session.get()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough fallback when a provider omits usage (~4 chars per token)."""
+    return max(1, len(text or "") // 4) if text else 0
+
+
+# ======================================================
+# Prices
+# ======================================================
+class PriceTable:
+    """USD per 1M tokens, keyed by model; "*" is the default entry."""
+
+    def __init__(self, prices: Optional[Dict[str, Dict[str, float]]] = None):
+        self.prices = prices or {}
+
+    @classmethod
+    def from_env(cls) -> "PriceTable":
+        path = os.getenv("LLM_PRICES_FILE")
+        if not path:
+            return cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        except Exception as e:
+            logger.warning("Could not load LLM price table %s: %s", path, e)
+            return cls()
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        entry = self.prices.get(model) or self.prices.get("*") or {}
+        return (
+            prompt_tokens * float(entry.get("prompt", 0.0))
+            + completion_tokens * float(entry.get("completion", 0.0))
+        ) / 1_000_000
+
+
+# ======================================================
+# Records + aggregates
+# ======================================================
+class UsageRecord:
+    __slots__ = ("ts", "provider", "model", "action", "session_id", "request_id",
+                 "prompt_tokens", "completion_tokens", "latency_ms", "cost_usd", "estimated")
+
+    def __init__(self, provider, model, action, session_id, request_id,
+                 prompt_tokens, completion_tokens, latency_ms, cost_usd, estimated):
+        self.ts = time.time()
+        self.provider = provider
+        self.model = model
+        self.action = action
+        self.session_id = session_id
+        self.request_id = request_id
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.latency_ms = latency_ms
+        self.cost_usd = cost_usd
+        self.estimated = estimated
+
+    def to_dict(self) -> Dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class _Totals:
+    __slots__ = ("calls", "prompt_tokens", "completion_tokens", "latency_ms", "cost_usd")
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_ms = 0.0
+        self.cost_usd = 0.0
+
+    def add(self, r: UsageRecord):
+        self.calls += 1
+        self.prompt_tokens += r.prompt_tokens
+        self.completion_tokens += r.completion_tokens
+        self.latency_ms += r.latency_ms
+        self.cost_usd += r.cost_usd
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_latency_ms": round(self.latency_ms / self.calls, 1) if self.calls else 0.0,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+class UsageTracker:
+    def __init__(self, prices: Optional[PriceTable] = None,
+                 session_budget_usd: Optional[float] = None,
+                 total_budget_usd: Optional[float] = None,
+                 usage_file: Optional[str] = None):
+        self.prices = prices or PriceTable.from_env()
+        self.session_budget_usd = session_budget_usd if session_budget_usd is not None \
+            else _env_float("LLM_SESSION_BUDGET_USD")
+        self.total_budget_usd = total_budget_usd if total_budget_usd is not None \
+            else _env_float("LLM_TOTAL_BUDGET_USD")
+        self.usage_file = usage_file if usage_file is not None else os.getenv("LLM_USAGE_FILE")
+
+        self.total = _Totals()
+        self.by_session: Dict[str, _Totals] = {}
+        self.by_action: Dict[str, _Totals] = {}
+        self.by_model: Dict[str, _Totals] = {}
+        self.by_session_action: Dict[Tuple[str, str], _Totals] = {}
+        self._alerted: set = set()
+        self._alert_handlers: List[Callable[[str, float, float], None]] = []
+        self._lock = threading.Lock()
+
+    def add_alert_handler(self, fn: Callable[[str, float, float], None]):
+        """fn(scope, spent_usd, budget_usd) — scope is a session id or "total"."""
+        self._alert_handlers.append(fn)
+
+    def record(self, provider: str, model: str, prompt_tokens: Optional[int],
+               completion_tokens: Optional[int], latency_ms: float,
+               prompt: str = "", completion: str = "") -> UsageRecord:
+        estimated = prompt_tokens is None or completion_tokens is None
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(completion)
+
+        r = UsageRecord(
+            provider=provider,
+            model=model,
+            action=current_action(),
+            session_id=current_session(),
+            request_id=current_request_id(),
+            prompt_tokens=int(prompt_tokens),
+            completion_tokens=int(completion_tokens),
+            latency_ms=round(latency_ms, 2),
+            cost_usd=self.prices.cost(model, prompt_tokens, completion_tokens),
+            estimated=estimated,
+        )
+
+        with self._lock:
+            self.total.add(r)
+            self.by_session.setdefault(r.session_id, _Totals()).add(r)
+            self.by_action.setdefault(r.action, _Totals()).add(r)
+            self.by_model.setdefault(f"{provider}:{model}", _Totals()).add(r)
+            self.by_session_action.setdefault((r.session_id, r.action), _Totals()).add(r)
+            alerts = self._check_budgets(r.session_id)
+
+        for scope, spent, budget in alerts:
+            logger.warning("LLM budget exceeded for %s: $%.4f > $%.4f", scope, spent, budget)
+            for fn in self._alert_handlers:
+                try:
+                    fn(scope, spent, budget)
+                except Exception as e:
+                    logger.warning("Budget alert handler failed: %s", e)
+
+        captured = _capture.get()
+        if captured is not None:
+            captured.append(r)
+
+        self._append(r)
+        return r
+
+    def _check_budgets(self, session_id: str):
+        alerts = []
+        if self.session_budget_usd and session_id not in self._alerted:
+            spent = self.by_session[session_id].cost_usd
+            if spent > self.session_budget_usd:
+                self._alerted.add(session_id)
+                alerts.append((session_id or "(no session)", spent, self.session_budget_usd))
+        if self.total_budget_usd and "total" not in self._alerted:
+            if self.total.cost_usd > self.total_budget_usd:
+                self._alerted.add("total")
+                alerts.append(("total", self.total.cost_usd, self.total_budget_usd))
+        return alerts
+
+    def _append(self, r: UsageRecord):
+        if not self.usage_file:
+            return
+        try:
+            with open(self.usage_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(r.to_dict()) + "\n")
+        except OSError as e:
+            logger.warning("Usage write failed: %s", e)
+
+    # --------------------------------------------
+    # Reporting
+    # --------------------------------------------
+    def summary(self, session_id: Optional[str] = None) -> Dict:
+        with self._lock:
+            if session_id is not None:
+                t = self.by_session.get(session_id) or _Totals()
+                return {
+                    "session": session_id,
+                    **t.to_dict(),
+                    "by_action": {a: v.to_dict() for (sid, a), v in self.by_session_action.items()
+                                  if sid == session_id},
+                }
+            return {
+                "total": self.total.to_dict(),
+                "by_action": {k: v.to_dict() for k, v in self.by_action.items()},
+                "by_model": {k: v.to_dict() for k, v in self.by_model.items()},
+                "sessions": len(self.by_session),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.total = _Totals()
+            self.by_session.clear()
+            self.by_action.clear()
+            self.by_model.clear()
+            self.by_session_action.clear()
+            self._alerted.clear()
+
+
+def _env_float(name: str) -> Optional[float]:
+    raw = os.getenv(name)
+    try:
+        return float(raw) if raw else None
+    except ValueError:
+        logger.warning("Ignoring invalid %s=%r", name, raw)
+        return None
+
+
+tracker = UsageTracker()
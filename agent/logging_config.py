@@ -1,18 +1,205 @@
+"""
+Non-blocking logging pipeline.
+
+Request threads only enqueue records (QueueHandler); a background
+QueueListener thread does the console and file I/O. The log file rotates by
+size and, optionally, by time.
+
+Environment (all optional):
+    AGENT_LOG_JSON=1              JSON lines with request_id / session_id
+    AGENT_LOG_MAX_BYTES=10485760  rotate logs/agent.log at this size (0 = never)
+    AGENT_LOG_BACKUPS=5           rotated files to keep
+    AGENT_LOG_ROTATE_WHEN=midnight  also rotate on a schedule (TimedRotatingFileHandler "when")
+    AGENT_LOG_SAMPLE=5/60         let at most 5 identical warnings through per 60s
+    AGENT_LOG_QUEUE_SIZE=10000    records beyond this are dropped, never blocking the caller
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
 from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from agent.llm.usage import current_session
+from agent.tracing import current_request_id
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+# ======================================================
+# Handlers / filters / formatters
+# ======================================================
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rolls over on schedule *or* when the file exceeds max_bytes."""
+
+    def __init__(self, filename, max_bytes: int = 0, when: str = "midnight", backup_count: int = 5,
+                 encoding: str = "utf-8"):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding=encoding)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record) -> bool:
+        if self.max_bytes > 0 and self.stream is not None:
+            self.stream.seek(0, 2)
+            if self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes:
+                return True
+        return bool(super().shouldRollover(record))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the request thread: when the queue is full the record is dropped and counted."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps request/session ids while still on the request thread (contextvars live there)."""
+
+    def filter(self, record) -> bool:
+        record.request_id = current_request_id()
+        record.session_id = current_session()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limits repetitive WARNING+ records keyed by (logger, message template).
+    The first `burst` per `window` seconds pass; the rest are counted and
+    reported on the next record that passes once the window rolls over.
+    """
+
+    def __init__(self, burst: int = 5, window: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._seen: Dict[Tuple[str, str], list] = {}   # key -> [window_start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        if record.levelno < logging.WARNING or record.levelno >= logging.CRITICAL:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._seen[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (suppressed {suppressed} similar in last {self.window:g}s)"
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "") or None,
+            "session_id": getattr(record, "session_id", "") or None,
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _parse_sample(spec: Optional[str]) -> Optional[Tuple[int, float]]:
+    if not spec:
+        return None
+    burst, _, window = spec.partition("/")
+    try:
+        return int(burst), float(window or 60)
+    except ValueError:
+        return None
+
+
+# ======================================================
+# Public API
+# ======================================================
+def configure_logging(level="INFO", json_format: Optional[bool] = None):
+    global _listener
 
-def configure_logging(level="INFO"):
     # Ensure logs/ folder exists
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
 
     log_file = log_dir / "agent.log"
 
-    logging.basicConfig(
-        level=getattr(logging, level.upper(), logging.INFO),
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler(log_file, encoding="utf-8")
-        ]
-    )
+    if json_format is None:
+        json_format = os.getenv("AGENT_LOG_JSON", "").lower() in {"1", "true", "yes", "on"}
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+
+    max_bytes = _env_int("AGENT_LOG_MAX_BYTES", 10 * 1024 * 1024)
+    backups = _env_int("AGENT_LOG_BACKUPS", 5)
+    when = os.getenv("AGENT_LOG_ROTATE_WHEN")
+    if when:
+        file_handler = SizedTimedRotatingFileHandler(log_file, max_bytes=max_bytes, when=when, backup_count=backups)
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+
+    stream_handler = logging.StreamHandler()
+    for h in (stream_handler, file_handler):
+        h.setFormatter(formatter)
+
+    # Restart cleanly if called twice
+    stop_logging()
+
+    q: queue.Queue = queue.Queue(maxsize=_env_int("AGENT_LOG_QUEUE_SIZE", 10000))
+    queue_handler = DroppingQueueHandler(q)
+    # sampling first so suppressed records cost as little as possible
+    sample = _parse_sample(os.getenv("AGENT_LOG_SAMPLE", "5/60"))
+    if sample:
+        queue_handler.addFilter(SamplingFilter(*sample))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    _listener = logging.handlers.QueueListener(q, stream_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread (also registered at exit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -14,18 +14,42 @@ Features:
 """
 import json
 import logging
-from typing import Any, List
+import struct
+import time
+import uuid
+from typing import Any, Optional
 
 from agent.agents.smart_planner import SmartPlanner
 from agent.agents.worker_agent import WorkerAgent
 from agent.notes_engine import NotesEngine
+from agent.memory.shards import shard_pool_from_env
+from agent.context_buffer import ContextBuffer
+from agent.summarizer import IncrementalSummarizer
+from agent.listing import Listing, PageStream, is_more_cmd
+from agent.speculation import SpeculativeAnswerer, speculation_enabled
+from agent.session_store import (
+    SessionFormatError, decode_session, encode_snapshot, encode_state, encode_turns, session_store_from_env,
+)
 from agent.llm.gemini_client import GeminiClient
+from agent.tracing import request_scope, span
+from agent.llm.usage import session_scope, tracker as usage_tracker
+from agent.profiling import RequestProfiler
+from agent.llm.rate_limiter import BATCH, priority_scope
+from agent.deadline import deadline_scope, remaining, turn_budget_s
 
 logger = logging.getLogger(__name__)
 
 
 class MainAgent:
-    def __init__(self):
+    def __init__(self, session_id: Optional[str] = None, session_store=None, user_id: Optional[str] = None):
+        # Session id attributes LLM usage (tokens/cost) to this conversation
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+
+        # With a user id, notes/tasks/facts live in that user's store shard (agent/memory/shards.py)
+        self.user_id = user_id or None
+        self.shards = shard_pool_from_env() if self.user_id else None
+        shard = self.shards.get(self.user_id) if self.shards is not None else None
+
         # Try to create an LLM client (GeminiClient will fallback to OpenRouter if configured)
         try:
             self.llm = GeminiClient()
@@ -43,15 +67,49 @@ class MainAgent:
             self.planner = SmartPlanner()
 
         # Worker (tools + LLM answering). WorkerAgent will create its own llm client internally.
-        self.worker = WorkerAgent()
+        self.worker = WorkerAgent(store=shard)
+
+        # Speculative answers (AGENT_SPECULATIVE=1): start answer_directly while the planner runs,
+        # only for queries the rule-based planner would also answer directly
+        self.speculator: Optional[SpeculativeAnswerer] = None
+        if speculation_enabled():
+            self.speculator = SpeculativeAnswerer(
+                self.worker._answer_directly,
+                predict=lambda q: self.planner._fallback(q).get("action") == "answer_directly",
+            )
 
         # NotesEngine (deterministic summariser + persistent storage)
-        self.notes = NotesEngine()
+        self.notes = shard.notes if shard is not None else NotesEngine()
 
         # Conversation state
-        self.context: List[str] = []
+        self.context = ContextBuffer(capacity=20)
         self.last_answer: str = ""      # Last assistant answer ONLY
         self.last_topic: str = ""       # Tracks topic for follow-ups
+        self._listing: Optional[Listing] = None     # active notes/tasks listing ("more" continues it)
+        self.summary = IncrementalSummarizer()       # running summary of answers ("note all")
+
+        # Session persistence (optional): resume on construction, append after every turn
+        self.session_store = session_store if session_store is not None else session_store_from_env()
+        # keyed by user too: a session id reused under another user never restores this conversation
+        self._session_key = f"{self.user_id}.{self.session_id}" if self.user_id else self.session_id
+        self._saved_turns = 0
+        self._saved_state = ("", "")
+        self._records_since_snapshot = 0
+        if self.session_store is not None:
+            data = self.session_store.load(self._session_key)
+            if data:
+                try:
+                    self.restore(data)
+                except (SessionFormatError, UnicodeDecodeError, struct.error) as e:
+                    logger.warning("Session %s could not be restored, starting fresh: %s", self.session_id, e)
+                    # the first save rewrites the damaged log as a fresh snapshot
+                    self._records_since_snapshot = 4 * self.context.capacity
+
+        # Hard upper bound per turn; planner, worker and LLM clients use what is left
+        self.turn_budget_s: Optional[float] = turn_budget_s()
+
+        # Opt-in profiling (AGENT_PROFILE=... or run.py --profile)
+        self.profiler: Optional[RequestProfiler] = RequestProfiler.from_env()
 
     # ----------------------------------------------------
     # Helpers
@@ -60,14 +118,12 @@ class MainAgent:
         text = (text or "").strip()
         if not text:
             return
-        self.context.append(f"{role}: {text}")
-        # keep it bounded
-        if len(self.context) > 20:
-            self.context = self.context[-20:]
+        # ring buffer: bounded, O(1) append
+        self.context.append(role, text)
 
     def _compact_context(self) -> str:
         # last 4 turns for Planner/Worker use
-        return " | ".join(self.context[-4:]) if self.context else ""
+        return self.context.last(4).join(" | ")
 
     def _extract_topic(self, text: str) -> str:
         t = (text or "").lower()
@@ -76,10 +132,210 @@ class MainAgent:
                 t = t.replace(p, "").strip()
         return t.strip(" ?.!") or text
 
+    @staticmethod
+    def _format_task(task: dict) -> str:
+        mark = "x" if task.get("done") else " "
+        return f"#{task['id']} [{mark}] {task.get('text', '')}"
+
+    @staticmethod
+    def _format_note(note: dict) -> str:
+        return f"{note['id']}. {note.get('text', '')}"
+
+    def _was_duplicate(self) -> bool:
+        """True if the note just saved matched an existing one (see NOTES_DEDUP_POLICY)."""
+        saved = self.notes.last_saved
+        return bool(saved and saved.get("duplicate"))
+
+    def _format_output(self, action: str, output: Any) -> str:
+        """Compact, human-readable rendering of worker output."""
+        if action == "add_note" and isinstance(output, dict):
+            if output.get("duplicate"):
+                return f"Already noted: {self._format_note(output)}"
+            return f"Note added: {self._format_note(output)}"
+        if action == "remember" and isinstance(output, dict):
+            if output.get("duplicate"):
+                return f"I already know: {output.get('text', '')}"
+            return f"Got it, I'll remember: {output.get('text', '')}"
+        if action == "add_task" and isinstance(output, dict):
+            return f"Task added: {self._format_task(output)}"
+        if action == "complete_task" and isinstance(output, dict):
+            return f"Task completed: {self._format_task(output)}"
+        if action in ("list_notes", "list_tasks") and isinstance(output, dict) and "items" in output:
+            fmt = self._format_note if action == "list_notes" else self._format_task
+            label = "notes" if action == "list_notes" else "tasks"
+            lines = [fmt(item) for item in output["items"]] or [f"No {label}."]
+            if output.get("next_cursor") is not None:
+                lines.append(f"(first {len(output['items'])} of {output.get('total')} {label}; say 'more' for the next page)")
+            return "\n".join(lines)
+        if action == "web_search" and isinstance(output, list):
+            if not output:
+                return "No matching documents found."
+            return "\n".join(
+                f"{i}. {r.get('title', '')} ({r.get('link', '')})\n   {r.get('snippet', '')}"
+                for i, r in enumerate(output, 1)
+            )
+        if action == "multi" and isinstance(output, list):
+            # one block per step, in plan order
+            return "\n\n".join(
+                self._format_output(r.get("action"), r.get("output")) if r.get("status") == "ok"
+                else f"{r.get('action') or 'step'} failed: {r.get('error', 'unknown error')}"
+                for r in output
+            )
+        if isinstance(output, (dict, list)):
+            return json.dumps(output, indent=2, ensure_ascii=False)
+        return (str(output or "")).strip()
+
+    def _route(self, user_query: str) -> str:
+        """Direct note and paging commands are handled *before* the planner."""
+        if is_more_cmd(user_query):
+            return "more"
+        if self.notes.is_list_notes_cmd(user_query):
+            return "list_notes"
+        if self.notes.is_note_all(user_query):
+            return "note_all"
+        if self.notes.is_note_previous(user_query):
+            return "note_previous"
+        if self.notes.is_note_confirmation(user_query):
+            return "note_confirmation"
+        if self.notes.is_note_current(user_query):
+            return "note_current"
+        return "plan"
+
     # ----------------------------------------------------
     # Main Handler
     # ----------------------------------------------------
-    def handle(self, user_query: str) -> Any:
+    def handle(self, user_query: str, request_id: str = None) -> Any:
+        answer = self._turn(user_query, request_id)
+        return str(answer) if isinstance(answer, PageStream) else answer
+
+    def handle_stream(self, user_query: str, request_id: str = None):
+        """Like handle(), but yields the reply piece by piece (listings: one line at a time)."""
+        answer = self._turn(user_query, request_id)
+        if isinstance(answer, PageStream):
+            yield from answer
+        else:
+            yield answer
+
+    def _turn(self, user_query: str, request_id: str = None) -> Any:
+        # request id is propagated (contextvar) through planner, worker and LLM clients
+        with request_scope(request_id) as rid, session_scope(self.session_id), \
+                deadline_scope(self.turn_budget_s), span("handle"):
+            if self.shards is not None:
+                self._bind_store()
+            if self.profiler is not None:
+                answer = self.profiler.run(rid, self._handle, user_query)
+            else:
+                answer = self._handle(user_query)
+            self._persist_session()
+            return answer
+
+    def _bind_store(self):
+        """The shard handle may have been closed (idle / LRU) since the last turn: reopen and rebind."""
+        shard = self.shards.get(self.user_id)
+        if shard.notes is not self.notes:
+            self.notes = shard.notes
+            self.worker.bind_store(shard)
+
+    # ----------------------------------------------------
+    # Paginated listings
+    # ----------------------------------------------------
+    def _start_listing(self, listing: Listing) -> PageStream:
+        self._listing = listing
+        return self._show_page(listing.next_page())
+
+    def _show_page(self, page: PageStream) -> PageStream:
+        # only the one-line summary goes into context; last_answer keeps the last real answer
+        self._update_context("assistant", page.summary)
+        if self._listing is not None and self._listing.exhausted:
+            self._listing = None
+        return page
+
+    def _notes_listing(self, first_page: Optional[dict] = None) -> Listing:
+        return Listing(
+            "notes",
+            lambda cursor, limit: self.notes.list_notes_page(limit=limit, cursor=cursor),
+            self._format_note,
+            first_page=first_page,
+        )
+
+    def _tasks_listing(self, first_page: dict) -> Listing:
+        status = first_page.get("status")
+        return Listing(
+            f"{status} tasks" if status else "tasks",
+            lambda cursor, limit: self.worker.tasks.list_tasks(status=status, limit=limit, cursor=cursor),
+            self._format_task,
+            first_page=first_page,
+        )
+
+    def _step_listing(self, steps: list) -> Optional[Listing]:
+        """The last paged listing of a multi-step plan, past the page already shown, so 'more' continues it."""
+        listing = None
+        for r in steps:
+            out = r.get("output")
+            if (r.get("status") == "ok" and r.get("action") in ("list_notes", "list_tasks")
+                    and isinstance(out, dict) and out.get("next_cursor") is not None):
+                listing = self._notes_listing(first_page=out) if r["action"] == "list_notes" else self._tasks_listing(out)
+        if listing is not None:
+            listing.next_page()
+        return listing
+
+    def handle_many(self, queries) -> list:
+        """Batch turns: LLM calls queue behind interactive traffic (BATCH priority)."""
+        with priority_scope(BATCH):
+            return [self.handle(q) for q in queries]
+
+    # ----------------------------------------------------
+    # Session snapshot / resume
+    # ----------------------------------------------------
+    def snapshot(self) -> bytes:
+        """Compact binary snapshot of context, last_answer and last_topic."""
+        return encode_snapshot(self.context, self.last_answer, self.last_topic)
+
+    def restore(self, data: bytes):
+        state = decode_session(data, capacity=self.context.capacity)
+        self.context.clear()
+        for turn in state.turns:
+            self.context.append_turn(turn)
+        self.last_answer = state.last_answer
+        self.last_topic = state.last_topic
+        self.summary.clear()    # note_all falls back to the restored context until new answers arrive
+        self._saved_turns = self.context.appended
+        self._saved_state = (self.last_answer, self.last_topic)
+        self._records_since_snapshot = 0
+
+    def _persist_session(self):
+        """Append only the turns (and state) that changed since the last save."""
+        if self.session_store is None:
+            return
+        new = self.context.appended - self._saved_turns
+        records = encode_turns(self.context.last(new)) if new else b""
+        state = (self.last_answer, self.last_topic)
+        if state != self._saved_state:
+            records += encode_state(*state)
+        if not records:
+            return
+        try:
+            with span("store", kind="session"):
+                self._records_since_snapshot += new + 1
+                if self._records_since_snapshot > 4 * self.context.capacity:
+                    # compact: the log would otherwise grow with every turn ever spoken
+                    self.session_store.write(self._session_key, self.snapshot())
+                    self._records_since_snapshot = 0
+                else:
+                    self.session_store.append(self._session_key, records)
+            self._saved_turns = self.context.appended
+            self._saved_state = state
+        except Exception as e:
+            logger.warning("Session save failed for %s: %s", self.session_id, e)
+
+    def usage_summary(self) -> dict:
+        """Tokens, latency and cost spent by this session's LLM calls."""
+        summary = usage_tracker.summary(self.session_id)
+        if self.speculator is not None:
+            summary["speculation"] = self.speculator.stats()
+        return summary
+
+    def _handle(self, user_query: str) -> Any:
         user_query = (user_query or "").strip()
         if not user_query:
             return "Please type something."
@@ -89,34 +345,42 @@ class MainAgent:
         self._update_context("user", user_query)
         compact = self._compact_context()
 
+        with span("route"):
+            route = self._route(user_query)
+
+        # "more" / "next page" continues the active listing; anything else ends it
+        if route == "more":
+            page = self._listing.next_page() if self._listing is not None else None
+            if page is None:
+                self._listing = None
+                msg = "Nothing more to show."
+                self._update_context("assistant", msg)
+                return msg
+            return self._show_page(page)
+        self._listing = None
+
         # ------------------------------------------------
         # DIRECT NOTE COMMANDS (handled *before* planner)
         # ------------------------------------------------
-        # list notes (direct)
-        if self.notes.is_list_notes_cmd(user_query):
-            notes = self.notes.list_notes()
-            if not notes:
-                msg = "You have no notes."
-            else:
-                msg = "\n".join(f"{n['id']}. {n['text']}" for n in notes)
-            # update assistant context and last_answer so note flows remain consistent
-            self.last_answer = msg
-            self._update_context("assistant", msg)
-            return msg
+        # list notes (direct, first page; lazily paged)
+        if route == "list_notes":
+            return self._start_listing(self._notes_listing())
 
         # NOTE ALL (C mode)
-        if self.notes.is_note_all(user_query):
-            summary = self.notes.note_all(self.context)
+        if route == "note_all":
+            summary = self.notes.note_all(self.context, summary=self.summary.text())
             if not summary:
                 msg = "Nothing to summarise."
+            elif self._was_duplicate():
+                msg = f"Already noted.\n\n{summary}"
             else:
                 msg = f"All previous noted.\n\n{summary}"
-            self.last_answer = msg
+            # last_answer stays the real answer, so a repeat lands on the same note
             self._update_context("assistant", msg)
             return msg
 
         # NOTE PREVIOUS (A mode)
-        if self.notes.is_note_previous(user_query):
+        if route == "note_previous":
             if not self.last_answer:
                 msg = "Nothing above to note."
                 self._update_context("assistant", msg)
@@ -124,14 +388,16 @@ class MainAgent:
             summary = self.notes.note_previous(self.last_answer)
             if not summary:
                 msg = "Nothing appropriate to save."
+            elif self._was_duplicate():
+                msg = f"Already noted:\n{summary}"
             else:
                 msg = f"Previous noted:\n{summary}"
-            self.last_answer = msg
+            # last_answer stays the real answer, so a repeat lands on the same note
             self._update_context("assistant", msg)
             return msg
 
         # NOTE CONFIRMATION ("did you note?" style)
-        if self.notes.is_note_confirmation(user_query):
+        if route == "note_confirmation":
             if not self.last_answer:
                 msg = "Nothing to confirm."
                 self._update_context("assistant", msg)
@@ -139,14 +405,16 @@ class MainAgent:
             summary = self.notes.note_previous(self.last_answer)
             if not summary:
                 msg = "Nothing appropriate to save."
+            elif self._was_duplicate():
+                msg = f"Already noted:\n{summary}"
             else:
                 msg = f"Note added:\n{summary}"
-            self.last_answer = msg
+            # last_answer stays the real answer, so a repeat lands on the same note
             self._update_context("assistant", msg)
             return msg
 
         # NOTE CURRENT (B mode) — user intends to save the immediate Q+A; requires a Q+A interaction first
-        if self.notes.is_note_current(user_query):
+        if route == "note_current":
             # If they ask "note current" before we've answered, instruct them
             # We'll treat this as "must ask a question first" for clarity
             msg = "You must ask a question first to note the current Q+A."
@@ -156,11 +424,16 @@ class MainAgent:
         # ------------------------------------------------
         # NORMAL QUESTION FLOW → SmartPlanner → WorkerAgent
         # ------------------------------------------------
+        spec = None
+        if self.speculator is not None:
+            spec = self.speculator.start({"action": "answer_directly", "input": user_query, "context": compact})
+
         # Plan (defensive: planner.decide may accept context arg or not)
-        try:
-            plan = self.planner.decide(user_query, compact)
-        except TypeError:
-            plan = self.planner.decide(user_query)
+        with span("plan"):
+            try:
+                plan = self.planner.decide(user_query, compact)
+            except TypeError:
+                plan = self.planner.decide(user_query)
 
         # Ensure plan is a dict and contains keys we expect
         if not isinstance(plan, dict):
@@ -170,7 +443,18 @@ class MainAgent:
         plan.setdefault("input", user_query)
         plan.setdefault("context", compact)
 
-        result = self.worker.execute(plan)
+        with span("execute", action=plan.get("action")):
+            result = None
+            if spec is not None:
+                if plan.get("action") == "answer_directly" and plan.get("input") == user_query:
+                    try:
+                        result = spec.use(time.perf_counter(), timeout=remaining())
+                    except Exception as e:
+                        logger.warning("Speculative answer failed, answering again: %s", e)
+                else:
+                    spec.discard()
+            if result is None:
+                result = self.worker.execute(plan)
 
         # Extract answer (worker returns structured dict)
         #if result.get("status") == "ok":
@@ -178,14 +462,22 @@ class MainAgent:
         #else:
         #    # propagate worker error as user-friendly text
 
-        if result.get("status") == "ok":
+        action = result.get("action")
+        if result.get("status") == "ok" or action == "multi":
             output = result.get("output")
 
+            # Listings render page by page; they never become last_answer
+            if action in ("list_notes", "list_tasks") and isinstance(output, dict) and "items" in output:
+                if action == "list_notes":
+                    listing = self._notes_listing(first_page=output)
+                else:
+                    listing = self._tasks_listing(output)
+                return self._start_listing(listing)
+
             # Convert dicts/lists into readable text
-            if isinstance(output, (dict, list)):
-                answer = json.dumps(output, indent=2, ensure_ascii=False)
-            else:
-                answer = (str(output or "")).strip()
+            answer = self._format_output(action, output)
+            if action == "multi" and isinstance(output, list):
+                self._listing = self._step_listing(output)
 
         else:
             answer = result.get("error") or "An error occurred."        
@@ -193,6 +485,12 @@ class MainAgent:
         # set last_answer ONLY to actual assistant replies (not planner clarifications)
         self.last_answer = answer
         self.last_topic = self._extract_topic(user_query)
+        if result.get("status") == "ok" and action == "answer_directly":
+            self.summary.add(answer)
+        elif action == "multi":
+            for r in result.get("output") or []:
+                if r.get("status") == "ok" and r.get("action") == "answer_directly":
+                    self.summary.add(r.get("output") or "")
 
         # Update context with assistant reply
         self._update_context("assistant", answer)
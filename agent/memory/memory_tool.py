@@ -1,42 +1,39 @@
-import json
-import os
+from agent.facts_engine import FactsEngine
 
-MEMORY_FILE = "agent/memory/memory_store.json"
+_engine = None
 
 
-def _load_memory():
+def _facts():
     """
-    Loads persistent memory (facts) from JSON file.
-    Returns a dict: { "facts": [...] }
+    Internal helper.
+    Shared FactsEngine (facts live in agent/memory/memory_store.json under "facts",
+    resolved from the package, not the working directory).
     """
-    if not os.path.exists(MEMORY_FILE):
-        return {"facts": []}
+    global _engine
+    if _engine is None:
+        _engine = FactsEngine()
+    return _engine
 
-    with open(MEMORY_FILE, "r") as f:
-        return json.load(f)
-
-
-def _save_memory(memory):
-    """
-    Saves the full memory dict back to the JSON file.
-    """
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(memory, f, indent=2)
 
 def add_fact(fact: str):
     """
-    Adds a new fact to persistent memory.
+    Adds a new fact to persistent memory (near-duplicates are not stored twice).
     Example fact: "User prefers short answers."
     """
-    memory = _load_memory()
-    memory["facts"].append(fact)
-    _save_memory(memory)
-    return fact
+    return _facts().add_fact(fact)["text"]
+
 
 def get_facts():
     """
     Returns all stored persistent facts as a list of strings.
+    Prefer relevant_facts() when building prompts.
     """
-    memory = _load_memory()
-    return memory.get("facts", [])
+    return [f["text"] for f in _facts().list_facts()]
+
 
+def relevant_facts(query: str, k: int = None, token_budget: int = None):
+    """
+    Returns the facts worth showing the model for `query`:
+    preferences first, then the top-k by relevance, within a token budget.
+    """
+    return _facts().relevant(query, k=k, token_budget=token_budget)
@@ -0,0 +1,138 @@
+# Path: agent/memory/shards.py
+"""
+Per-user memory store shards.
+
+Without shards every user shares agent/memory/memory_store.json, so each
+write rewrites (and locks) everyone's notes, tasks and facts. With a user id,
+MainAgent reads and writes `<STORE_SHARDS_DIR>/<user>.json` instead; its
+cost and lock contention depend only on that user's data.
+
+A shard handle is the set of engines bound to one shard file (NotesEngine,
+TasksEngine, FactsEngine with their in-memory indexes). Handles are opened
+lazily on a user's first turn (which creates the file), kept in an LRU
+capped at STORE_SHARDS_MAX_OPEN, and closed after STORE_SHARDS_IDLE_S
+without use, so memory stays bounded however many users there are. Closing
+a handle only drops its indexes; the file stays and is reopened on demand.
+
+Each shard file has its own lock (store_lock(path)), and engines in other
+processes (agent/worker_pool.py) coordinate through the same flock.
+
+Environment:
+    STORE_SHARDS_DIR=agent/memory/users
+    STORE_SHARDS_MAX_OPEN=64
+    STORE_SHARDS_IDLE_S=600     0 → never close idle handles
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from agent.facts_engine import FactsEngine
+from agent.notes_engine import BASE_DIR, NotesEngine
+from agent.tasks_engine import TasksEngine
+
+_SAFE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class StoreShard:
+    __slots__ = ("user_id", "path", "notes", "tasks", "facts", "last_used")
+
+    def __init__(self, user_id: str, path: str):
+        self.user_id = user_id
+        self.path = path
+        self.notes = NotesEngine(path=path)
+        self.tasks = TasksEngine(path=path)
+        self.facts = FactsEngine(path=path)
+        self.last_used = time.monotonic()
+
+
+class ShardPool:
+    def __init__(self, root: str, max_open: int = 64, idle_s: float = 600.0):
+        self.root = root
+        self.max_open = max(1, max_open)
+        self.idle_s = idle_s
+        self._open: "OrderedDict[str, StoreShard]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "hits": 0, "evicted": 0, "idle_closed": 0}
+
+    def path_for(self, user_id: str) -> str:
+        if not user_id:
+            raise ValueError("user_id is required for a store shard.")
+        name = user_id if _SAFE_ID.fullmatch(user_id) else hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{name}.json")
+
+    def get(self, user_id: str) -> StoreShard:
+        """The user's shard handle, opened (and the shard created) on first use."""
+        now = time.monotonic()
+        with self._lock:
+            self._close_idle(now)
+            shard = self._open.get(user_id)
+            if shard is not None:
+                self._open.move_to_end(user_id)
+                self.stats["hits"] += 1
+                shard.last_used = now
+                return shard
+        # engines load the file outside the pool lock: one user's first turn never blocks another's
+        shard = StoreShard(user_id, self.path_for(user_id))
+        with self._lock:
+            existing = self._open.get(user_id)
+            if existing is not None:            # another thread opened it meanwhile
+                existing.last_used = now
+                return existing
+            self._open[user_id] = shard
+            self.stats["opened"] += 1
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+                self.stats["evicted"] += 1
+            return shard
+
+    def _close_idle(self, now: float):
+        if not self.idle_s:
+            return
+        # oldest first: stop at the first handle that is still fresh
+        while self._open:
+            user_id, shard = next(iter(self._open.items()))
+            if now - shard.last_used < self.idle_s:
+                break
+            del self._open[user_id]
+            self.stats["idle_closed"] += 1
+
+    def close_idle(self) -> int:
+        with self._lock:
+            before = len(self._open)
+            self._close_idle(time.monotonic())
+            return before - len(self._open)
+
+    def close(self, user_id: Optional[str] = None):
+        """Drop one user's handle, or all of them."""
+        with self._lock:
+            if user_id is None:
+                self._open.clear()
+            else:
+                self._open.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+
+_shared: Dict[str, ShardPool] = {}
+_shared_lock = threading.Lock()
+
+
+def shard_pool_from_env() -> ShardPool:
+    """Process-wide ShardPool for STORE_SHARDS_DIR."""
+    root = os.getenv("STORE_SHARDS_DIR") or os.path.join(BASE_DIR, "memory", "users")
+    with _shared_lock:
+        pool = _shared.get(root)
+        if pool is None:
+            pool = ShardPool(
+                root,
+                max_open=int(os.getenv("STORE_SHARDS_MAX_OPEN", "64") or 64),
+                idle_s=float(os.getenv("STORE_SHARDS_IDLE_S", "600") or 0),
+            )
+            _shared[root] = pool
+        return pool
@@ -7,22 +7,53 @@ Responsibilities:
 • Boolean detectors (is_note_previous, is_note_current, is_note_all, etc.)
 • CRUD operations for notes:
       list_notes()
+      list_notes_page(limit, cursor)
+      find_duplicate(text)
+      dedupe_store(policy, dry_run)
       note_previous(previous_answer)
       note_current(qa_text)
-      note_all(context)
+      note_all(context, summary)
 • Safe summarisation (no LLM)
-• Persistence via agent/memory/memory_store.json
+• Persistence via agent/memory/memory_store.json, shared with TasksEngine
+  and FactsEngine (and with other processes, see agent/worker_pool.py):
+      writes are atomic (temp file + os.replace), and read-modify-write
+      sequences hold store_lock() — a thread lock plus an flock on
+      memory_store.json.lock where fcntl is available
+• Every storage helper takes an optional store path (default MEM_PATH);
+  per-user shards (agent/memory/shards.py) are just other paths, each
+  with its own lock
 
 Rules:
 ------
 • Never save clarifications or meta text
 • Always compact long answers
 • Deterministic summarisation (offline-safe)
+• Near-duplicates are caught by a SimHash index (agent/dedup_index.py):
+      NOTES_DEDUP_POLICY=reject   return the existing note, flagged "duplicate" (default)
+      NOTES_DEDUP_POLICY=merge    keep one note, with the longer of the two texts
+      NOTES_DEDUP_POLICY=allow    always save
+      NOTES_DEDUP_DISTANCE=7      max differing fingerprint bits (0-7)
 """
 
+import bisect
 import json
 import os
-from typing import List, Dict
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:     # Windows: thread lock only (single process)
+    FCNTL_AVAILABLE = False
+
+from agent.tracing import span
+from agent.dedup_index import SimHashIndex, simhash
+
+DEDUP_POLICIES = ("reject", "merge", "allow")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MEM_PATH = os.path.join(BASE_DIR, "memory", "memory_store.json")
@@ -31,26 +62,95 @@ MEM_PATH = os.path.join(BASE_DIR, "memory", "memory_store.json")
 # ======================================================
 # Storage helpers
 # ======================================================
-def _ensure_store():
-    os.makedirs(os.path.dirname(MEM_PATH), exist_ok=True)
-    if not os.path.exists(MEM_PATH):
-        with open(MEM_PATH, "w", encoding="utf-8") as f:
-            json.dump({"notes": [], "tasks": []}, f, indent=2)
+def _ensure_store(path: Optional[str] = None):
+    path = path or MEM_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"notes": [], "tasks": [], "facts": []}, f, indent=2)
 
 
-def _load_store() -> Dict:
-    _ensure_store()
+def _load_store(path: Optional[str] = None) -> Dict:
+    path = path or MEM_PATH
+    _ensure_store(path)
     try:
-        with open(MEM_PATH, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except:
-        return {"notes": [], "tasks": []}
+        return {"notes": [], "tasks": [], "facts": []}
 
 
-def _save_store(data: Dict):
-    _ensure_store()
-    with open(MEM_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def _save_store(data: Dict, path: Optional[str] = None):
+    """Atomic: readers in other processes see the old file or the new one, never half of it."""
+    path = path or MEM_PATH
+    _ensure_store(path)
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(prefix=".memory_store.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def store_signature(path: Optional[str] = None) -> Optional[Tuple[int, int, int]]:
+    """Changes on every save (os.replace gives a new inode); engines reload their indexes on change."""
+    try:
+        st = os.stat(path or MEM_PATH)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+_thread_locks: "weakref.WeakValueDictionary[str, threading.RLock]" = weakref.WeakValueDictionary()
+_thread_locks_guard = threading.Lock()
+_lock_state = threading.local()
+
+
+def _thread_lock(path: str):
+    """One RLock per store file (dropped when nobody holds it), so shards never wait on each other."""
+    with _thread_locks_guard:
+        lock = _thread_locks.get(path)
+        if lock is None:
+            lock = _thread_locks[path] = threading.RLock()
+        return lock
+
+
+@contextmanager
+def store_lock(path: Optional[str] = None):
+    """
+    Exclusive access to the store for a load → modify → save sequence.
+    Re-entrant within a thread; across processes via flock on "<store>.lock".
+    """
+    path = os.path.abspath(path or MEM_PATH)
+    depths = getattr(_lock_state, "depths", None)
+    if depths is None:
+        depths = _lock_state.depths = {}
+    with _thread_lock(path):
+        depth = depths.get(path, 0)
+        if depth or not FCNTL_AVAILABLE:
+            depths[path] = depth + 1
+            try:
+                yield
+            finally:
+                depths[path] = depth
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            depths[path] = 1
+            try:
+                yield
+            finally:
+                depths.pop(path, None)
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
 
 
 # ======================================================
@@ -96,9 +196,17 @@ def _is_meta_text(text: str) -> bool:
 # NotesEngine
 # ======================================================
 class NotesEngine:
-    def __init__(self):
-        _ensure_store()
-        self._store = _load_store()
+    def __init__(self, path: Optional[str] = None):
+        self.path = path                # None → the shared store (MEM_PATH)
+        _ensure_store(path)
+        self._store = _load_store(path)
+
+        policy = os.getenv("NOTES_DEDUP_POLICY", "reject").strip().lower()
+        self.dedup_policy = policy if policy in DEDUP_POLICIES else "reject"
+        distance = int(os.getenv("NOTES_DEDUP_DISTANCE", "7") or 7)
+        self._dedup = SimHashIndex(max_distance=max(0, min(distance, 7)))
+        self._dedup_sig = None          # (count, last id) the index was built for
+        self.last_saved: Optional[Dict] = None
 
     # --------------------------------------------
     # Boolean command detectors
@@ -151,15 +259,44 @@ class NotesEngine:
     # Internal helpers
     # --------------------------------------------
     def _reload(self):
-        self._store = _load_store()
+        self._store = _load_store(self.path)
 
     def _persist(self):
-        _save_store(self._store)
+        with span("store", kind="notes"):
+            _save_store(self._store, self.path)
 
     def _next_id(self) -> int:
         notes = self._store.get("notes", [])
         return max((n.get("id", 0) for n in notes), default=0) + 1
 
+    @staticmethod
+    def _fingerprint(note: Dict) -> int:
+        fp = note.get("fp")
+        return int(fp, 16) if fp else simhash(note.get("text", ""))
+
+    def _sync_index(self):
+        """Rebuild the fingerprint index only when the store changed underneath us."""
+        notes = self._store.get("notes", [])
+        sig = (len(notes), notes[-1].get("id") if notes else 0)
+        if sig == self._dedup_sig:
+            return
+        self._dedup.clear()
+        for n in notes:
+            self._dedup.add(n.get("id"), self._fingerprint(n))
+        self._dedup_sig = sig
+
+    def _note_by_id(self, note_id: int) -> Optional[Dict]:
+        notes = self._store.get("notes", [])
+        i = bisect.bisect_left(notes, note_id, key=lambda n: n.get("id", 0))
+        return notes[i] if i < len(notes) and notes[i].get("id") == note_id else None
+
+    def _lookup_duplicate(self, fp: int) -> Optional[Dict]:
+        for note_id, _ in self._dedup.query(fp):
+            note = self._note_by_id(note_id)
+            if note is not None:
+                return note
+        return None
+
     # --------------------------------------------
     # Public API
     # --------------------------------------------
@@ -167,14 +304,96 @@ class NotesEngine:
         self._reload()
         return list(self._store.get("notes", []))
 
-    def add_note_raw(self, text: str) -> Dict:
-        """Direct add — no summarisation."""
+    def list_notes_page(self, limit: int = 20, cursor: Optional[int] = None) -> Dict:
+        """
+        One page of notes in id order, starting after note id `cursor`:
+        {"items": [...], "next_cursor": id | None, "total": n}
+        """
         self._reload()
-        n = {"id": self._next_id(), "text": text}
-        self._store.setdefault("notes", []).append(n)
-        self._persist()
+        notes = self._store.get("notes", [])
+        start = bisect.bisect_right(notes, int(cursor or 0), key=lambda n: n.get("id", 0))
+        items = notes[start:start + limit]
+        has_more = start + limit < len(notes)
+        return {
+            "items": items,
+            "next_cursor": items[-1].get("id") if has_more and items else None,
+            "total": len(notes),
+        }
+
+    def find_duplicate(self, text: str) -> Optional[Dict]:
+        """Closest existing near-duplicate of `text`, or None."""
+        self._reload()
+        self._sync_index()
+        return self._lookup_duplicate(simhash(text))
+
+    def add_note_raw(self, text: str, policy: Optional[str] = None) -> Dict:
+        """
+        Direct add — no summarisation. Near-duplicates follow the dedup policy;
+        for reject/merge the existing note is returned with "duplicate": True.
+        """
+        with store_lock(self.path):
+            self._reload()
+            self._sync_index()
+            policy = policy or self.dedup_policy
+            fp = simhash(text)
+
+            if policy != "allow":
+                existing = self._lookup_duplicate(fp)
+                if existing is not None:
+                    if policy == "merge" and len(text) > len(existing.get("text", "")):
+                        existing["text"] = text
+                        existing["fp"] = f"{fp:016x}"
+                        self._dedup.add(existing["id"], fp)
+                        self._persist()
+                    self.last_saved = dict(existing, duplicate=True)
+                    return self.last_saved
+
+            n = {"id": self._next_id(), "text": text, "fp": f"{fp:016x}"}
+            self._store.setdefault("notes", []).append(n)
+            self._persist()
+        self._dedup.add(n["id"], fp)
+        self._dedup_sig = (len(self._store["notes"]), n["id"])
+        self.last_saved = n
         return n
 
+    def dedupe_store(self, policy: str = "merge", dry_run: bool = False) -> Dict:
+        """
+        Backfill: collapse near-duplicates already in the store (oldest note wins
+        its id; with policy="merge" it takes the longest text of its group).
+        """
+        with store_lock(self.path):
+            return self._dedupe_locked(policy, dry_run)
+
+    def _dedupe_locked(self, policy: str, dry_run: bool) -> Dict:
+        self._reload()
+        notes = self._store.get("notes", [])
+        index = SimHashIndex(max_distance=self._dedup.max_distance)
+        kept: List[Dict] = []
+        by_id: Dict[int, Dict] = {}
+        for n in notes:
+            fp = self._fingerprint(n)
+            hits = index.query(fp)
+            if hits:
+                keeper = by_id[hits[0][0]]
+                if policy == "merge" and len(n.get("text", "")) > len(keeper.get("text", "")):
+                    keeper["text"] = n.get("text", "")
+                    keeper["fp"] = f"{fp:016x}"
+                    # later notes must be compared with the merged text, not the old bands
+                    index.remove(keeper.get("id"))
+                    index.add(keeper.get("id"), fp)
+                continue
+            n["fp"] = f"{fp:016x}"
+            index.add(n.get("id"), fp)
+            by_id[n.get("id")] = n
+            kept.append(n)
+
+        result = {"before": len(notes), "after": len(kept), "removed": len(notes) - len(kept)}
+        if not dry_run:
+            self._store["notes"] = kept
+            self._persist()
+            self._dedup_sig = None
+        return result
+
     # -------- A. note previous --------
     def note_previous(self, previous_answer: str) -> str:
         if not previous_answer or _is_meta_text(previous_answer):
@@ -192,20 +411,33 @@ class NotesEngine:
         return summary
 
     # -------- C. note all previous --------
-    def note_all(self, context: List[str]) -> str:
+    def note_all(self, context, summary: Optional[str] = None) -> str:
+        """
+        summary: the running summary (agent/summarizer.py) — saved as-is, no rescan.
+        Otherwise context: a ContextBuffer or a legacy list of "role: text" strings.
+        """
+        if summary:
+            self.add_note_raw(summary)
+            return summary
+
         if not context:
             return ""
 
         # Prefer assistant messages for summarisation
-        assistant_lines = [
-            line.split("assistant:", 1)[-1].strip()
-            for line in context
-            if line.lower().startswith("assistant:")
-        ]
+        if hasattr(context, "iter_role"):
+            assistant_lines = [t.text for t in context.iter_role("assistant")]
+            all_lines = [str(t) for t in context.last(30)]
+        else:
+            assistant_lines = [
+                line.split("assistant:", 1)[-1].strip()
+                for line in context
+                if line.lower().startswith("assistant:")
+            ]
+            all_lines = context[-30:]
         if assistant_lines:
             text_to_sum = "\n".join(assistant_lines[-8:])
         else:
-            text_to_sum = "\n".join(context[-30:])
+            text_to_sum = "\n".join(all_lines)
 
         summary = _naive_summarize(text_to_sum, max_words=60)
         self.add_note_raw(summary)
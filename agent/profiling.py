@@ -0,0 +1,168 @@
+# Path: agent/profiling.py
+"""
+On-demand profiling hooks for MainAgent.handle.
+
+Modes (combine with commas):
+- cprofile    → <out_dir>/<stamp>-<request_id>.pstats   (snakeviz / pstats / gprof2dot)
+- tracemalloc → <out_dir>/<stamp>-<request_id>.allocs.txt (top allocation sites for the turn)
+- stack       → <out_dir>/<stamp>-<request_id>.folded     (wall-clock samples, flamegraph.pl / speedscope)
+
+Triggers:
+- sample_rate : profile this fraction of requests (1.0 = every request)
+- slow_ms     : profile sampled requests but only keep the output when the turn
+                took longer than this threshold ("slow request" capture)
+
+Environment (or the matching run.py flags):
+    AGENT_PROFILE=cprofile,stack
+    AGENT_PROFILE_DIR=logs/profiles
+    AGENT_PROFILE_SAMPLE_RATE=0.1
+    AGENT_PROFILE_SLOW_MS=1500
+"""
+
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = {"cprofile", "tracemalloc", "stack"}
+
+# tracemalloc is process-wide (start/stop/reset_peak affect every thread), so at most one
+# turn in the process traces allocations; overlapping turns skip it, like cProfile does
+_tracemalloc_lock = threading.Lock()
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer and counts collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="agent-stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(parts))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    def __init__(self, modes: Iterable[str] = ("cprofile",), out_dir: str = "logs/profiles",
+                 sample_rate: float = 1.0, slow_ms: Optional[float] = None,
+                 stack_interval_ms: float = 5.0, top_allocs: int = 25):
+        self.modes = {m.strip() for m in modes if m.strip()}
+        unknown = self.modes - MODES
+        if unknown:
+            raise ValueError(f"Unknown profile mode(s): {', '.join(sorted(unknown))}")
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.stack_interval = stack_interval_ms / 1000.0
+        self.top_allocs = top_allocs
+        self._cprofile_lock = threading.Lock()   # only one cProfile may be active per process
+
+    @classmethod
+    def from_env(cls) -> Optional["RequestProfiler"]:
+        modes = os.getenv("AGENT_PROFILE")
+        if not modes:
+            return None
+        slow = os.getenv("AGENT_PROFILE_SLOW_MS")
+        return cls(
+            modes=modes.split(","),
+            out_dir=os.getenv("AGENT_PROFILE_DIR", "logs/profiles"),
+            sample_rate=float(os.getenv("AGENT_PROFILE_SAMPLE_RATE", "1.0")),
+            slow_ms=float(slow) if slow else None,
+        )
+
+    def run(self, request_id: str, fn: Callable, *args, **kwargs):
+        """Call fn(*args, **kwargs), profiling it when sampled."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return fn(*args, **kwargs)
+
+        prof = None
+        if "cprofile" in self.modes and self._cprofile_lock.acquire(blocking=False):
+            prof = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.stack_interval) if "stack" in self.modes else None
+        own_tracemalloc = False
+        before = None
+        traced = "tracemalloc" in self.modes and _tracemalloc_lock.acquire(blocking=False)
+        if traced:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                own_tracemalloc = True
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+
+        if sampler:
+            sampler.start()
+        if prof:
+            prof.enable()
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if prof:
+                prof.disable()
+                self._cprofile_lock.release()
+            if sampler:
+                sampler.stop()
+            after = peak = None
+            if traced:
+                try:
+                    after = tracemalloc.take_snapshot()
+                    peak = tracemalloc.get_traced_memory()[1]
+                    if own_tracemalloc:
+                        tracemalloc.stop()
+                finally:
+                    _tracemalloc_lock.release()
+
+            if self.slow_ms is None or elapsed_ms >= self.slow_ms:
+                self._write(request_id, elapsed_ms, prof, sampler, before, after, peak)
+
+    def _write(self, request_id, elapsed_ms, prof, sampler, before, after, peak):
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            stem = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{request_id or 'req'}")
+            if prof:
+                prof.dump_stats(f"{stem}.pstats")
+            if sampler:
+                sampler.write_folded(f"{stem}.folded")
+            if after is not None:
+                stats = after.compare_to(before, "lineno")
+                with open(f"{stem}.allocs.txt", "w", encoding="utf-8") as f:
+                    f.write(f"# request {request_id} took {elapsed_ms:.1f} ms; peak traced memory {peak} B\n")
+                    f.write(f"# top {self.top_allocs} allocation sites (net change over the turn)\n")
+                    for stat in stats[:self.top_allocs]:
+                        f.write(f"{stat}\n")
+            logger.info("Profile written for request %s (%.1f ms): %s.*", request_id, elapsed_ms, stem)
+        except OSError as e:
+            logger.warning("Could not write profile for %s: %s", request_id, e)
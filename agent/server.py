@@ -0,0 +1,629 @@
+# Path: agent/server.py
+"""
+Asyncio HTTP + WebSocket front-end for MainAgent (standard library only).
+
+Endpoints:
+    POST /chat     {"message": "...", "session_id": "optional", "user_id": "optional"}
+                   → {"session_id": ..., "request_id": ..., "reply": "..."}
+    GET  /ws       WebSocket (?session_id=...&user_id=... optional). Send {"message": ...}
+                   (or plain text) per turn; receive
+                       {"type": "token", "text": ...}    answer tokens as generated
+                       {"type": "chunk", "text": ...}    other output (listing lines)
+                       {"type": "done", "reply": ..., "session_id": ..., "request_id": ...}
+                   or {"type": "error", "status": ..., "error": ...}
+    GET  /health   liveness: 200 while the process is up (+ in-flight / session counts)
+    GET  /ready    readiness: 200 while accepting turns, 503 when draining or saturated
+
+Concurrency:
+- MainAgent is blocking; turns run in a thread pool of SERVER_MAX_INFLIGHT
+  threads behind a semaphore of the same size. A turn that cannot start within
+  SERVER_QUEUE_TIMEOUT_S is rejected with 503 + Retry-After (error frame on WS).
+- One MainAgent per session id (LRU, SERVER_MAX_SESSIONS). A per-session lock
+  keeps the turns of one conversation in order; different sessions run in parallel.
+- A user id (body / X-User-Id header / ?user_id=) is bound to the session when
+  it is created: its notes, tasks and facts live in that user's store shard
+  (agent/memory/shards.py). Reusing the session under another (or no) user id is a 403.
+- Backpressure: every write awaits drain(). Streamed tokens pass through a
+  bounded queue (SERVER_STREAM_BUFFER), so a slow WebSocket reader pauses the
+  generating thread instead of buffering without limit. A connection reads its
+  next message only after the current turn has finished.
+- Graceful shutdown (SIGTERM/SIGINT or stop()): stop accepting, /ready → 503,
+  let in-flight turns finish (up to SERVER_DRAIN_TIMEOUT_S), then close
+  WebSockets with 1001 and drop idle connections.
+
+Run:
+    python -m agent.server --host 0.0.0.0 --port 8080
+    python -m agent.server --workers 4      # sessions spread over 4 processes (agent/worker_pool.py);
+                                            # replies arrive whole, without token frames
+"""
+
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import signal
+import struct
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http import HTTPStatus
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from agent.llm.streaming import stream_scope
+from agent.tracing import new_request_id
+
+logger = logging.getLogger(__name__)
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_BODY_BYTES = 1 << 20
+HEADER_TIMEOUT_S = 30.0
+KEEPALIVE_TIMEOUT_S = 60.0
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)) or default)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)) or default)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class _Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Dict:
+        try:
+            data = json.loads(self.body.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, ValueError):
+            raise HTTPError(400, "Body must be JSON.")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object.")
+        return data
+
+
+class _Session:
+    __slots__ = ("agent", "lock", "user_id")
+
+    def __init__(self, agent: "asyncio.Future", user_id: Optional[str] = None):
+        self.agent = agent              # future: MainAgent is built in the thread pool
+        self.lock = asyncio.Lock()
+        self.user_id = user_id
+
+
+class _TokenPipe:
+    """Worker thread → event loop. put() blocks while the bounded queue is full (backpressure)."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.tokens = 0
+        self.closed = False
+
+    def put(self, kind: str, text: str):
+        if self.closed:
+            return
+        if kind == "token":
+            self.tokens += 1
+        fut = asyncio.run_coroutine_threadsafe(self.queue.put((kind, text)), self.loop)
+        while True:
+            try:
+                fut.result(timeout=0.5)
+                return
+            except FutureTimeout:
+                if self.closed:         # client went away: stop waiting for it
+                    fut.cancel()
+                    return
+
+    def close(self):
+        self.closed = True
+
+
+# ======================================================
+# WebSocket (RFC 6455, server side)
+# ======================================================
+def _unmask(data: bytes, mask: bytes) -> bytes:
+    n = len(data)
+    if not n:
+        return data
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")
+
+
+class _WebSocket:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_message: int):
+        self.reader = reader
+        self.writer = writer
+        self.max_message = max_message
+        self.closed = False
+
+    async def _send_frame(self, opcode: int, payload: bytes = b""):
+        n = len(payload)
+        if n < 126:
+            head = struct.pack("!BB", 0x80 | opcode, n)
+        elif n < 1 << 16:
+            head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        else:
+            head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+        self.writer.write(head + payload)
+        await self.writer.drain()
+
+    async def send_json(self, obj: Dict):
+        await self._send_frame(OP_TEXT, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self._send_frame(OP_CLOSE, struct.pack("!H", code) + reason.encode("utf-8")[:120])
+        except (ConnectionError, RuntimeError):
+            pass
+
+    async def recv(self) -> Optional[str]:
+        """Next text message; None once the peer closed. Pings are answered here."""
+        parts, size, opcode = [], 0, None
+        while True:
+            b1, b2 = await self.reader.readexactly(2)
+            fin, op = b1 & 0x80, b1 & 0x0F
+            length = b2 & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            if not b2 & 0x80:
+                await self.close(1002, "client frames must be masked")
+                return None
+            if size + length > self.max_message:
+                await self.close(1009, "message too big")
+                return None
+            mask = await self.reader.readexactly(4)
+            payload = _unmask(await self.reader.readexactly(length), mask)
+
+            if op == OP_PING:
+                await self._send_frame(OP_PONG, payload)
+                continue
+            if op == OP_PONG:
+                continue
+            if op == OP_CLOSE:
+                await self.close()
+                return None
+            if op in (OP_TEXT, OP_BINARY):
+                opcode, parts, size = op, [], 0
+            elif op != OP_CONT or opcode is None:
+                await self.close(1002, "unexpected frame")
+                return None
+            parts.append(payload)
+            size += length
+            if fin:
+                try:
+                    return b"".join(parts).decode("utf-8")
+                except UnicodeDecodeError:
+                    await self.close(1007, "invalid utf-8")
+                    return None
+
+
+# ======================================================
+# Server
+# ======================================================
+def _default_factory(session_id: str, user_id: Optional[str] = None):
+    from agent.main_agent import MainAgent
+    return MainAgent(session_id=session_id, user_id=user_id)
+
+
+class AgentServer:
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 agent_factory: Optional[Callable[[str], object]] = None,
+                 max_inflight: Optional[int] = None, max_sessions: Optional[int] = None,
+                 queue_timeout_s: Optional[float] = None, drain_timeout_s: Optional[float] = None,
+                 stream_buffer: Optional[int] = None, max_body: int = MAX_BODY_BYTES):
+        self.host = host or os.getenv("SERVER_HOST", "127.0.0.1")
+        self.port = port if port is not None else _env_int("SERVER_PORT", 8080)
+        self.agent_factory = agent_factory or _default_factory
+        self.max_inflight = max_inflight or _env_int("SERVER_MAX_INFLIGHT", 8)
+        self.max_sessions = max_sessions or _env_int("SERVER_MAX_SESSIONS", 256)
+        self.queue_timeout_s = queue_timeout_s if queue_timeout_s is not None else _env_float("SERVER_QUEUE_TIMEOUT_S", 5.0)
+        self.drain_timeout_s = drain_timeout_s if drain_timeout_s is not None else _env_float("SERVER_DRAIN_TIMEOUT_S", 30.0)
+        self.stream_buffer = stream_buffer or _env_int("SERVER_STREAM_BUFFER", 64)
+        self.max_body = max_body
+
+        self.draining = False
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._executor = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="turn")
+        # agents are built on their own threads: a new session never queues behind running turns
+        self._setup = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._inflight = 0
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._connections = set()
+        self._websockets = set()
+        self.stats = {"requests": 0, "turns": 0, "rejected": 0, "errors": 0, "ws_connections": 0}
+
+    # --------------------------------------------
+    # Lifecycle
+    # --------------------------------------------
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._server = await asyncio.start_server(self._on_connect, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Agent server listening on %s:%d", self.host, self.port)
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Stop accepting, let in-flight turns finish (bounded), then close connections."""
+        self.draining = True
+        if self._server is not None:
+            self._server.close()
+        timeout = self.drain_timeout_s if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Drain timed out with %d turn(s) still running", self._inflight)
+        for ws in list(self._websockets):
+            await ws.close(1001, "server shutting down")
+        for writer in list(self._connections):
+            writer.close()
+        if self._server is not None:
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._setup.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def ready(self) -> bool:
+        return self._server is not None and not self.draining and self._inflight < self.max_inflight
+
+    # --------------------------------------------
+    # Sessions + turns
+    # --------------------------------------------
+    async def _session(self, session_id: str, user_id: Optional[str] = None) -> Tuple[_Session, object]:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(session_id)
+        if session is None:
+            # factories only see a user_id when there is one (custom factories may take session_id alone)
+            factory = functools.partial(self.agent_factory, session_id, user_id=user_id) if user_id \
+                else functools.partial(self.agent_factory, session_id)
+            session = _Session(loop.run_in_executor(self._setup, factory), user_id)
+            self._sessions[session_id] = session
+            self._evict()
+        else:
+            if session.user_id != user_id:
+                # a bound session only serves its own user (a missing user_id is not a wildcard)
+                raise HTTPError(403, "session_id belongs to another user.")
+            self._sessions.move_to_end(session_id)
+        try:
+            agent = await asyncio.shield(session.agent)
+        except Exception as e:
+            if self._sessions.get(session_id) is session:
+                del self._sessions[session_id]
+            logger.exception("Session %s could not be created: %s", session_id, e)
+            raise HTTPError(500, "Agent could not be created.")
+        return session, agent
+
+    def _evict(self):
+        # least recently used first; never a session that is mid-turn
+        for sid in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+            s = self._sessions[sid]
+            if not s.lock.locked() and s.agent.done():
+                del self._sessions[sid]
+
+    async def _run_turn(self, session_id: str, message: str, request_id: str,
+                        pipe: Optional[_TokenPipe] = None, user_id: Optional[str] = None) -> str:
+        if self.draining:
+            raise HTTPError(503, "Server is shutting down.", retry_after=1)
+        session, agent = await self._session(session_id, user_id)
+        async with session.lock:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout_s)
+            except asyncio.TimeoutError:
+                self.stats["rejected"] += 1
+                raise HTTPError(503, "Too many requests in flight.", retry_after=1)
+            self._inflight += 1
+            self._idle.clear()
+            try:
+                loop = asyncio.get_running_loop()
+                reply = await loop.run_in_executor(self._executor, self._call_agent, agent, message, request_id, pipe)
+                self.stats["turns"] += 1
+                return reply
+            except HTTPError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.exception("Turn failed for session %s: %s", session_id, e)
+                raise HTTPError(500, "Internal error.")
+            finally:
+                self._inflight -= 1
+                self._slots.release()
+                if self._inflight == 0:
+                    self._idle.set()
+
+    @staticmethod
+    def _call_agent(agent, message: str, request_id: str, pipe: Optional[_TokenPipe]) -> str:
+        """Runs in the thread pool. Answer tokens go to the pipe as they are generated."""
+        sink = (lambda text: pipe.put("token", text)) if pipe is not None else None
+        parts = []
+        with stream_scope(sink):
+            for piece in agent.handle_stream(message, request_id=request_id):
+                piece = piece.get("output", "") if isinstance(piece, dict) else str(piece)
+                parts.append(piece)
+                # tokens already carried the answer; other output (listings) goes line by line
+                if pipe is not None and not pipe.tokens:
+                    pipe.put("chunk", piece)
+        return "\n".join(parts)
+
+    # --------------------------------------------
+    # Connections
+    # --------------------------------------------
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            first = True
+            while True:
+                try:
+                    req = await self._read_request(reader, HEADER_TIMEOUT_S if first else KEEPALIVE_TIMEOUT_S)
+                except HTTPError as e:
+                    await self._send(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if req is None:
+                    break
+                first = False
+                self.stats["requests"] += 1
+                if req.path == "/ws" and req.headers.get("upgrade", "").lower() == "websocket":
+                    await self._serve_ws(req, reader, writer)
+                    break
+                keep_alive = req.headers.get("connection", "").lower() != "close" and not self.draining
+                await self._serve_http(req, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader, timeout: float) -> Optional[_Request]:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Request headers too large.")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "Content-Length required.")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HTTPError(400, "Bad Content-Length.")
+        if length > self.max_body:
+            raise HTTPError(413, "Request body too large.")
+        body = await asyncio.wait_for(reader.readexactly(length), HEADER_TIMEOUT_S) if length else b""
+        return _Request(method.upper(), target, headers, body)
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: Dict,
+                    headers: Optional[Dict[str, str]] = None, keep_alive: bool = True):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    def _session_id(self, value: Optional[str]) -> str:
+        if not value:
+            return uuid.uuid4().hex[:12]
+        if not _SESSION_ID.match(value):
+            raise HTTPError(400, "session_id must be 1-64 characters of [A-Za-z0-9_-].")
+        return value
+
+    def _user_id(self, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        if not _SESSION_ID.match(value):
+            raise HTTPError(400, "user_id must be 1-64 characters of [A-Za-z0-9_-].")
+        return value
+
+    # --------------------------------------------
+    # HTTP
+    # --------------------------------------------
+    async def _serve_http(self, req: _Request, writer: asyncio.StreamWriter, keep_alive: bool):
+        try:
+            if req.path == "/health":
+                if req.method != "GET":
+                    raise HTTPError(405, "Use GET.")
+                await self._send(writer, 200, {
+                    "status": "ok", "inflight": self._inflight, "sessions": len(self._sessions),
+                    "draining": self.draining, **self.stats,
+                }, keep_alive=keep_alive)
+            elif req.path == "/ready":
+                if req.method != "GET":
+                    raise HTTPError(405, "Use GET.")
+                if self.ready:
+                    await self._send(writer, 200, {"status": "ready"}, keep_alive=keep_alive)
+                else:
+                    state = "draining" if self.draining else "busy"
+                    await self._send(writer, 503, {"status": state}, {"Retry-After": "1"}, keep_alive=keep_alive)
+            elif req.path == "/chat":
+                if req.method != "POST":
+                    raise HTTPError(405, "Use POST.")
+                data = req.json()
+                message = data.get("message")
+                if not isinstance(message, str) or not message.strip():
+                    raise HTTPError(400, "'message' must be a non-empty string.")
+                session_id = self._session_id(data.get("session_id") or req.headers.get("x-session-id"))
+                user_id = self._user_id(data.get("user_id") or req.headers.get("x-user-id"))
+                request_id = req.headers.get("x-request-id") or new_request_id()
+                reply = await self._run_turn(session_id, message, request_id, user_id=user_id)
+                await self._send(writer, 200, {"session_id": session_id, "request_id": request_id, "reply": reply},
+                                 {"X-Request-ID": request_id}, keep_alive=keep_alive)
+            else:
+                raise HTTPError(404, f"Unknown path {req.path}")
+        except HTTPError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+            await self._send(writer, e.status, {"error": e.message}, headers, keep_alive=keep_alive)
+
+    # --------------------------------------------
+    # WebSocket
+    # --------------------------------------------
+    async def _serve_ws(self, req: _Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        key = req.headers.get("sec-websocket-key")
+        if req.method != "GET" or not key or req.headers.get("sec-websocket-version") != "13":
+            await self._send(writer, 400, {"error": "Bad WebSocket handshake."}, keep_alive=False)
+            return
+        try:
+            session_id = self._session_id(req.query.get("session_id"))
+            user_id = self._user_id(req.query.get("user_id") or req.headers.get("x-user-id"))
+        except HTTPError as e:
+            await self._send(writer, e.status, {"error": e.message}, keep_alive=False)
+            return
+        if self.draining:
+            await self._send(writer, 503, {"error": "Server is shutting down."}, {"Retry-After": "1"}, keep_alive=False)
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+
+        ws = _WebSocket(reader, writer, self.max_body)
+        self._websockets.add(ws)
+        self.stats["ws_connections"] += 1
+        try:
+            await ws.send_json({"type": "session", "session_id": session_id})
+            while not self.draining:
+                text = await ws.recv()
+                if text is None:
+                    break
+                message, request_id = text, new_request_id()
+                try:
+                    data = json.loads(text)
+                except ValueError:
+                    data = None
+                try:
+                    if isinstance(data, dict):
+                        message = data.get("message")
+                        session_id = self._session_id(data.get("session_id") or session_id)
+                        user_id = self._user_id(data.get("user_id") or user_id)
+                        request_id = data.get("request_id") or request_id
+                    if not isinstance(message, str) or not message.strip():
+                        raise HTTPError(400, "'message' must be a non-empty string.")
+                    await self._ws_turn(ws, session_id, message, request_id, user_id)
+                except HTTPError as e:
+                    await ws.send_json({"type": "error", "status": e.status, "error": e.message,
+                                        "request_id": request_id})
+            await ws.close(1001 if self.draining else 1000)
+        finally:
+            self._websockets.discard(ws)
+
+    async def _ws_turn(self, ws: _WebSocket, session_id: str, message: str, request_id: str,
+                       user_id: Optional[str] = None):
+        pipe = _TokenPipe(asyncio.get_running_loop(), self.stream_buffer)
+        turn = asyncio.ensure_future(self._run_turn(session_id, message, request_id, pipe, user_id))
+        try:
+            while True:
+                getter = asyncio.ensure_future(pipe.queue.get())
+                done, _ = await asyncio.wait({getter, turn}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    kind, text = getter.result()
+                    await ws.send_json({"type": kind, "text": text})
+                    continue
+                getter.cancel()
+                while not pipe.queue.empty():
+                    kind, text = pipe.queue.get_nowait()
+                    await ws.send_json({"type": kind, "text": text})
+                break
+            reply = turn.result()
+            await ws.send_json({"type": "done", "reply": reply, "session_id": session_id, "request_id": request_id})
+        finally:
+            # client gone mid-turn: release the generating thread; the turn itself
+            # still completes (and is counted by the drain logic)
+            pipe.close()
+            if not turn.done():
+                turn.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+# ======================================================
+# CLI
+# ======================================================
+async def _serve(args):
+    pool = None
+    if args.workers:
+        from agent.worker_pool import WorkerPool
+        pool = WorkerPool(workers=args.workers)
+    server = AgentServer(host=args.host, port=args.port, agent_factory=pool.session if pool else None)
+    await server.start()
+    print(f"Agent server on http://{server.host}:{server.port} (ws://{server.host}:{server.port}/ws)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:     # Windows: Ctrl+C raises KeyboardInterrupt instead
+            pass
+    await stop.wait()
+    print("Draining in-flight turns...")
+    await server.stop()
+    if pool is not None:
+        pool.close()
+
+
+def main():
+    from agent.logging_config import configure_logging
+    from agent.tracing import maybe_serve_from_env
+
+    ap = argparse.ArgumentParser(description="AI Concierge Agent HTTP/WebSocket server")
+    ap.add_argument("--host", default=None, help="default SERVER_HOST or 127.0.0.1")
+    ap.add_argument("--port", type=int, default=None, help="default SERVER_PORT or 8080")
+    ap.add_argument("--workers", type=int, default=0, help="run turns in N worker processes (0 = in-process)")
+    args = ap.parse_args()
+
+    configure_logging(level=os.getenv("LOG_LEVEL", "INFO"))
+    maybe_serve_from_env()
+    asyncio.run(_serve(args))
+
+
+if __name__ == "__main__":
+    main()
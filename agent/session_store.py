@@ -0,0 +1,276 @@
+# Path: agent/session_store.py
+"""
+Session snapshot / resume.
+
+Binary format (little-endian, versioned):
+    header : b"ACSS" + u8 version
+    record : u32 payload_len + u8 type + payload
+        TURN  (1): f64 ts, u32 tokens, u16 role_len, role utf-8, text utf-8
+        STATE (2): u32 answer_len, last_answer utf-8, last_topic utf-8
+
+Records are append-only: a turn is written once, when it happens, and the
+latest STATE record wins on load. A torn trailing record (crash mid-write) is
+ignored on load and cut off the file before the next append, so later
+records stay readable. Replaying into a ContextBuffer keeps only the newest `capacity` turns,
+and MainAgent periodically compacts a session back to a single snapshot.
+
+Backends:
+- DirectorySessionStore(root)   one <session>.sess file per session (append = O(new turns))
+- SQLiteSessionStore(path)      one row per appended chunk, WAL mode
+
+Both load a session only when it is first requested, so a store can hold
+thousands of sessions without any start-up scan.
+
+Environment:
+    AGENT_SESSION_DIR=data/sessions   or   AGENT_SESSION_DB=data/sessions.db
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import struct
+import threading
+from typing import Iterable, List, Optional
+
+from agent.context_buffer import ContextBuffer, Turn
+
+MAGIC = b"ACSS"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sB")
+_RECORD = struct.Struct("<IB")
+_TURN = struct.Struct("<dIH")
+_STATE = struct.Struct("<I")
+
+REC_TURN = 1
+REC_STATE = 2
+
+
+class SessionFormatError(ValueError):
+    pass
+
+
+class SessionState:
+    __slots__ = ("turns", "last_answer", "last_topic")
+
+    def __init__(self, turns: Optional[List[Turn]] = None, last_answer: str = "", last_topic: str = ""):
+        self.turns = turns or []
+        self.last_answer = last_answer
+        self.last_topic = last_topic
+
+
+# ======================================================
+# Encoding
+# ======================================================
+def encode_header() -> bytes:
+    return _HEADER.pack(MAGIC, VERSION)
+
+
+def encode_turns(turns: Iterable[Turn]) -> bytes:
+    out = bytearray()
+    for t in turns:
+        role = t.role.encode("utf-8")
+        text = t.text.encode("utf-8")
+        out += _RECORD.pack(_TURN.size + len(role) + len(text), REC_TURN)
+        out += _TURN.pack(t.ts, t.tokens, len(role))
+        out += role
+        out += text
+    return bytes(out)
+
+
+def encode_state(last_answer: str, last_topic: str) -> bytes:
+    answer = (last_answer or "").encode("utf-8")
+    topic = (last_topic or "").encode("utf-8")
+    return (
+        _RECORD.pack(_STATE.size + len(answer) + len(topic), REC_STATE)
+        + _STATE.pack(len(answer)) + answer + topic
+    )
+
+
+def encode_snapshot(turns: Iterable[Turn], last_answer: str, last_topic: str) -> bytes:
+    return encode_header() + encode_turns(turns) + encode_state(last_answer, last_topic)
+
+
+def complete_length(data: bytes) -> int:
+    """Bytes up to the end of the last whole record (0 if there is no valid header)."""
+    if len(data) < _HEADER.size or _HEADER.unpack_from(data, 0) != (MAGIC, VERSION):
+        return 0
+    pos, end = _HEADER.size, len(data)
+    while pos + _RECORD.size <= end:
+        length, _ = _RECORD.unpack_from(data, pos)
+        if pos + _RECORD.size + length > end:
+            break
+        pos += _RECORD.size + length
+    return pos
+
+
+def decode_session(data: bytes, capacity: int = 20) -> SessionState:
+    """Replay a snapshot (+ any appended records). Only the newest `capacity` turns are kept."""
+    if len(data) < _HEADER.size:
+        raise SessionFormatError("session data too short")
+    magic, version = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise SessionFormatError("not a session snapshot")
+    if version != VERSION:
+        raise SessionFormatError(f"unsupported session version {version}")
+
+    buf = ContextBuffer(capacity)
+    state = SessionState()
+    view = memoryview(data)
+    pos = _HEADER.size
+    end = len(data)
+    while pos + _RECORD.size <= end:
+        length, kind = _RECORD.unpack_from(data, pos)
+        body = pos + _RECORD.size
+        if body + length > end:
+            break   # torn trailing record
+        if kind == REC_TURN:
+            ts, tokens, role_len = _TURN.unpack_from(data, body)
+            p = body + _TURN.size
+            role = str(view[p:p + role_len], "utf-8")
+            text = str(view[p + role_len:body + length], "utf-8")
+            buf.append_turn(Turn(role, text, ts, tokens))
+        elif kind == REC_STATE:
+            (answer_len,) = _STATE.unpack_from(data, body)
+            p = body + _STATE.size
+            state.last_answer = str(view[p:p + answer_len], "utf-8")
+            state.last_topic = str(view[p + answer_len:body + length], "utf-8")
+        # unknown record types are skipped (forward compatible)
+        pos = body + length
+
+    state.turns = list(buf)
+    return state
+
+
+# ======================================================
+# Backends
+# ======================================================
+class DirectorySessionStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, session_id: str) -> str:
+        if re.fullmatch(r"[A-Za-z0-9_.-]{1,64}", session_id) and not session_id.startswith("."):
+            name = session_id
+        else:
+            name = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{name}.sess")
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        path = self._path(session_id)
+        with self._lock:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+            valid = complete_length(data)
+            if valid and valid < len(data):
+                # torn tail (crash mid-append): cut it, or the next append would land behind it
+                with open(path, "r+b") as f:
+                    f.truncate(valid)
+                data = data[:valid]
+        return data
+
+    def append(self, session_id: str, records: bytes):
+        if not records:
+            return
+        path = self._path(session_id)
+        with self._lock, open(path, "ab") as f:
+            start = f.tell()
+            try:
+                if start == 0:
+                    f.write(encode_header())
+                f.write(records)
+                f.flush()
+            except BaseException:
+                f.truncate(start)       # never leave half a record for later appends to follow
+                raise
+
+    def write(self, session_id: str, snapshot: bytes):
+        path = self._path(session_id)
+        tmp = f"{path}.tmp"
+        with self._lock:
+            with open(tmp, "wb") as f:
+                f.write(snapshot)
+            os.replace(tmp, path)
+
+    def delete(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore:
+    def __init__(self, path: str):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_records ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id TEXT NOT NULL,"
+            " data BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_session_records ON session_records(session_id, seq)")
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM session_records WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        if not rows:
+            return None
+        return b"".join(r[0] for r in rows)
+
+    def append(self, session_id: str, records: bytes):
+        if not records:
+            return
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM session_records WHERE session_id = ? LIMIT 1", (session_id,)
+            ).fetchone()
+            data = records if exists else encode_header() + records
+            self._conn.execute("INSERT INTO session_records (session_id, data) VALUES (?, ?)", (session_id, data))
+
+    def write(self, session_id: str, snapshot: bytes):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM session_records WHERE session_id = ?", (session_id,))
+                self._conn.execute("INSERT INTO session_records (session_id, data) VALUES (?, ?)", (session_id, snapshot))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_records WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def session_store_from_env():
+    """DirectorySessionStore / SQLiteSessionStore from env, or None (no persistence)."""
+    db = os.getenv("AGENT_SESSION_DB")
+    if db:
+        return SQLiteSessionStore(db)
+    root = os.getenv("AGENT_SESSION_DIR")
+    if root:
+        return DirectorySessionStore(root)
+    return None
@@ -0,0 +1,172 @@
+# Path: agent/speculation.py
+"""
+Speculative answer generation, run alongside planning.
+
+Most turns end up as answer_directly, yet the answer call normally waits for
+the planner. With speculation on, MainAgent starts the answer call in a worker
+thread at the same time as the planner call:
+
+- planner says answer_directly → the speculative result is used (hit); the
+  turn costs max(plan, answer) instead of plan + answer. A streaming client
+  gets the answer replayed through its sink once the plan agrees.
+- planner picks a tool         → the speculation is cancelled if it has not
+  started, otherwise its result is discarded (miss); its tokens count as waste
+
+Only queries the rule-based planner would also send to answer_directly are
+speculated on (cheap predictor, keeps the miss rate down).
+
+stats() reports hit rate, wasted calls/tokens and planner time saved, which
+shows whether the latency win pays for the extra tokens.
+
+Environment:
+    AGENT_SPECULATIVE=1         enable (default off)
+    AGENT_SPECULATIVE_WORKERS=4  threads shared by all sessions in the process
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from agent.llm.streaming import replay, stream_scope
+from agent.llm.usage import action_scope, capture_usage
+from agent.tracing import span
+
+logger = logging.getLogger(__name__)
+
+_pools: Dict[int, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _shared_pool(workers: int) -> ThreadPoolExecutor:
+    """One pool per size for the whole process: every MainAgent shares it instead of owning threads."""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculate")
+        return pool
+
+
+def speculation_enabled() -> bool:
+    return os.getenv("AGENT_SPECULATIVE", "0").lower() in {"1", "true", "yes", "on"}
+
+
+class Speculation:
+    __slots__ = ("owner", "future", "started", "finished", "records")
+
+    def __init__(self, owner: "SpeculativeAnswerer", future: Optional[Future], started: float):
+        self.owner = owner
+        self.future = future
+        self.started = started
+        self.finished: Optional[float] = None
+        self.records: list = []
+
+    def use(self, planned_at: float, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Planner confirmed answer_directly: wait for (usually finished) speculative result.
+        The answer was generated without a sink, so it is replayed to the turn's sink here.
+        """
+        result = self.future.result(timeout=None if timeout is None else max(timeout, 0.0))
+        self.owner._hit(self, planned_at)
+        if isinstance(result, dict) and result.get("status") == "ok" and isinstance(result.get("output"), str):
+            replay(result["output"])
+        return result
+
+    def discard(self):
+        """Planner chose something else: cancel if queued, otherwise let it finish unused."""
+        if self.future.cancel():
+            self.owner._count("cancelled")
+            return
+        self.owner._count("misses")
+        self.future.add_done_callback(lambda _: self.owner._wasted(self))
+
+
+class SpeculativeAnswerer:
+    def __init__(self, answer: Callable[[Dict], Dict], predict: Optional[Callable[[str], bool]] = None,
+                 max_workers: Optional[int] = None):
+        """
+        answer : fn(plan) -> worker result (e.g. WorkerAgent._answer_directly)
+        predict: fn(user_query) -> bool, True if worth speculating on
+        """
+        self.answer = answer
+        self.predict = predict
+        workers = max_workers or int(os.getenv("AGENT_SPECULATIVE_WORKERS", "4") or 4)
+        self._pool = _shared_pool(workers)
+        self._pending: set = set()          # this answerer's queued / running speculations
+        self._lock = threading.Lock()
+        self._stats = {
+            "started": 0, "skipped": 0, "hits": 0, "misses": 0, "cancelled": 0,
+            "wasted_calls": 0, "wasted_tokens": 0, "saved_ms": 0.0,
+        }
+
+    def _count(self, key: str, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def start(self, plan: Dict[str, Any]) -> Optional[Speculation]:
+        query = plan.get("input", "")
+        if self.predict is not None:
+            try:
+                if not self.predict(query):
+                    self._count("skipped")
+                    return None
+            except Exception as e:
+                logger.debug("Speculation predictor failed: %s", e)
+                self._count("skipped")
+                return None
+
+        # copy_context: request id, session and priority follow the call into the pool
+        ctx = contextvars.copy_context()
+        spec = Speculation(self, None, time.perf_counter())
+        spec.future = self._pool.submit(ctx.run, self._run, spec, plan)
+        with self._lock:
+            self._pending.add(spec.future)
+        spec.future.add_done_callback(self._done)
+        self._count("started")
+        return spec
+
+    def _run(self, spec: Speculation, plan: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            # stream_scope(None): a speculative answer must not reach the client before the plan agrees
+            with span("speculate"), action_scope("answer_directly"), capture_usage() as records, stream_scope(None):
+                spec.records = records
+                return self.answer(plan)
+        finally:
+            spec.finished = time.perf_counter()
+
+    def _hit(self, spec: Speculation, planned_at: float):
+        # overlap = how long the answer ran while the planner was still working
+        end = spec.finished or time.perf_counter()
+        saved = max(0.0, min(planned_at, end) - spec.started) * 1000
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["saved_ms"] += saved
+
+    def _wasted(self, spec: Speculation):
+        tokens = sum(r.prompt_tokens + r.completion_tokens for r in spec.records)
+        with self._lock:
+            self._stats["wasted_calls"] += len(spec.records)
+            self._stats["wasted_tokens"] += tokens
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            s = dict(self._stats)
+        decided = s["hits"] + s["misses"] + s["cancelled"]
+        s["hit_rate"] = round(s["hits"] / decided, 4) if decided else 0.0
+        s["saved_ms"] = round(s["saved_ms"], 2)
+        return s
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def shutdown(self):
+        """Cancel this answerer's queued speculations (the pool is shared and stays up)."""
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.cancel()
+
@@ -0,0 +1,489 @@
+# Path: agent/store_transfer.py
+"""
+Streaming bulk export / import of the memory store (notes, tasks, facts) as JSONL.
+
+memory_store.json is one JSON document, so the engines load it whole. These
+tools never do: the store is read with an incremental parser (raw_decode over
+a sliding buffer, one record at a time) and rewritten by streaming the old
+file into a temp file, so memory depends on the batch size, not the store.
+
+JSONL format (one object per line):
+    {"type": "header", "format": "ai-concierge-memory", "version": 1}
+    {"type": "note", "record": {"id": 1, "text": "..."}}
+    {"type": "task", "record": {"id": 3, "text": "...", "status": "done", ...}}
+    {"type": "fact", "record": {"id": 2, "text": "...", "kind": "preference"}}
+
+Import:
+- Ids are remapped: imported records are numbered after the store's highest
+  id per section (and task_seq), so they never collide with existing ones.
+- Dedup (on by default): a record whose normalised text (and created_at, for
+  tasks) is already in the store or earlier in the file is skipped. The keys
+  are kept in a temporary SQLite file, not in RAM.
+- Batched commits: every `batch_size` records, the store is rewritten
+  (streamed, atomic os.replace) under store_lock(). The lock is held for one
+  commit only: ids are assigned inside it, so engines and other processes
+  can write between batches without a collision. The next free ids come
+  from the scan at the start and are carried from batch to batch; the
+  store is re-scanned only if someone else saved it in between (its
+  store_signature changed). A crash loses at most the current batch.
+- Cost: the store is one JSON document, so every commit rewrites all of
+  it: I/O is about (store size + imported size) x commits. Keep batch_size
+  large (the default 50000) for big imports; it bounds the memory used,
+  and the number of rewrites.
+- Dedup compares against the store as it was when the import started (plus
+  the file itself); records written concurrently are not deduplicated.
+- Lines that are not valid records are counted and skipped.
+
+CLI:
+    python -m agent.store_transfer export backup.jsonl [--sections notes,tasks]
+    python -m agent.store_transfer import backup.jsonl [--batch-size 50000] [--no-dedup]
+    ("-" reads stdin / writes stdout; --user ID targets that user's shard, see agent/memory/shards.py)
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from typing import Callable, Dict, IO, Iterator, Optional, Sequence, Tuple, Union
+
+import agent.notes_engine as notes_store
+from agent.dedup_index import simhash
+from agent.facts_engine import classify
+from agent.tasks_engine import TasksEngine
+
+FORMAT = "ai-concierge-memory"
+VERSION = 1
+SECTIONS = ("notes", "tasks", "facts")
+TYPE_OF = {"notes": "note", "tasks": "task", "facts": "fact"}
+SECTION_OF = {v: k for k, v in TYPE_OF.items()}
+
+ProgressFn = Callable[[Dict], None]
+
+_decoder = json.JSONDecoder()
+_NON_WS = re.compile(r"[^ \t\r\n]")
+
+
+class StoreFormatError(ValueError):
+    pass
+
+
+# ======================================================
+# Incremental reader
+# ======================================================
+class _JSONStream:
+    """Reads one JSON document piece by piece: raw_decode on a buffer refilled from the file."""
+
+    def __init__(self, f: IO[str], chunk: int = 1 << 16):
+        self.f = f
+        self.chunk = chunk
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.raw = ""
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            m = _NON_WS.search(self.buf, self.pos)
+            if m:
+                self.pos = m.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str):
+        got = self.peek()
+        if got != ch:
+            raise StoreFormatError(f"Expected {ch!r}, found {got or 'end of file'!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue                # value continues in the next chunk
+                raise StoreFormatError(f"Invalid JSON in store: {e}") from e
+            # a number may continue past the buffer ("12" of "123")
+            if end == len(self.buf) and not isinstance(value, (dict, list, str)) and self._fill():
+                continue
+            self.raw = self.buf[self.pos:end]
+            self.pos = end
+            return value
+
+
+def _walk_store(f: IO[str], chunk: int = 1 << 16) -> Iterator[Tuple]:
+    """
+    Events for one store document, in file order:
+        ("start", section) / ("item", section, record, raw) / ("end", section)  for notes/tasks/facts
+        ("value", key, value)                                                    for anything else
+    `raw` is the record's source text, so a rewrite can copy it without re-encoding.
+    """
+    s = _JSONStream(f, chunk)
+    if s.peek() == "":
+        return
+    s.expect("{")
+    if s.peek() == "}":
+        return
+    while True:
+        key = s.value()
+        s.expect(":")
+        if key in SECTIONS and s.peek() == "[":
+            s.expect("[")
+            yield ("start", key)
+            if s.peek() == "]":
+                s.pos += 1
+            else:
+                while True:
+                    record = s.value()
+                    yield ("item", key, record, s.raw)
+                    sep = s.peek()
+                    s.pos += 1
+                    if sep == "]":
+                        break
+                    if sep != ",":
+                        raise StoreFormatError(f"Expected ',' or ']' in {key}, found {sep!r}")
+            yield ("end", key)
+        else:
+            yield ("value", key, s.value())
+        sep = s.peek()
+        s.pos += 1
+        if sep == "}":
+            return
+        if sep != ",":
+            raise StoreFormatError(f"Expected ',' or '}}' in store, found {sep!r}")
+
+
+def iter_records(path: Optional[str] = None, sections: Sequence[str] = SECTIONS) -> Iterator[Tuple[str, Dict]]:
+    """(section, record) for every record in the store, without loading the file."""
+    path = path or notes_store.MEM_PATH
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for event in _walk_store(f):
+            if event[0] == "item" and event[1] in sections:
+                yield event[1], event[2]
+
+
+# ======================================================
+# Export
+# ======================================================
+def export_jsonl(dest: Union[str, IO[str]], sections: Sequence[str] = SECTIONS,
+                 progress: Optional[ProgressFn] = None, progress_every: int = 10000,
+                 path: Optional[str] = None) -> Dict[str, int]:
+    """Write the store as JSONL to a path (atomically) or an open text file. Returns counts per section."""
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown sections: {sorted(unknown)}")
+    counts = {s: 0 for s in sections}
+
+    def write(out: IO[str]):
+        out.write(json.dumps({"type": "header", "format": FORMAT, "version": VERSION}) + "\n")
+        total = 0
+        for section, record in iter_records(path, sections=sections):
+            out.write(json.dumps({"type": TYPE_OF[section], "record": record}, ensure_ascii=False) + "\n")
+            counts[section] += 1
+            total += 1
+            if progress and total % progress_every == 0:
+                progress({"exported": total, **counts})
+
+    if not isinstance(dest, str):
+        write(dest)
+    else:
+        directory = os.path.dirname(os.path.abspath(dest))
+        fd, tmp = tempfile.mkstemp(prefix=".export.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as out:
+                write(out)
+            os.replace(tmp, dest)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    if progress:
+        progress({"exported": sum(counts.values()), **counts, "done": True})
+    return counts
+
+
+# ======================================================
+# Import
+# ======================================================
+def _norm(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def _dedup_key(section: str, record: Dict) -> bytes:
+    raw = f"{section}\x00{_norm(record.get('text', ''))}"
+    if section == "tasks":
+        raw += "\x00" + (record.get("created_at") or "")
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+
+def _normalise(section: str, record: Dict) -> Optional[Dict]:
+    """Store shape for an imported record (id assigned later), or None if it is not usable."""
+    if not isinstance(record, dict):
+        return None
+    if section == "tasks":
+        try:
+            task = TasksEngine._normalise(record)
+        except (TypeError, ValueError):
+            return None
+        return task if isinstance(task["text"], str) and task["text"].strip() else None
+    text = record.get("text")
+    if not isinstance(text, str) or not text.strip():
+        return None
+    out = {k: v for k, v in record.items() if k != "id"}
+    if section == "notes":
+        out["fp"] = f"{simhash(text):016x}"
+    else:
+        out.setdefault("kind", classify(text))
+        out.setdefault("created_at", "")
+    return out
+
+
+class _SeenKeys:
+    """Dedup keys in a temporary SQLite file: bounded memory whatever the store size."""
+
+    def __init__(self):
+        self._dir = tempfile.TemporaryDirectory(prefix="store-import-")
+        self._conn = sqlite3.connect(os.path.join(self._dir.name, "seen.db"), isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE seen (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute("BEGIN")
+
+    def add(self, key: bytes) -> bool:
+        """True if the key is new."""
+        return self._conn.execute("INSERT OR IGNORE INTO seen (key) VALUES (?)", (key,)).rowcount == 1
+
+    def close(self):
+        self._conn.close()
+        self._dir.cleanup()
+
+
+def _rewrite_store(batch: Dict[str, list], task_seq: int, path: str):
+    """Stream the current store into a temp file with `batch` appended to its sections; atomic replace."""
+    notes_store._ensure_store(path)
+    fd, tmp = tempfile.mkstemp(prefix=".memory_store.", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out, open(path, "r", encoding="utf-8") as src:
+            out.write("{")
+            first_key, first_item, written = True, True, set()
+
+            def key(name):
+                nonlocal first_key
+                out.write(("\n  " if first_key else ",\n  ") + json.dumps(name) + ": ")
+                first_key = False
+
+            def item(raw: str):
+                nonlocal first_item
+                out.write(("\n    " if first_item else ",\n    ") + raw)
+                first_item = False
+
+            for event in _walk_store(src):
+                if event[0] == "start":
+                    key(event[1])
+                    out.write("[")
+                    first_item = True
+                elif event[0] == "item":
+                    item(event[3])
+                elif event[0] == "end":
+                    for record in batch.get(event[1], ()):
+                        item(json.dumps(record, ensure_ascii=False))
+                    out.write("\n  ]" if not first_item else "]")
+                    written.add(event[1])
+                elif event[1] != "task_seq":
+                    key(event[1])
+                    out.write(json.dumps(event[2], ensure_ascii=False))
+            for section in SECTIONS:
+                if section not in written:
+                    key(section)
+                    out.write("[")
+                    first_item = True
+                    for record in batch.get(section, ()):
+                        item(json.dumps(record, ensure_ascii=False))
+                    out.write("\n  ]" if not first_item else "]")
+            key("task_seq")
+            out.write(str(task_seq))
+            out.write("\n}\n")
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _lines(src: Union[str, IO[str]]) -> Iterator[str]:
+    if isinstance(src, str):
+        with open(src, "r", encoding="utf-8") as f:
+            yield from f
+    else:
+        yield from src
+
+
+def _scan_store(path: str, seen: Optional[_SeenKeys] = None) -> Dict[str, int]:
+    """One streaming pass: the next free id per section (tasks also after task_seq); dedup keys into `seen`."""
+    next_id = {s: 1 for s in SECTIONS}
+    task_seq = 0
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for event in _walk_store(f):
+                if event[0] == "item" and isinstance(event[2], dict):
+                    section, record = event[1], event[2]
+                    try:
+                        next_id[section] = max(next_id[section], int(record.get("id", 0)) + 1)
+                    except (TypeError, ValueError):
+                        pass
+                    if seen is not None:
+                        seen.add(_dedup_key(section, record))
+                elif event[0] == "value" and event[1] == "task_seq":
+                    task_seq = int(event[2] or 0)
+    next_id["tasks"] = max(next_id["tasks"], task_seq + 1)
+    return next_id
+
+
+def import_jsonl(src: Union[str, IO[str]], batch_size: int = 50000, dedup: bool = True,
+                 progress: Optional[ProgressFn] = None, progress_every: int = 10000,
+                 path: Optional[str] = None) -> Dict:
+    """
+    Append the records of a JSONL export to the store. Returns
+    {"read", "imported": {section: n}, "duplicates", "invalid", "commits"}.
+    """
+    stats = {"read": 0, "imported": {s: 0 for s in SECTIONS}, "duplicates": 0, "invalid": 0, "commits": 0}
+    seen = _SeenKeys() if dedup else None
+    try:
+        path = path or notes_store.MEM_PATH
+        # the store is replaced atomically: readable without the lock
+        sig = notes_store.store_signature(path)
+        next_id = _scan_store(path, seen)
+
+        batch: Dict[str, list] = {s: [] for s in SECTIONS}
+        pending = 0
+
+        def commit():
+            nonlocal pending, sig, next_id
+            if not pending:
+                return
+            with notes_store.store_lock(path):
+                # ids are assigned here; re-scan only if another writer saved since our last commit
+                if notes_store.store_signature(path) != sig:
+                    next_id = _scan_store(path)
+                for section, records in batch.items():
+                    for record in records:
+                        record["id"] = next_id[section]
+                        next_id[section] += 1
+                _rewrite_store(batch, next_id["tasks"] - 1, path)
+                sig = notes_store.store_signature(path)
+            for records in batch.values():
+                records.clear()
+            pending = 0
+            stats["commits"] += 1
+
+        for line in _lines(src):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                stats["invalid"] += 1
+                continue
+            kind = obj.get("type") if isinstance(obj, dict) else None
+            if kind == "header":
+                if obj.get("format") != FORMAT or int(obj.get("version", 0)) > VERSION:
+                    raise StoreFormatError(f"Unsupported export: {obj.get('format')} v{obj.get('version')}")
+                continue
+            stats["read"] += 1
+            section = SECTION_OF.get(kind)
+            record = _normalise(section, obj.get("record")) if section else None
+            if record is None:
+                stats["invalid"] += 1
+                continue
+            if seen is not None and not seen.add(_dedup_key(section, record)):
+                stats["duplicates"] += 1
+                continue
+            batch[section].append(record)
+            stats["imported"][section] += 1
+            pending += 1
+            if pending >= batch_size:
+                commit()
+            if progress and stats["read"] % progress_every == 0:
+                progress(dict(stats))
+        commit()
+    finally:
+        if seen is not None:
+            seen.close()
+    if progress:
+        progress(dict(stats, done=True))
+    return stats
+
+
+# ======================================================
+# CLI
+# ======================================================
+def _print_progress(stats: Dict):
+    if "exported" in stats:
+        msg = f"exported {stats['exported']}"
+    else:
+        msg = (f"read {stats['read']}, imported {sum(stats['imported'].values())}, "
+               f"duplicates {stats['duplicates']}, invalid {stats['invalid']}, commits {stats['commits']}")
+    print(("\r" + msg) + ("\n" if stats.get("done") else ""), end="", file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Stream the memory store to / from JSONL")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="store → JSONL")
+    ex.add_argument("dest", help="output file, or - for stdout")
+    ex.add_argument("--sections", default=",".join(SECTIONS))
+    im = sub.add_parser("import", help="JSONL → store (appends, remaps ids)")
+    im.add_argument("src", help="input file, or - for stdin")
+    im.add_argument("--batch-size", type=int, default=50000)
+    im.add_argument("--no-dedup", action="store_true")
+    for p in (ex, im):
+        p.add_argument("--user", default=None, help="use this user's store shard instead of the shared store")
+    args = ap.parse_args(argv)
+
+    path = notes_store.MEM_PATH
+    if args.user:
+        from agent.memory.shards import shard_pool_from_env
+        path = shard_pool_from_env().path_for(args.user)
+
+    if args.cmd == "export":
+        sections = [s.strip() for s in args.sections.split(",") if s.strip()]
+        dest = sys.stdout if args.dest == "-" else args.dest
+        counts = export_jsonl(dest, sections=sections, path=path,
+                              progress=None if dest is sys.stdout else _print_progress)
+        print(f"✔ Exported {counts} from {path}", file=sys.stderr)
+    else:
+        src = sys.stdin if args.src == "-" else args.src
+        stats = import_jsonl(src, batch_size=args.batch_size, dedup=not args.no_dedup,
+                             progress=_print_progress, path=path)
+        print(f"✔ Imported {stats['imported']} into {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# Path: agent/summarizer.py
+"""
+Incremental extractive summary of a conversation (offline-safe, no LLM).
+
+Each assistant answer is split into sentences as it arrives. Sentences are
+scored by TF-IDF salience against everything seen so far:
+
+    weight(term) = log(1 + count in session) * (log((1 + N) / (1 + df)) + 1)
+    score(sent)  = sum(weight of its distinct terms) / sqrt(#distinct terms)
+
+where N is the number of sentences seen and df the sentences containing the
+term. Only the top-k sentences are kept (a min-heap). Near-repeats (Jaccard
+overlap of terms ≥ 0.6 with a kept sentence) merge into the kept one instead
+of taking a second slot.
+
+Work per turn is O(new sentences + k), independent of session length; the
+only state that grows is the term-count vocabulary. text() returns the kept
+sentences in conversation order, capped at max_words.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Set
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9][a-z0-9'-]*")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from had has have how i if in into is it its
+just may more most no not of on or our so such than that the their them then there these they this
+those to too very was we were what when where which while who why will with would you your also
+""".split())
+
+
+def split_sentences(text: str) -> List[str]:
+    out = []
+    for s in _SENTENCE.split(text or ""):
+        s = _BULLET.sub("", s).strip()
+        if s:
+            out.append(s)
+    return out
+
+
+def _term_counts(sentence: str) -> Counter:
+    return Counter(w for w in _WORD.findall(sentence.lower()) if w not in STOPWORDS and len(w) > 1)
+
+
+class _Sentence:
+    __slots__ = ("score", "seq", "text", "terms")
+
+    def __init__(self, seq: int, text: str, terms: Set[str]):
+        self.score = 0.0
+        self.seq = seq
+        self.text = text
+        self.terms = terms
+
+    def __lt__(self, other: "_Sentence") -> bool:
+        return (self.score, self.seq) < (other.score, other.seq)
+
+
+class IncrementalSummarizer:
+    def __init__(self, k: int = 6, max_words: int = 120, min_words: int = 4, overlap: float = 0.6):
+        self.k = k
+        self.max_words = max_words
+        self.min_words = min_words
+        self.overlap = overlap
+        self._cf: Dict[str, int] = {}       # term → occurrences in the session
+        self._df: Dict[str, int] = {}       # term → sentences containing it
+        self._n = 0                         # sentences seen
+        self._heap: List[_Sentence] = []    # min-heap of the kept top-k
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
+
+    # --------------------------------------------
+    def _score(self, terms: Set[str]) -> float:
+        if not terms:
+            return 0.0
+        n = self._n
+        total = 0.0
+        for t in terms:
+            total += math.log1p(self._cf.get(t, 0)) * (math.log((1 + n) / (1 + self._df.get(t, 0))) + 1)
+        return total / math.sqrt(len(terms))
+
+    def _similar(self, terms: Set[str]):
+        for kept in self._heap:
+            union = len(terms | kept.terms)
+            if union and len(terms & kept.terms) / union >= self.overlap:
+                return kept
+        return None
+
+    def add(self, text: str):
+        """Feed one answer; updates the kept top-k in O(sentences + k)."""
+        for sentence in split_sentences(text):
+            if len(sentence.split()) < self.min_words or sentence.endswith("?"):
+                continue
+            counts = _term_counts(sentence)
+            if not counts:
+                continue
+            terms = set(counts)
+
+            self._n += 1
+            for t, c in counts.items():
+                self._cf[t] = self._cf.get(t, 0) + c
+                self._df[t] = self._df.get(t, 0) + 1
+
+            self._seq += 1
+            cand = _Sentence(self._seq, sentence, terms)
+
+            # statistics moved: re-score the k kept sentences (bounded work)
+            for kept in self._heap:
+                kept.score = self._score(kept.terms)
+            cand.score = self._score(terms)
+
+            dup = self._similar(terms)
+            if dup is not None:
+                # keep the more salient wording, in the original position
+                if cand.score > dup.score:
+                    dup.text, dup.terms, dup.score = cand.text, cand.terms, cand.score
+                heapq.heapify(self._heap)
+                continue
+
+            heapq.heapify(self._heap)
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, cand)
+            elif self._heap[0] < cand:
+                heapq.heapreplace(self._heap, cand)
+
+    def text(self) -> str:
+        """Kept sentences in conversation order, dropping the least salient until max_words fits."""
+        kept = sorted(self._heap, key=lambda s: s.score, reverse=True)
+        words = sum(len(s.text.split()) for s in kept)
+        while len(kept) > 1 and words > self.max_words:
+            words -= len(kept.pop().text.split())
+        return " ".join(s.text for s in sorted(kept, key=lambda s: s.seq))
+
+    def clear(self):
+        self._cf.clear()
+        self._df.clear()
+        self._heap.clear()
+        self._n = 0
+        self._seq = 0
@@ -0,0 +1,230 @@
+# Path: agent/tasks_engine.py
+"""
+TasksEngine — the single task backend (replaces tools/tasks_tool.py storage
+and WorkerAgent's private task list).
+
+Task record:
+    {"id": int, "text": str, "status": "pending" | "done", "done": bool,
+     "created_at": iso8601, "completed_at": iso8601 | None}
+
+In-memory indexes (rebuilt on load, and again only when the store file was
+changed by someone else — another engine or another worker process):
+- id → task                       O(1) get / complete / delete
+- status → {id: task}             O(1) moves between statuses
+- sorted id list, overall and per status
+                                  pages are bisect + slice from the cursor
+- created_at → id (sorted list)   range filters via bisect
+
+Ids come from a persisted counter ("task_seq"), so they are never reused
+after deletes. Listing is filtered and paginated:
+    list_tasks(status="pending", limit=20, cursor=None)
+    → {"items": [...], "next_cursor": 42 | None, "total": 137}
+
+Persistence via agent/memory/memory_store.json (shared with NotesEngine);
+changes run under store_lock(), so concurrent processes never lose a write.
+"""
+
+import bisect
+import heapq
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from agent.notes_engine import _load_store, _save_store, store_lock, store_signature
+from agent.tracing import span
+
+STATUSES = ("pending", "done")
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+class TasksEngine:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path                # None → the shared store (MEM_PATH)
+        self._by_id: Dict[int, Dict] = {}
+        self._by_status: Dict[str, Dict[int, Dict]] = {s: {} for s in STATUSES}
+        self._ids: Dict[Optional[str], List[int]] = {None: [], **{s: [] for s in STATUSES}}   # sorted
+        self._created: List[tuple] = []     # sorted (created_at, id)
+        self._seq = 0
+        self._sig = None
+        self._load()
+
+    # --------------------------------------------
+    # Load / persist
+    # --------------------------------------------
+    def _load(self):
+        self._by_id.clear()
+        self._by_status = {s: {} for s in STATUSES}
+        self._created.clear()
+        self._sig = store_signature(self.path)
+        store = _load_store(self.path)
+        for raw in store.get("tasks", []):
+            task = self._normalise(raw)
+            self._index(task)
+        self._created.sort()
+        self._ids = {None: sorted(self._by_id)}
+        for status, pool in self._by_status.items():
+            self._ids[status] = sorted(pool)
+        self._seq = max(int(store.get("task_seq", 0)), max(self._by_id, default=0))
+
+    @staticmethod
+    def _normalise(raw: Dict) -> Dict:
+        """Accept legacy shapes ({"text", "done"} from WorkerAgent, {"title", "status"} from tasks_tool)."""
+        done = raw.get("status") == "done" or bool(raw.get("done"))
+        return {
+            "id": int(raw.get("id", 0)),
+            "text": raw.get("text") or raw.get("title") or "",
+            "status": "done" if done else "pending",
+            "done": done,
+            "created_at": raw.get("created_at") or "",
+            "completed_at": raw.get("completed_at"),
+        }
+
+    def _refresh(self):
+        """Cheap stat; the indexes are rebuilt only if the file changed since we last read or wrote it."""
+        if store_signature(self.path) != self._sig:
+            self._load()
+
+    def _index(self, task: Dict):
+        self._by_id[task["id"]] = task
+        self._by_status.setdefault(task["status"], {})[task["id"]] = task
+        self._created.append((task["created_at"], task["id"]))
+
+    @staticmethod
+    def _insort(ids: List[int], task_id: int):
+        if not ids or ids[-1] < task_id:
+            ids.append(task_id)         # new ids come from task_seq: always the largest
+        else:
+            bisect.insort(ids, task_id)
+
+    @staticmethod
+    def _unsort(ids: List[int], task_id: int):
+        i = bisect.bisect_left(ids, task_id)
+        if i < len(ids) and ids[i] == task_id:
+            del ids[i]
+
+    def _persist(self):
+        with span("store", kind="tasks"):
+            # reload so notes written by NotesEngine are not stomped
+            store = _load_store(self.path)
+            store["tasks"] = list(self._by_id.values())
+            store["task_seq"] = self._seq
+            _save_store(store, self.path)
+        self._sig = store_signature(self.path)
+
+    # --------------------------------------------
+    # Public API
+    # --------------------------------------------
+    def add_task(self, text: str) -> Dict:
+        with store_lock(self.path):
+            self._refresh()
+            self._seq += 1
+            task = {
+                "id": self._seq,
+                "text": text.strip(),
+                "status": "pending",
+                "done": False,
+                "created_at": _now(),
+                "completed_at": None,
+            }
+            self._index(task)
+            self._insort(self._ids[None], task["id"])
+            self._insort(self._ids["pending"], task["id"])
+            if len(self._created) > 1 and self._created[-1] < self._created[-2]:
+                self._created.sort()    # clock went backwards; keep the index ordered
+            self._persist()
+        return task
+
+    def get_task(self, task_id: int) -> Optional[Dict]:
+        self._refresh()
+        return self._by_id.get(int(task_id))
+
+    def complete_task(self, task_id: int) -> Optional[Dict]:
+        """O(1): id lookup + status index move. Returns None if the id is unknown."""
+        with store_lock(self.path):
+            self._refresh()
+            task = self._by_id.get(int(task_id))
+            if task is None:
+                return None
+            if task["status"] != "done":
+                self._by_status[task["status"]].pop(task["id"], None)
+                self._unsort(self._ids[task["status"]], task["id"])
+                task["status"] = "done"
+                task["done"] = True
+                task["completed_at"] = _now()
+                self._by_status["done"][task["id"]] = task
+                self._insort(self._ids["done"], task["id"])
+                self._persist()
+        return task
+
+    def delete_task(self, task_id: int) -> Optional[Dict]:
+        with store_lock(self.path):
+            self._refresh()
+            task = self._by_id.pop(int(task_id), None)
+            if task is None:
+                return None
+            self._by_status[task["status"]].pop(task["id"], None)
+            self._unsort(self._ids[None], task["id"])
+            self._unsort(self._ids.get(task["status"], []), task["id"])
+            i = bisect.bisect_left(self._created, (task["created_at"], task["id"]))
+            if i < len(self._created) and self._created[i][1] == task["id"]:
+                del self._created[i]
+            self._persist()
+        return task
+
+    def count(self, status: Optional[str] = None) -> int:
+        self._refresh()
+        return len(self._by_status.get(status, {})) if status else len(self._by_id)
+
+    def list_tasks(self, status: Optional[str] = None, limit: int = 20, cursor: Optional[int] = None,
+                   created_after: Optional[str] = None, created_before: Optional[str] = None) -> Dict:
+        """
+        Tasks ordered by id. `cursor` is the last id of the previous page
+        (pass back `next_cursor`). A page is a bisect + slice of the sorted
+        ids; with a date range, the smaller of the id list and the date
+        window is scanned.
+        """
+        self._refresh()
+        after = int(cursor or 0)
+        limit = max(1, int(limit))
+
+        pool = self._by_status.get(status, {}) if status else self._by_id
+        total = len(pool)
+        ids = self._ids.get(status, [])
+        start = bisect.bisect_right(ids, after)
+
+        if created_after or created_before:
+            lo = bisect.bisect_left(self._created, (created_after or "",))
+            hi = bisect.bisect_left(self._created, (created_before,)) if created_before else len(self._created)
+            if hi - lo < len(ids) - start:
+                window = (tid for _, tid in self._created[lo:hi] if tid > after and tid in pool)
+                page_ids = heapq.nsmallest(limit + 1, window)
+            else:
+                low, high = created_after or "", created_before
+                page_ids = []
+                for i in range(start, len(ids)):
+                    created = pool[ids[i]]["created_at"]
+                    if created >= low and (high is None or created < high):
+                        page_ids.append(ids[i])
+                        if len(page_ids) > limit:
+                            break
+        else:
+            page_ids = ids[start:start + limit + 1]
+        has_more = len(page_ids) > limit
+        items = [pool[i] for i in page_ids[:limit]]
+        return {
+            "items": items,
+            "next_cursor": items[-1]["id"] if has_more and items else None,
+            "total": total,
+        }
+
+    def iter_tasks(self, status: Optional[str] = None, page_size: int = 100):
+        """Lazy iterator over every matching task, one page at a time."""
+        cursor = None
+        while True:
+            page = self.list_tasks(status=status, limit=page_size, cursor=cursor)
+            yield from page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
@@ -0,0 +1,533 @@
+# Path: agent/tools/corpus_search.py
+"""
+Offline search over a local document corpus (backs the web_search action).
+
+Documents (.md / .markdown / .txt / .html / .htm) under CORPUS_DIR are
+indexed into a BM25 inverted index kept in SQLite next to the corpus, so
+memory stays bounded however large the corpus grows: postings live on disk,
+indexing holds one batch of documents at a time, and a query only loads the
+postings of its own terms.
+
+- Incremental: refresh() compares every file's (mtime_ns, size) with the
+  index and re-indexes only new / changed files; deleted files are dropped.
+- Never in a user's turn: search() answers from the index as it is and, at
+  most every CORPUS_REFRESH_S seconds, starts a refresh in a background
+  thread (corpus_from_env() starts the first one when the index is created).
+  The refresh writes through its own SQLite connection; WAL lets searches
+  keep reading meanwhile.
+- Parallel: when many files changed, text extraction and tokenisation run in
+  a ProcessPoolExecutor (CORPUS_INDEX_WORKERS) with spawned workers: the
+  refresh runs in a thread, and forking a threaded process can copy held
+  locks. Only a bounded window of files is in flight, and postings are
+  written as one segment per batch.
+- Results: top-k by BM25 (k1=1.2, b=0.75). The snippet is the window with
+  the most query terms in the document's first EXCERPT_WORDS words, which
+  are stored with the document at indexing time; a search never opens the
+  files.
+
+Usage:
+    index = CorpusIndex("data/corpus")
+    index.refresh()                         # synchronous; refresh_in_background() does not block
+    index.search("vector databases", k=5)   # [{"title", "snippet", "link", "score"}, ...]
+
+    python -m agent.tools.corpus_search data/corpus "vector databases"
+
+Environment:
+    CORPUS_DIR=data/corpus
+    CORPUS_INDEX_PATH=<CORPUS_DIR>/.corpus_index.sqlite3
+    CORPUS_REFRESH_S=30
+    CORPUS_INDEX_WORKERS=<cpu count>
+    CORPUS_MAX_FILE_MB=5           larger files are skipped
+"""
+
+import heapq
+import html
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from agent.summarizer import STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = (".md", ".markdown", ".txt", ".html", ".htm")
+K1 = 1.2
+B = 0.75
+SNIPPET_WORDS = 40
+EXCERPT_WORDS = 400             # words of each document kept in the index for snippets
+PARALLEL_MIN_FILES = 32         # below this, indexing in-process is faster than starting workers
+_WRITE_BATCH = 500              # documents per postings segment / transaction
+COMPACT_MIN_DEAD = 200          # compact once this many (and > half the live) documents are dead
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NON_SPACE = re.compile(r"\S+")
+_MD_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$", re.MULTILINE)
+_MD_MARKUP = re.compile(r"!?\[([^\]]*)\]\([^)]*\)|[`*>#|~]+")     # "_" kept: identifiers
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in _WORD.findall((text or "").lower()) if w not in STOPWORDS and (len(w) > 1 or w.isdigit())]
+
+
+# ======================================================
+# Text extraction
+# ======================================================
+class _HTMLText(HTMLParser):
+    _SKIP = {"script", "style", "noscript", "template"}
+    _BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.title = ""
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skip:
+            self._skip -= 1
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self.parts.append(data)
+
+
+def extract(path: str) -> Tuple[str, str]:
+    """(title, plain text) of one document."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        raw = f.read()
+    name = os.path.splitext(os.path.basename(path))[0]
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".html", ".htm"):
+        parser = _HTMLText()
+        parser.feed(raw)
+        parser.close()
+        return (parser.title.strip() or name), html.unescape("".join(parser.parts))
+    if ext in (".md", ".markdown"):
+        m = _MD_HEADING.search(raw)
+        return (m.group(1).strip() if m else name), _MD_MARKUP.sub(lambda mm: mm.group(1) or " ", raw)
+    return name, raw
+
+
+def excerpt(text: str) -> str:
+    """The first EXCERPT_WORDS words, whitespace-normalised; "…" marks a cut."""
+    words = [m.group() for m in itertools.islice(_NON_SPACE.finditer(text), EXCERPT_WORDS + 1)]
+    if len(words) > EXCERPT_WORDS:
+        words[EXCERPT_WORDS:] = ["…"]
+    return " ".join(words)
+
+
+def _analyze(path: str) -> Optional[Tuple[str, str, int, Dict[str, int], str]]:
+    """Worker side of indexing: (path, title, length, term counts, excerpt), or None if unreadable."""
+    try:
+        title, text = extract(path)
+    except OSError as e:
+        logger.warning("Corpus: cannot read %s: %s", path, e)
+        return None
+    tokens = tokenize(title + "\n" + text)
+    return path, title, len(tokens), dict(Counter(tokens)), excerpt(text)
+
+
+# ======================================================
+# Index
+# ======================================================
+class CorpusIndex:
+    """
+    SQLite layout:
+        docs(id, path, mtime_ns, size, title, length, excerpt)
+                                                        one row per live document
+        postings(term, data)                            one row per term per indexing batch;
+                                                        data = packed (doc_id, tf) pairs
+    Postings are written in batches (one blob per term) instead of one row per
+    (term, doc), which keeps indexing write-bound work small. A changed or
+    deleted document only loses its docs row; its stale postings are skipped
+    at query time and dropped by compact() once dead documents pile up.
+    """
+
+    def __init__(self, root: str, index_path: Optional[str] = None, refresh_s: Optional[float] = None,
+                 workers: Optional[int] = None, max_file_bytes: Optional[int] = None):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path or os.path.join(self.root, ".corpus_index.sqlite3")
+        self.refresh_s = float(os.getenv("CORPUS_REFRESH_S", "30") or 0) if refresh_s is None else refresh_s
+        self.workers = workers or int(os.getenv("CORPUS_INDEX_WORKERS", "0") or 0) or os.cpu_count() or 1
+        self.max_file_bytes = max_file_bytes or int(float(os.getenv("CORPUS_MAX_FILE_MB", "5") or 5) * 1024 * 1024)
+        self._lock = threading.Lock()            # read connection (searches)
+        self._refresh_lock = threading.Lock()    # one writer: refresh / compact
+        self._refreshed_at = 0.0
+        self._refreshing: Optional[threading.Thread] = None
+        self._conn = None
+        self._writer = None
+        self.stats = {"indexed": 0, "removed": 0, "refreshes": 0, "searches": 0, "compactions": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        """Connection used by searches."""
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _write_db(self) -> sqlite3.Connection:
+        """Connection used by refresh / compact, so indexing never holds the search connection."""
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    def _connect(self) -> sqlite3.Connection:
+        d = os.path.dirname(self.index_path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, check_same_thread=False, isolation_level=None, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"       # ids are never reused
+            " path TEXT UNIQUE NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " title TEXT NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " excerpt TEXT NOT NULL DEFAULT '')"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, data BLOB NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_term ON postings(term)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        if "excerpt" not in {row[1] for row in conn.execute("PRAGMA table_info(docs)")}:
+            # index from before excerpts were stored: start over so every document gets one
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("ALTER TABLE docs ADD COLUMN excerpt TEXT NOT NULL DEFAULT ''")
+                conn.execute("DELETE FROM docs")
+                conn.execute("DELETE FROM postings")
+                conn.execute("DELETE FROM meta WHERE key = 'dead_docs'")
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError:
+                conn.execute("ROLLBACK")    # another connection migrated it first
+        return conn
+
+    def _dead(self, db: sqlite3.Connection, add: int = 0) -> int:
+        """Documents whose postings are still stored (changed / deleted files)."""
+        if add:
+            db.execute("INSERT INTO meta (key, value) VALUES ('dead_docs', ?) "
+                       "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value", (add,))
+        row = db.execute("SELECT value FROM meta WHERE key = 'dead_docs'").fetchone()
+        return row[0] if row else 0
+
+    # --------------------------------------------
+    # Indexing
+    # --------------------------------------------
+    def _scan(self) -> Iterator[Tuple[str, int, int]]:
+        stack = [self.root]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except OSError:
+                continue
+            for e in entries:
+                if e.name.startswith("."):
+                    continue
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.name.lower().endswith(EXTENSIONS):
+                    st = e.stat()
+                    if st.st_size <= self.max_file_bytes:
+                        yield e.path, st.st_mtime_ns, st.st_size
+
+    def _due(self) -> bool:
+        return not self.refresh_s or time.monotonic() - self._refreshed_at >= self.refresh_s
+
+    def refresh_in_background(self) -> bool:
+        """Start a refresh thread if one is due and none is running. Never blocks."""
+        with self._lock:
+            if (self._refreshing is not None and self._refreshing.is_alive()) or not self._due():
+                return False
+            self._refreshing = threading.Thread(target=self._background_refresh,
+                                                name="corpus-refresh", daemon=True)
+            self._refreshing.start()
+            return True
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning("Corpus refresh failed for %s: %s", self.root, e)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a background refresh in flight; True once none is running."""
+        thread = self._refreshing
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """Re-index new / changed files and drop deleted ones (synchronous). Returns counts."""
+        with self._refresh_lock:
+            if not force and not self._due():
+                return {"indexed": 0, "removed": 0}
+            self._refreshed_at = time.monotonic()
+            if not os.path.isdir(self.root):
+                return {"indexed": 0, "removed": 0}
+
+            db = self._write_db()
+            known = {path: (doc_id, mtime, size)
+                     for doc_id, path, mtime, size in db.execute("SELECT id, path, mtime_ns, size FROM docs")}
+            changed: Dict[str, Tuple[int, int]] = {}
+            for path, mtime, size in self._scan():
+                old = known.pop(path, None)
+                if old is None or old[1:] != (mtime, size):
+                    changed[path] = (mtime, size)
+
+            if known:                                         # files that are gone
+                db.execute("BEGIN")
+                try:
+                    db.executemany("DELETE FROM docs WHERE id = ?", [(v[0],) for v in known.values()])
+                    self._dead(db, len(known))
+                    db.execute("COMMIT")
+                except Exception:
+                    db.execute("ROLLBACK")
+                    raise
+
+            indexed = self._index(db, changed)
+            self.stats["indexed"] += indexed
+            self.stats["removed"] += len(known)
+            self.stats["refreshes"] += 1
+            if indexed or known:
+                logger.info("Corpus %s: indexed %d, removed %d", self.root, indexed, len(known))
+
+            live = db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            if self._dead(db) > max(COMPACT_MIN_DEAD, live // 2):
+                self._compact(db)
+            return {"indexed": indexed, "removed": len(known)}
+
+    def _analyzed(self, paths: List[str]) -> Iterator[Optional[Tuple[str, str, int, Dict[str, int]]]]:
+        if len(paths) < PARALLEL_MIN_FILES or self.workers < 2:
+            for p in paths:
+                yield _analyze(p)
+            return
+        window = self.workers * 8             # bounded number of files in flight
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for i in range(0, len(paths), window):
+                yield from pool.map(_analyze, paths[i:i + window], chunksize=4)
+
+    def _index(self, db: sqlite3.Connection, changed: Dict[str, Tuple[int, int]]) -> int:
+        """Index `changed` files in batches of _WRITE_BATCH documents (one transaction each)."""
+        count, batch = 0, 0
+        segment: Dict[str, array] = {}
+
+        def flush():
+            db.executemany("INSERT INTO postings (term, data) VALUES (?, ?)",
+                           ((term, pairs.tobytes()) for term, pairs in segment.items()))
+            segment.clear()
+            db.execute("COMMIT")
+
+        db.execute("BEGIN")
+        try:
+            for result in self._analyzed(sorted(changed)):
+                if result is None:
+                    continue
+                path, title, length, counts, text = result
+                mtime, size = changed[path]
+                cur = db.execute("DELETE FROM docs WHERE path = ?", (path,))
+                if cur.rowcount > 0:
+                    self._dead(db, cur.rowcount)
+                doc_id = db.execute(
+                    "INSERT INTO docs (path, mtime_ns, size, title, length, excerpt) VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, mtime, size, title, length, text),
+                ).lastrowid
+                for term, tf in counts.items():
+                    pairs = segment.get(term)
+                    if pairs is None:
+                        pairs = segment[term] = array("I")
+                    pairs.append(doc_id)
+                    pairs.append(tf)
+                count += 1
+                batch += 1
+                if batch >= _WRITE_BATCH:
+                    flush()
+                    db.execute("BEGIN")
+                    batch = 0
+            flush()
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return count
+
+    def compact(self):
+        """Rewrite postings without dead documents, one merged row per term."""
+        with self._refresh_lock:
+            self._compact(self._write_db())
+
+    def _compact(self, db: sqlite3.Connection):
+        live = array("I", (r[0] for r in db.execute("SELECT id FROM docs ORDER BY id")))
+        terms = [r[0] for r in db.execute("SELECT DISTINCT term FROM postings")]
+        db.execute("BEGIN")
+        try:
+            for term in terms:
+                merged = array("I")
+                for (data,) in db.execute("SELECT data FROM postings WHERE term = ?", (term,)).fetchall():
+                    pairs = array("I")
+                    pairs.frombytes(data)
+                    for i in range(0, len(pairs), 2):
+                        j = bisect_left(live, pairs[i])
+                        if j < len(live) and live[j] == pairs[i]:
+                            merged.append(pairs[i])
+                            merged.append(pairs[i + 1])
+                db.execute("DELETE FROM postings WHERE term = ?", (term,))
+                if merged:
+                    db.execute("INSERT INTO postings (term, data) VALUES (?, ?)", (term, merged.tobytes()))
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dead_docs', 0)")
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        self.stats["compactions"] += 1
+
+    # --------------------------------------------
+    # Search
+    # --------------------------------------------
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        """BM25 over the index as it is now; a due refresh runs in the background, not in this call."""
+        self.refresh_in_background()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not os.path.isdir(self.root):
+            return []
+        self.stats["searches"] += 1
+        with self._lock:
+            db = self._db()
+            n, total = db.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not n:
+                return []
+            avgdl = total / n
+
+            per_term: List[Dict[int, int]] = []
+            for term in terms:
+                tfs: Dict[int, int] = {}
+                for (data,) in db.execute("SELECT data FROM postings WHERE term = ?", (term,)):
+                    pairs = array("I")
+                    pairs.frombytes(data)
+                    tfs.update(zip(pairs[0::2], pairs[1::2]))
+                per_term.append(tfs)
+
+            # lengths of the live candidates (stale ids from changed / deleted files drop out here)
+            lengths: Dict[int, int] = {}
+            candidates = list(set().union(*per_term))
+            for i in range(0, len(candidates), 900):
+                chunk = candidates[i:i + 900]
+                lengths.update(db.execute(
+                    f"SELECT id, length FROM docs WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+
+            scores: Dict[int, float] = {}
+            for tfs in per_term:
+                live = [(doc_id, tf) for doc_id, tf in tfs.items() if doc_id in lengths]
+                if not live:
+                    continue
+                idf = math.log(1 + (n - len(live) + 0.5) / (len(live) + 0.5))
+                for doc_id, tf in live:
+                    norm = tf + K1 * (1 - B + B * lengths[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / norm
+            top = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+            docs = {doc_id: (path, title, text) for doc_id, path, title, text in db.execute(
+                f"SELECT id, path, title, excerpt FROM docs WHERE id IN ({','.join('?' * len(top))})",
+                [doc_id for doc_id, _ in top],
+            )} if top else {}
+
+        results = []
+        for doc_id, score in top:
+            path, title, text = docs[doc_id]
+            results.append({
+                "title": title,
+                "snippet": self._snippet(text, terms),
+                "link": os.path.relpath(path, self.root),
+                "score": round(score, 4),
+            })
+        return results
+
+    @staticmethod
+    def _snippet(text: str, terms: List[str]) -> str:
+        """Window of SNIPPET_WORDS words of the stored excerpt with the most distinct query terms."""
+        words = text.split()
+        if not words:
+            return ""
+        wanted = set(terms)
+        found_at = [set(tokenize(w)) & wanted for w in words]     # each word tokenised once
+        start, best = 0, -1
+        for h, found in enumerate(found_at):
+            if found:
+                s = max(0, h - SNIPPET_WORDS // 4)
+                n = len(set().union(*found_at[s:s + SNIPPET_WORDS]))
+                if n > best:
+                    best, start = n, s
+        window = words[start:start + SNIPPET_WORDS]
+        return ("… " if start else "") + " ".join(window) + (" …" if start + SNIPPET_WORDS < len(words) else "")
+
+    def close(self):
+        self.wait()
+        with self._refresh_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_shared: Dict[str, CorpusIndex] = {}
+_shared_lock = threading.Lock()
+
+
+def corpus_from_env() -> CorpusIndex:
+    """Process-wide CorpusIndex for CORPUS_DIR / CORPUS_INDEX_PATH; the first refresh starts on creation."""
+    root = os.path.abspath(os.getenv("CORPUS_DIR", os.path.join("data", "corpus")))
+    with _shared_lock:
+        index = _shared.get(root)
+        if index is None:
+            index = CorpusIndex(root, index_path=os.getenv("CORPUS_INDEX_PATH") or None)
+            index.refresh_in_background()
+            _shared[root] = index
+        return index
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Index and search a local document corpus (BM25)")
+    ap.add_argument("root")
+    ap.add_argument("query", nargs="?")
+    ap.add_argument("-k", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    index = CorpusIndex(args.root, refresh_s=0)
+    started = time.perf_counter()
+    counts = index.refresh(force=True)
+    print(f"indexed {counts['indexed']}, removed {counts['removed']} in {time.perf_counter() - started:.2f}s")
+    if args.query:
+        for r in index.search(args.query, k=args.k):
+            print(f"{r['score']:7.3f}  {r['link']}  {r['title']}\n         {r['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -96,7 +96,7 @@ def search(query: str):
 
     # Tasks
     for t in tasks:
-        documents.append(_tokenize(t["title"]))
+        documents.append(_tokenize(t.get("text") or t.get("title") or ""))
         doc_map.append(("task", t["id"], t))
 
     # If no data, return empty
@@ -1,79 +1,61 @@
-import json
-import os
-from datetime import datetime
+from agent.tasks_engine import TasksEngine
 
-TASKS_FILE = "data/tasks.json"
+_engine = None
 
 
-def _load_tasks():
+def _tasks() -> TasksEngine:
     """
     Internal helper.
-    Loads the tasks list from JSON.
-    Returns an empty list if the file doesn't exist yet.
+    Shared TasksEngine (loaded once; indexes live in memory).
     """
-    if not os.path.exists(TASKS_FILE):
-        return []
-    with open(TASKS_FILE, "r") as f:
-        return json.load(f)
+    global _engine
+    if _engine is None:
+        _engine = TasksEngine()
+    return _engine
 
 
-def _save_tasks(tasks):
-    """
-    Internal helper.
-    Writes the full tasks list back to JSON.
-    """
-    with open(TASKS_FILE, "w") as f:
-        json.dump(tasks, f, indent=2)
-
 def add_task(title: str):
     """
     Public function.
     Creates a new task with structured fields.
 
     Fields:
-    - id: incremental integer
-    - title: task description
+    - id: monotonic integer (never reused after deletes)
+    - text: task description
     - status: "pending" or "done"
     - created_at: timestamp in ISO format
     - completed_at: null initially
     """
-    tasks = _load_tasks()
+    return _tasks().add_task(title)
 
-    new_task = {
-        "id": len(tasks) + 1,
-        "title": title,
-        "status": "pending",
-        "created_at": datetime.utcnow().isoformat(),
-        "completed_at": None
-    }
 
-    tasks.append(new_task)
-    _save_tasks(tasks)
+def list_tasks(status: str = None):
+    """
+    Public function.
+    Returns every task (optionally only one status), oldest first.
+    Prefer list_tasks_page for anything user-facing.
+    """
+    return list(_tasks().iter_tasks(status=status))
 
-    return new_task
 
-def list_tasks():
+def list_tasks_page(status: str = None, limit: int = 20, cursor: int = None):
     """
     Public function.
-    Returns the full list of tasks.
+    Returns one page: {"items": [...], "next_cursor": ..., "total": ...}
     """
-    return _load_tasks()
+    return _tasks().list_tasks(status=status, limit=limit, cursor=cursor)
+
 
 def complete_task(task_id: int):
     """
-    Marks a task as completed.
-
-    - Finds the task by ID
-    - Sets status to 'done'
-    - Adds a completion timestamp
+    Marks a task as completed (O(1) lookup by id).
+    Returns the task, or None if not found.
     """
-    tasks = _load_tasks()
+    return _tasks().complete_task(task_id)
 
-    for task in tasks:
-        if task["id"] == task_id:
-            task["status"] = "done"
-            task["completed_at"] = datetime.utcnow().isoformat()
-            _save_tasks(tasks)
-            return task
 
-    return None  # task not found
+def delete_task(task_id: int):
+    """
+    Removes a task. Returns the removed task, or None if not found.
+    """
+    return _tasks().delete_task(task_id)
@@ -0,0 +1,380 @@
+# Path: agent/tracing.py
+"""
+Per-stage tracing and latency histograms for the request pipeline.
+
+Usage:
+    with request_scope():                 # assigns a request id (contextvar)
+        with span("plan"):
+            ...
+        with span("llm", provider="gemini", model=...):
+            ...
+
+Every finished span is recorded into an in-process HDR-style histogram keyed
+by (stage, labels). Exports:
+- Prometheus text (summary quantiles)  → export_prometheus() / write_prometheus(path) / serve_prometheus(port)
+- JSON lines                           → per-span records to AGENT_TRACE_FILE, snapshots via write_json_lines(path)
+
+Environment:
+    AGENT_TRACING=1            enable spans + histograms (off → spans are a shared no-op)
+    AGENT_TRACE_FILE=path      append one JSON line per finished span
+    AGENT_METRICS_FILE=path    rewrite the Prometheus text file after every request
+    AGENT_METRICS_PORT=9464    serve /metrics over HTTP
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_request_id: contextvars.ContextVar[str] = contextvars.ContextVar("agent_request_id", default="")
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("agent_span", default=None)
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+# ======================================================
+# HDR-style histogram
+# ======================================================
+class LatencyHistogram:
+    """
+    Log-linear histogram over integer microseconds.
+
+    Values below 64µs get exact buckets; above that each power of two is split
+    into 32 linear sub-buckets, so any recorded value is within ~3% of its
+    bucket bound. Buckets are sparse (dict), so memory tracks distinct magnitudes.
+    """
+
+    SUB_BITS = 5
+    SUB_COUNT = 1 << SUB_BITS            # 32
+    LINEAR_MAX = 1 << (SUB_BITS + 1)     # 64
+
+    __slots__ = ("counts", "count", "total", "min", "max", "_lock")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _index(cls, v: int) -> int:
+        if v < cls.LINEAR_MAX:
+            return v
+        shift = v.bit_length() - (cls.SUB_BITS + 1)
+        return shift * cls.SUB_COUNT + (v >> shift)
+
+    @classmethod
+    def _upper(cls, idx: int) -> int:
+        """Highest value that lands in bucket idx."""
+        if idx < cls.LINEAR_MAX:
+            return idx
+        shift = idx // cls.SUB_COUNT - 1
+        sub = idx - shift * cls.SUB_COUNT
+        return ((sub + 1) << shift) - 1
+
+    def record(self, micros: int):
+        v = max(0, int(micros))
+        idx = self._index(v)
+        with self._lock:
+            self.counts[idx] = self.counts.get(idx, 0) + 1
+            if self.count == 0 or v < self.min:
+                self.min = v
+            if v > self.max:
+                self.max = v
+            self.count += 1
+            self.total += v
+
+    def percentile(self, q: float) -> int:
+        """q in [0, 100]; returns microseconds (bucket upper bound, clamped to max)."""
+        with self._lock:
+            if not self.count:
+                return 0
+            target = max(1, int(round(self.count * q / 100.0)))
+            seen = 0
+            for idx in sorted(self.counts):
+                seen += self.counts[idx]
+                if seen >= target:
+                    return min(self._upper(idx), self.max)
+            return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum_us": self.total,
+            "min_us": self.min,
+            "max_us": self.max,
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            "p999_us": self.percentile(99.9),
+        }
+
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class HistogramRegistry:
+    def __init__(self):
+        self._hists: Dict[LabelKey, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def get(self, stage: str, labels: Dict[str, str]) -> LatencyHistogram:
+        key = (stage, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None)))
+        h = self._hists.get(key)
+        if h is None:
+            with self._lock:
+                h = self._hists.setdefault(key, LatencyHistogram())
+        return h
+
+    def items(self) -> List[Tuple[LabelKey, LatencyHistogram]]:
+        with self._lock:
+            return list(self._hists.items())
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+
+registry = HistogramRegistry()
+
+
+# ======================================================
+# Spans
+# ======================================================
+class Span:
+    __slots__ = ("stage", "labels", "start", "duration_us", "parent", "_token")
+
+    def __init__(self, stage: str, labels: Dict[str, str]):
+        self.stage = stage
+        self.labels = labels
+        self.start = 0.0
+        self.duration_us = 0
+        self.parent = None
+        self._token = None
+
+    def set_label(self, key: str, value):
+        """Attach a label discovered mid-span (e.g. the planner's chosen action)."""
+        self.labels[key] = value
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_us = int((time.perf_counter() - self.start) * 1_000_000)
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.labels.setdefault("error", exc_type.__name__)
+        registry.get(self.stage, self.labels).record(self.duration_us)
+        _tracer.emit(self)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_label(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Tracer:
+    def __init__(self):
+        self.enabled = _env_flag("AGENT_TRACING")
+        self.trace_file = os.getenv("AGENT_TRACE_FILE") or None
+        self.metrics_file = os.getenv("AGENT_METRICS_FILE") or None
+        self._file_lock = threading.Lock()
+
+    def emit(self, s: Span):
+        if not self.trace_file:
+            return
+        record = {
+            "ts": time.time(),
+            "request_id": _request_id.get(),
+            "stage": s.stage,
+            "parent": s.parent.stage if s.parent else None,
+            "duration_ms": s.duration_us / 1000.0,
+            **s.labels,
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        try:
+            with self._file_lock, open(self.trace_file, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning("Trace write failed: %s", e)
+
+
+_tracer = _Tracer()
+
+
+def configure_tracing(enabled: Optional[bool] = None, trace_file: Optional[str] = None,
+                      metrics_file: Optional[str] = None):
+    """Override the environment defaults at runtime (tests, run.py flags)."""
+    if enabled is not None:
+        _tracer.enabled = enabled
+    if trace_file is not None:
+        _tracer.trace_file = trace_file or None
+    if metrics_file is not None:
+        _tracer.metrics_file = metrics_file or None
+
+
+def tracing_enabled() -> bool:
+    return _tracer.enabled
+
+
+def span(stage: str, **labels):
+    """Context manager timing one pipeline stage. Shared no-op when tracing is off."""
+    if not _tracer.enabled:
+        return _NOOP
+    return Span(stage, labels)
+
+
+def current_span():
+    """The innermost active span (or a no-op), for attaching late labels."""
+    return _current_span.get() or _NOOP
+
+
+# ======================================================
+# Request ids
+# ======================================================
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+class request_scope:
+    """Binds a request id for the duration of one turn; nested scopes keep the outer id."""
+
+    __slots__ = ("request_id", "_token")
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or _request_id.get() or new_request_id()
+        self._token = None
+
+    def __enter__(self) -> str:
+        self._token = _request_id.set(self.request_id)
+        return self.request_id
+
+    def __exit__(self, exc_type, exc, tb):
+        _request_id.reset(self._token)
+        if _tracer.enabled and _tracer.metrics_file and not _request_id.get():
+            write_prometheus(_tracer.metrics_file)
+        return False
+
+
+# ======================================================
+# Export
+# ======================================================
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def export_prometheus() -> str:
+    """All histograms as one Prometheus summary family (seconds)."""
+    name = "agent_stage_latency_seconds"
+    lines = [
+        f"# HELP {name} Latency of agent pipeline stages.",
+        f"# TYPE {name} summary",
+    ]
+    for (stage, labels), h in sorted(registry.items(), key=lambda kv: kv[0]):
+        base = (("stage", stage),) + labels
+        for q in (0.5, 0.9, 0.99, 0.999):
+            v = h.percentile(q * 100) / 1_000_000
+            lines.append(f"{name}{_fmt_labels(base, (('quantile', str(q)),))} {v:.6f}")
+        lines.append(f"{name}_sum{_fmt_labels(base)} {h.total / 1_000_000:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(base)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str):
+    """Atomically rewrite a Prometheus text file (node_exporter textfile collector style)."""
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(export_prometheus())
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Metrics write failed: %s", e)
+
+
+def iter_snapshots() -> Iterator[Dict]:
+    for (stage, labels), h in sorted(registry.items(), key=lambda kv: kv[0]):
+        yield {"stage": stage, **dict(labels), **h.snapshot()}
+
+
+def write_json_lines(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for snap in iter_snapshots():
+            f.write(json.dumps(snap) + "\n")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body = "".join(json.dumps(s) + "\n" for s in iter_snapshots()).encode("utf-8")
+            ctype = "application/x-ndjson"
+        elif self.path.startswith("/metrics"):
+            body = export_prometheus().encode("utf-8")
+            ctype = "text/plain; version=0.0.4"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_prometheus(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json (JSON lines) from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="agent-metrics", daemon=True).start()
+    return server
+
+
+def maybe_serve_from_env() -> Optional[ThreadingHTTPServer]:
+    port = os.getenv("AGENT_METRICS_PORT")
+    if not (_tracer.enabled and port):
+        return None
+    try:
+        return serve_prometheus(int(port))
+    except (OSError, ValueError) as e:
+        logger.warning("Metrics endpoint not started: %s", e)
+        return None
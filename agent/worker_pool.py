@@ -0,0 +1,248 @@
+# Path: agent/worker_pool.py
+"""
+Multi-process worker pool: run turns on every core.
+
+The Python side of a turn (store JSON parsing, TF-IDF / SimHash lookups,
+summarisation, routing) holds the GIL, so threads alone stop scaling at one
+core. WorkerPool starts N worker processes, each with its own MainAgents and
+LLM clients, and routes every session to one of them:
+
+- Sticky affinity: worker = crc32(session_id) % N, so a conversation's
+  in-memory context always lives in the same process and its turns run in order.
+- Shared store: all workers use agent/memory/memory_store.json (or the
+  user's shard, see agent/memory/shards.py). Writes are atomic and
+  read-modify-write runs under store_lock() (flock), and each engine
+  reloads its indexes when another process changed the file.
+- Crash handling: a monitor thread watches the process sentinels. A dead worker
+  is restarted at once. Requests that were queued on it fail with WorkerCrashed
+  and are not re-run, because a turn may already have had side effects (a task
+  added twice is worse than a retry prompt). Sessions on that worker start
+  fresh, unless a session store is configured (AGENT_SESSION_DIR or
+  AGENT_SESSION_DB, see agent/session_store.py), in which case they resume.
+
+Usage:
+    pool = WorkerPool(workers=4)
+    reply = pool.handle("session-1", "What is RAG?")
+    fut = pool.submit("session-2", "list tasks")     # concurrent.futures.Future
+    pool.close()
+
+agent/server.py --workers N puts the HTTP/WebSocket front-end in front of a pool.
+
+Environment:
+    WORKER_POOL_SIZE=<cpu count>
+    WORKER_POOL_MAX_SESSIONS=128     MainAgents kept per worker (LRU)
+    WORKER_POOL_START=spawn          multiprocessing start method
+"""
+
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent.tracing import new_request_id
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _default_agent(session_id: str, user_id: Optional[str] = None):
+    from agent.main_agent import MainAgent
+    return MainAgent(session_id=session_id, user_id=user_id)
+
+
+def _worker_main(index: int, inbox, outbox, factory: Callable, max_sessions: int):
+    """Worker process: serve (key, request_id, session_id, message, user_id) items until None arrives."""
+    agents: "OrderedDict[str, object]" = OrderedDict()
+    while True:
+        item = inbox.get()
+        if item is None:
+            return
+        key, request_id, session_id, message, user_id = item
+        try:
+            agent = agents.get(session_id)
+            if agent is None:
+                agent = factory(session_id, user_id=user_id) if user_id else factory(session_id)
+                agents[session_id] = agent
+                while len(agents) > max_sessions:
+                    agents.popitem(last=False)
+            else:
+                agents.move_to_end(session_id)
+            reply = agent.handle(message, request_id=request_id)
+            outbox.put((key, True, reply if isinstance(reply, str) else str(reply)))
+        except Exception as e:
+            logger.exception("Worker %d: turn failed for session %s", index, session_id)
+            outbox.put((key, False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    __slots__ = ("index", "process", "inbox", "pending")
+
+    def __init__(self, index: int, process, inbox):
+        self.index = index
+        self.process = process
+        self.inbox = inbox
+        self.pending: List[str] = []      # keys sent to this worker, oldest first
+
+
+class PoolAgent:
+    """MainAgent look-alike that forwards turns to the pool (agent_factory for agent/server.py)."""
+
+    __slots__ = ("pool", "session_id", "user_id")
+
+    def __init__(self, pool: "WorkerPool", session_id: str, user_id: Optional[str] = None):
+        self.pool = pool
+        self.session_id = session_id
+        self.user_id = user_id
+
+    def handle(self, message: str, request_id: Optional[str] = None) -> str:
+        return self.pool.handle(self.session_id, message, request_id=request_id, user_id=self.user_id)
+
+    def handle_stream(self, message: str, request_id: Optional[str] = None):
+        # whole replies only: tokens are not forwarded across processes
+        yield self.handle(message, request_id=request_id)
+
+
+class WorkerPool:
+    def __init__(self, workers: Optional[int] = None, agent_factory: Optional[Callable] = None,
+                 max_sessions: Optional[int] = None, start_method: Optional[str] = None):
+        self.size = workers or int(os.getenv("WORKER_POOL_SIZE", "0") or 0) or os.cpu_count() or 1
+        self.agent_factory = agent_factory or _default_agent
+        self.max_sessions = max_sessions or int(os.getenv("WORKER_POOL_MAX_SESSIONS", "128") or 128)
+        self._ctx = mp.get_context(start_method or os.getenv("WORKER_POOL_START", "spawn"))
+        self._outbox = self._ctx.Queue()
+        self._keys = itertools.count(1)
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Tuple[Future, int]] = {}
+        self._closed = False
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "crashed": 0, "restarts": 0}
+
+        self._workers = [self._spawn(i) for i in range(self.size)]
+        self._collector = threading.Thread(target=self._collect, name="pool-collector", daemon=True)
+        self._monitor = threading.Thread(target=self._watch, name="pool-monitor", daemon=True)
+        self._collector.start()
+        self._monitor.start()
+
+    def _spawn(self, index: int) -> _Worker:
+        inbox = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main, name=f"agent-worker-{index}",
+            args=(index, inbox, self._outbox, self.agent_factory, self.max_sessions),
+            daemon=True,
+        )
+        proc.start()
+        return _Worker(index, proc, inbox)
+
+    # --------------------------------------------
+    # Public API
+    # --------------------------------------------
+    def worker_for(self, session_id: str) -> int:
+        """Sticky routing (stable across runs, unlike hash())."""
+        return zlib.crc32(session_id.encode("utf-8")) % self.size
+
+    def submit(self, session_id: str, message: str, request_id: Optional[str] = None,
+               user_id: Optional[str] = None) -> Future:
+        fut: Future = Future()
+        key = str(next(self._keys))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WorkerPool is closed.")
+            w = self._workers[self.worker_for(session_id)]
+            self._futures[key] = (fut, w.index)
+            w.pending.append(key)
+            w.inbox.put((key, request_id or new_request_id(), session_id, message, user_id))
+            self.stats["submitted"] += 1
+        return fut
+
+    def handle(self, session_id: str, message: str, request_id: Optional[str] = None,
+               timeout: Optional[float] = None, user_id: Optional[str] = None) -> str:
+        return self.submit(session_id, message, request_id, user_id).result(timeout)
+
+    def session(self, session_id: str, user_id: Optional[str] = None) -> PoolAgent:
+        return PoolAgent(self, session_id, user_id)
+
+    def pids(self) -> List[int]:
+        return [w.process.pid for w in self._workers]
+
+    def close(self, timeout: float = 10.0):
+        """Finish queued turns, stop the workers (terminate after `timeout`), fail anything left."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+        for w in workers:
+            w.inbox.put(None)
+        for w in workers:
+            w.process.join(timeout)
+            if w.process.is_alive():
+                logger.warning("Worker %d did not stop in %.0fs; terminating", w.index, timeout)
+                w.process.terminate()
+                w.process.join(1)
+        self._collector.join(2)
+        with self._lock:
+            left = list(self._futures.values())
+            self._futures.clear()
+        for fut, _ in left:
+            fut.set_exception(RuntimeError("WorkerPool closed before the turn finished."))
+
+    # --------------------------------------------
+    # Background threads
+    # --------------------------------------------
+    def _collect(self):
+        while True:
+            try:
+                key, ok, payload = self._outbox.get(timeout=0.5)
+            except queue.Empty:
+                if self._closed and not any(w.process.is_alive() for w in self._workers):
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                entry = self._futures.pop(key, None)
+                if entry is None:
+                    continue            # already failed by a crash
+                pending = self._workers[entry[1]].pending
+                if pending and pending[0] == key:
+                    pending.pop(0)
+                elif key in pending:
+                    pending.remove(key)
+                self.stats["completed" if ok else "failed"] += 1
+            fut = entry[0]
+            if ok:
+                fut.set_result(payload)
+            else:
+                fut.set_exception(RuntimeError(payload))
+
+    def _watch(self):
+        while not self._closed:
+            with self._lock:
+                by_sentinel = {w.process.sentinel: w for w in self._workers}
+            for sentinel in wait(list(by_sentinel), timeout=0.5):
+                if self._closed:
+                    return
+                self._restart(by_sentinel[sentinel])
+
+    def _restart(self, dead: _Worker):
+        with self._lock:
+            if self._workers[dead.index] is not dead:
+                return
+            dead.process.join(0)
+            lost = [self._futures.pop(k) for k in dead.pending if k in self._futures]
+            self._workers[dead.index] = self._spawn(dead.index)
+            self.stats["restarts"] += 1
+            self.stats["crashed"] += len(lost)
+        logger.warning("Worker %d died (exit code %s); restarted, %d request(s) failed",
+                       dead.index, dead.process.exitcode, len(lost))
+        for fut, _ in lost:
+            fut.set_exception(WorkerCrashed(f"Worker {dead.index} crashed (exit code {dead.process.exitcode})."))
@@ -0,0 +1,45 @@
+import argparse
+import os
+from typing import List, Optional
+
+import agent.notes_engine as notes_engine
+from agent.notes_engine import NotesEngine
+
+
+def dedupe_notes(policy: str = "merge", dry_run: bool = False, path: Optional[str] = None):
+    """
+    Collapse near-duplicate notes already in a store (default memory_store.json).
+    merge  → one note per group, keeping the longest text
+    reject → one note per group, keeping the oldest text
+    """
+    path = path or notes_engine.MEM_PATH
+    result = NotesEngine(path).dedupe_store(policy=policy, dry_run=dry_run)
+
+    verb = "Would remove" if dry_run else "Removed"
+    print(f"✔ {verb} {result['removed']} duplicate note(s): {result['before']} → {result['after']}.")
+    print(f"Path: {path}")
+    return result
+
+
+def store_paths(user: Optional[str] = None, all_users: bool = False) -> List[str]:
+    """The shared store, one user's shard, or the shared store plus every shard (agent/memory/shards.py)."""
+    from agent.memory.shards import shard_pool_from_env
+    pool = shard_pool_from_env()
+    if user:
+        return [pool.path_for(user)]
+    paths = [notes_engine.MEM_PATH]
+    if all_users and os.path.isdir(pool.root):
+        paths += sorted(os.path.join(pool.root, name) for name in os.listdir(pool.root) if name.endswith(".json"))
+    return paths
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Remove near-duplicate notes from the memory store")
+    ap.add_argument("--policy", choices=["merge", "reject"], default="merge")
+    ap.add_argument("--dry-run", action="store_true", help="report only; do not rewrite the store")
+    who = ap.add_mutually_exclusive_group()
+    who.add_argument("--user", default=None, help="dedupe this user's store shard instead of the shared store")
+    who.add_argument("--all-users", action="store_true", help="dedupe the shared store and every user shard")
+    args = ap.parse_args()
+    for p in store_paths(args.user, args.all_users):
+        dedupe_notes(policy=args.policy, dry_run=args.dry_run, path=p)
@@ -6,7 +6,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MEMORY_PATH = os.path.join(BASE_DIR, "agent", "memory", "memory_store.json")
 
 def reset_memory():
-    data = {"notes": [], "tasks": []}
+    data = {"notes": [], "tasks": [], "facts": []}
 
     # Ensure directory exists
     os.makedirs(os.path.dirname(MEMORY_PATH), exist_ok=True)
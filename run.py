@@ -1,14 +1,37 @@
 from agent.logging_config import configure_logging
 configure_logging(level="WARNING")
 
+import argparse
+import json
 import logging
 logger = logging.getLogger(__name__)
 logger.info("Logging test: run.py started")
 
 from agent.main_agent import MainAgent
+from agent.tracing import maybe_serve_from_env
+from agent.profiling import RequestProfiler
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="AI Concierge Agent CLI")
+    ap.add_argument("--profile", help="comma-separated: cprofile,tracemalloc,stack")
+    ap.add_argument("--profile-dir", default="logs/profiles")
+    ap.add_argument("--profile-sample", type=float, default=1.0, help="fraction of turns to profile")
+    ap.add_argument("--profile-slow-ms", type=float, default=None, help="only keep profiles of turns slower than this")
+    ap.add_argument("--user", default=None, help="keep notes/tasks/facts in this user's store shard")
+    return ap.parse_args()
 
 def main():
-    agent = MainAgent()
+    args = parse_args()
+    maybe_serve_from_env()
+    agent = MainAgent(user_id=args.user)
+
+    if args.profile:
+        agent.profiler = RequestProfiler(
+            modes=args.profile.split(","),
+            out_dir=args.profile_dir,
+            sample_rate=args.profile_sample,
+            slow_ms=args.profile_slow_ms,
+        )
 
     print("AI Concierge Agent (Day 4 Multi-Agent Version)")
     print("Type 'exit' to quit.\n")
@@ -20,15 +43,17 @@ def main():
             print("Goodbye!")
             break
 
-        result = agent.handle(user_input)
-
-        # --- CLEAN HUMAN OUTPUT ONLY ---
-        if isinstance(result, str):
-            print("Agent:", result)
-        elif isinstance(result, dict):
-            print("Agent:", result.get("output", ""))
-        else:
-            print("Agent:", str(result))
+        if user_input.lower() == "usage":
+            print("Usage:", json.dumps(agent.usage_summary(), indent=2))
+            print()
+            continue
+
+        # --- CLEAN HUMAN OUTPUT ONLY (streamed: long listings print line by line) ---
+        print("Agent:", end=" ", flush=True)
+        for chunk in agent.handle_stream(user_input):
+            if isinstance(chunk, dict):
+                chunk = chunk.get("output", "")
+            print(chunk, flush=True)
         # --------------------------------
 
         print()
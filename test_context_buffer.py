@@ -0,0 +1,39 @@
+import pytest
+
+from agent.context_buffer import ContextBuffer
+
+
+def test_ring_buffer_overwrites_oldest():
+    buf = ContextBuffer(capacity=3)
+    for i in range(5):
+        buf.append("user", f"q{i}")
+    assert len(buf) == 3
+    assert [t.text for t in buf] == ["q2", "q3", "q4"]
+    assert buf[0].text == "q2" and buf[-1].text == "q4"
+
+
+def test_last_view_and_role_filter():
+    buf = ContextBuffer(capacity=4)
+    buf.append("user", "what is rag")
+    buf.append("assistant", "retrieval augmented generation")
+    buf.append("user", "and a retriever?")
+    buf.append("assistant", "finds documents")
+    buf.append("user", "thanks")
+
+    view = buf.last(2)
+    assert len(view) == 2
+    assert view.join(" | ") == "assistant: finds documents | user: thanks"
+    assert [t.text for t in buf.iter_role("assistant")] == ["retrieval augmented generation", "finds documents"]
+    assert buf.last(10).join() == " | ".join(buf.lines())
+
+
+def test_tokens_are_cached_on_append():
+    buf = ContextBuffer(capacity=2)
+    turn = buf.append("user", "x" * 40)
+    assert turn.tokens == 10
+    assert buf.token_count() == 10
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        ContextBuffer(capacity=0)
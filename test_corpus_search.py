@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.tools.corpus_search import CorpusIndex, corpus_from_env
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "corpus"
+    (root / "sub").mkdir(parents=True)
+    (root / "rag.md").write_text(
+        "# Retrieval Augmented Generation\n\nRAG retrieves documents from a vector index "
+        "and passes them to the model as context.\n")
+    (root / "sub" / "cooking.txt").write_text("Boil the pasta for ten minutes, then add salt and olive oil.")
+    (root / "vectors.html").write_text(
+        "<html><head><title>Vector Databases</title><style>.x{}</style></head>"
+        "<body><p>A vector database stores embeddings for similarity search.</p>"
+        "<script>var index = 1;</script></body></html>")
+    (root / "ignored.py").write_text("vector vector vector")
+    return root
+
+
+def test_bm25_ranking_titles_and_snippets(corpus):
+    index = CorpusIndex(str(corpus), refresh_s=3600)
+    index.refresh(force=True)
+    results = index.search("vector database embeddings")
+    assert [r["link"] for r in results] == ["vectors.html", "rag.md"]
+    assert results[0]["title"] == "Vector Databases"
+    assert "embeddings" in results[0]["snippet"] and "var index" not in results[0]["snippet"]
+    assert index.search("pasta")[0]["link"] == os.path.join("sub", "cooking.txt")
+    assert index.search("retrieval")[0]["title"] == "Retrieval Augmented Generation"
+    assert index.search("zebra") == [] and index.search("the and") == []
+
+
+def test_refresh_reindexes_only_changed_files(corpus):
+    index = CorpusIndex(str(corpus), refresh_s=3600)
+    assert index.refresh(force=True) == {"indexed": 3, "removed": 0}
+    assert index.refresh(force=True) == {"indexed": 0, "removed": 0}
+
+    (corpus / "sub" / "cooking.txt").write_text("Risotto needs arborio rice and patience.")
+    (corpus / "rag.md").unlink()
+    (corpus / "new.txt").write_text("Arborio is a short-grain rice.")
+    assert index.refresh(force=True) == {"indexed": 2, "removed": 1}
+    assert [r["link"] for r in index.search("arborio rice")][0] in ("new.txt", os.path.join("sub", "cooking.txt"))
+    assert index.search("pasta") == [] and index.search("retrieval") == []
+
+    # compaction drops postings of the replaced / deleted documents
+    db = index._db()
+    rows = db.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+    index.compact()
+    assert db.execute("SELECT COUNT(*) FROM postings").fetchone()[0] < rows
+    assert index.search("pasta") == [] and len(index.search("arborio")) == 2
+
+    # the index persists: a new instance has nothing to redo
+    assert CorpusIndex(str(corpus), refresh_s=0).refresh() == {"indexed": 0, "removed": 0}
+
+
+def test_large_corpus_is_indexed_in_worker_processes(tmp_path):
+    root = tmp_path / "big"
+    root.mkdir()
+    for i in range(60):
+        (root / f"doc{i}.txt").write_text(f"document number {i} about topic{i % 6} " + "filler words " * 20)
+    index = CorpusIndex(str(root), refresh_s=3600, workers=2)
+    assert index.refresh(force=True)["indexed"] == 60
+    hits = index.search("topic3", k=20)
+    assert len(hits) == 10 and all(int(h["link"][3:-4]) % 6 == 3 for h in hits)
+
+
+def test_web_search_action_uses_corpus(corpus, tmp_path, monkeypatch):
+    from agent.agents.worker_agent import WorkerAgent
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(tmp_path / "memory_store.json"))
+    monkeypatch.setenv("CORPUS_DIR", str(corpus))
+    worker = WorkerAgent()                      # starts indexing the corpus in the background
+    assert corpus_from_env().wait(10)
+    result = worker.execute({"action": "web_search", "input": "how does rag retrieve documents"})
+    assert result["status"] == "ok" and result["output"][0]["link"] == "rag.md"
+
+    from agent.agents.smart_planner import load_planner_prompt
+    assert '"web_search"' in load_planner_prompt() and "search_web" not in load_planner_prompt()
+
+
+def test_search_never_waits_for_indexing(corpus, monkeypatch):
+    index = CorpusIndex(str(corpus), refresh_s=0)
+    gate = threading.Event()
+    real = index._index
+
+    def slow_index(db, changed):
+        gate.wait(5)
+        return real(db, changed)
+
+    monkeypatch.setattr(index, "_index", slow_index)
+    started = time.monotonic()
+    assert index.search("vector database") == []          # index still being built
+    assert time.monotonic() - started < 1 and not index.wait(0.05)
+    gate.set()
+    assert index.wait(5)
+    assert index.search("vector database")[0]["link"] == "vectors.html"
+
+
+def test_snippets_come_from_the_index_not_the_files(corpus, monkeypatch):
+    import agent.tools.corpus_search as corpus_search
+    (corpus / "long.txt").write_text("intro " * 600 + "zebra stripes")
+    index = CorpusIndex(str(corpus), refresh_s=3600)
+    index.refresh(force=True)
+    monkeypatch.setattr(corpus_search, "extract", lambda path: pytest.fail("search read " + path))
+    assert "embeddings" in index.search("vector embeddings")[0]["snippet"]
+    long = index.search("zebra")[0]       # past the stored excerpt: ranked, opening shown
+    assert long["link"] == "long.txt" and long["snippet"].startswith("intro") and long["snippet"].endswith("…")
+
+
+def test_index_without_excerpts_is_rebuilt(corpus):
+    import sqlite3
+    path = str(corpus / ".corpus_index.sqlite3")
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE docs (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE NOT NULL,"
+                " mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, title TEXT NOT NULL, length INTEGER NOT NULL)")
+    old.execute("INSERT INTO docs (path, mtime_ns, size, title, length) VALUES (?, 0, 0, 'stale', 1)",
+                (str(corpus / "rag.md"),))
+    old.commit()
+    old.close()
+    index = CorpusIndex(str(corpus), refresh_s=3600)
+    assert index.refresh(force=True)["indexed"] == 3
+    assert "vector index" in index.search("rag retrieves")[0]["snippet"]
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.agents.smart_planner import SmartPlanner
+from agent.agents.worker_agent import TIMEOUT_MESSAGE, WorkerAgent
+from agent.deadline import DeadlineExceeded, deadline_scope, remaining, timeout_for
+from agent.llm.openrouter_client import OpenRouterClient
+from agent.llm.rate_limiter import ProviderLimiter, RateLimitExceeded
+from agent.llm.stub_server import StubSettings, start_stub_server
+
+
+def test_inner_scope_only_shortens():
+    assert remaining() is None
+    with deadline_scope(10):
+        with deadline_scope(60):
+            assert remaining() <= 10
+        with deadline_scope(1):
+            assert remaining() <= 1
+        assert 1 < remaining() <= 10
+    assert remaining() is None
+
+
+def test_timeout_for_caps_and_refuses_late_calls(monkeypatch):
+    monkeypatch.setenv("AGENT_MIN_CALL_S", "0.5")
+    assert timeout_for(30) == 30
+    with deadline_scope(2):
+        assert timeout_for(30) <= 2
+    with deadline_scope(0.2):
+        with pytest.raises(DeadlineExceeded):
+            timeout_for(30, stage="test call")
+
+
+class _SlowLLM:
+    calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        time.sleep(0.2)
+        return '{"action": "add_task", "input": "from llm"}'
+
+
+def test_planner_uses_rules_when_time_is_short(monkeypatch):
+    monkeypatch.setenv("AGENT_ANSWER_RESERVE_S", "1")
+    planner = SmartPlanner(llm=_SlowLLM())
+    with deadline_scope(30):
+        assert planner.decide("what is rag")["input"] == "from llm"
+    with deadline_scope(1.2):
+        plan = planner.decide("what is rag")
+    assert plan["action"] == "answer_directly" and planner.llm.calls == 1
+
+
+def test_worker_refuses_to_start_after_deadline(tmp_path, monkeypatch):
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(tmp_path / "memory_store.json"))
+    worker = WorkerAgent()
+    with deadline_scope(0):
+        result = worker.execute({"action": "add_task", "input": "never added"})
+    assert result == {"status": "error", "error": TIMEOUT_MESSAGE}
+    assert worker.tasks.count() == 0
+
+
+def test_rate_limiter_wait_is_bounded_by_deadline():
+    limiter = ProviderLimiter("t", rps=1)
+    limiter.acquire()                     # drain the burst
+    started = time.monotonic()
+    with deadline_scope(0.2), pytest.raises(RateLimitExceeded):
+        limiter.acquire()
+    assert time.monotonic() - started < 0.6
+
+
+def test_slow_llm_call_is_cancelled_at_deadline(monkeypatch):
+    server = start_stub_server(StubSettings(latency="fixed:3000"))
+    monkeypatch.setenv("OPENROUTER_API_KEY", "stub-key")
+    monkeypatch.setenv("OPENROUTER_URL", server.openrouter_url)
+    try:
+        client = OpenRouterClient()
+        started = time.monotonic()
+        with deadline_scope(1), pytest.raises(DeadlineExceeded):
+            client.generate("hello")
+        assert time.monotonic() - started < 2
+    finally:
+        server.shutdown()
@@ -0,0 +1,107 @@
+import json
+import random
+
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.dedup_index import SimHashIndex, hamming, simhash
+from agent.notes_engine import NotesEngine
+
+RAG = ("Retrieval augmented generation combines a retriever that fetches relevant documents "
+       "with a generator that uses them to produce grounded answers.")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = tmp_path / "memory_store.json"
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(path))
+    return path
+
+
+def test_simhash_ignores_case_and_punctuation():
+    assert hamming(simhash(RAG), simhash(RAG.upper().rstrip("."))) == 0
+    assert hamming(simhash(RAG), simhash("Buy milk and eggs tomorrow morning")) > 7
+
+
+def test_banded_index_finds_everything_within_distance():
+    rng = random.Random(7)
+    index = SimHashIndex(bands=8, max_distance=7)
+    base = rng.getrandbits(64)
+    index.add("base", base)
+    for k in range(200):
+        index.add(k, rng.getrandbits(64))
+    for d in range(8):
+        flipped = base
+        for bit in rng.sample(range(64), d):
+            flipped ^= 1 << bit
+        assert ("base", d) in index.query(flipped)
+    index.remove("base")
+    assert "base" not in index and all(k != "base" for k, _ in index.query(base))
+
+
+def test_reject_policy_returns_existing_note(store):
+    eng = NotesEngine()
+    first = eng.add_note_raw(RAG)
+    again = eng.add_note_raw(RAG.lower())
+    assert again["duplicate"] and again["id"] == first["id"]
+    assert len(eng.list_notes()) == 1
+    assert eng.add_note_raw("Buy milk")["id"] == 2
+
+
+def test_merge_and_allow_policies(store):
+    eng = NotesEngine()
+    eng.add_note_raw(RAG)
+    merged = eng.add_note_raw(RAG + " Also cites sources.", policy="merge")
+    assert merged["duplicate"] and eng.list_notes()[0]["text"].endswith("sources.")
+    eng.add_note_raw(RAG, policy="allow")
+    assert len(eng.list_notes()) == 2
+
+
+def test_index_follows_external_writes(store):
+    eng = NotesEngine()
+    eng.add_note_raw("first note")
+    other = NotesEngine()
+    other.add_note_raw(RAG)
+    assert eng.find_duplicate(RAG)["id"] == 2
+
+
+def test_dedupe_store_backfill(store):
+    store.write_text(json.dumps({"notes": [
+        {"id": 1, "text": RAG},
+        {"id": 2, "text": "Buy milk and eggs"},
+        {"id": 3, "text": RAG.upper()},
+        {"id": 4, "text": RAG + " Also cites sources."},
+    ], "tasks": []}))
+    eng = NotesEngine()
+    assert eng.dedupe_store(dry_run=True)["removed"] == 2
+    assert len(eng.list_notes()) == 4
+    assert eng.dedupe_store(policy="merge") == {"before": 4, "after": 2, "removed": 2}
+    notes = eng.list_notes()
+    assert [n["id"] for n in notes] == [1, 2] and notes[0]["text"].endswith("sources.")
+
+
+def test_merge_reindexes_the_keeper(store):
+    # b is within range of both; c only of b, whose wording the keeper takes over
+    store.write_text(json.dumps({"notes": [
+        {"id": 1, "text": "a", "fp": f"{0:016x}"},
+        {"id": 2, "text": "bb", "fp": f"{0x3F:016x}"},
+        {"id": 3, "text": "ccc", "fp": f"{0x3F3F:016x}"},
+    ], "tasks": []}))
+    eng = NotesEngine()
+    assert eng.dedupe_store(policy="merge") == {"before": 3, "after": 1, "removed": 2}
+    assert eng.list_notes()[0]["text"] == "ccc"
+
+
+def test_dedupe_script_covers_user_shards(store, tmp_path, monkeypatch):
+    from dedupe_notes import dedupe_notes, store_paths
+    monkeypatch.setenv("STORE_SHARDS_DIR", str(tmp_path / "users"))
+    alice = store_paths(user="alice")[0]
+    NotesEngine(alice).add_note_raw(RAG)
+    notes = json.loads(open(alice).read())
+    notes["notes"].append({"id": 2, "text": RAG.upper()})
+    with open(alice, "w") as f:
+        json.dump(notes, f)
+
+    assert store_paths(all_users=True) == [str(store), alice]
+    assert dedupe_notes(path=alice)["removed"] == 1
+    assert len(NotesEngine(alice).list_notes()) == 1
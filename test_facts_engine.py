@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.facts_engine import FactsEngine, classify
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = tmp_path / "memory_store.json"
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(path))
+    return path
+
+
+def test_add_fact_dedups_and_persists(store):
+    eng = FactsEngine()
+    first = eng.add_fact("User prefers short answers.")
+    again = eng.add_fact("user prefers short answers")
+    assert again["duplicate"] and again["id"] == first["id"]
+    assert first["kind"] == "preference" and classify("Paris is in France") == "fact"
+    assert [f["text"] for f in FactsEngine().list_facts()] == ["User prefers short answers."]
+
+
+def test_search_uses_index_and_ranks_by_idf(store):
+    eng = FactsEngine()
+    eng.add_fact("The user's dog is called Biscuit")
+    eng.add_fact("The user works on a Kubernetes cluster at work")
+    eng.add_fact("The user's sister lives in Lisbon")
+    hits = eng.search("how do I scale my kubernetes cluster?", k=2)
+    assert hits[0]["text"].startswith("The user works on a Kubernetes")
+    assert eng.search("zebra") == []
+
+
+def test_relevant_respects_token_budget_and_puts_preferences_first(store):
+    eng = FactsEngine(top_k=3, token_budget=40)
+    eng.add_fact("I prefer answers in bullet points")
+    for i in range(200):
+        eng.add_fact(f"Project {i} uses database engine number {i} for storage")
+    picked = eng.relevant("which database does project 7 use?")
+    assert picked[0] == "I prefer answers in bullet points"
+    assert "Project 7 uses database engine number 7 for storage" in picked
+    assert sum(len(p) // 4 + 2 for p in picked) <= 40
+
+
+def test_loads_legacy_string_facts_and_sees_external_writes(store):
+    store.write_text(json.dumps({"notes": [], "tasks": [], "facts": ["User likes tea"]}))
+    eng = FactsEngine()
+    assert eng.list_facts()[0]["kind"] == "preference"
+    version = eng.version
+
+    FactsEngine().add_fact("User lives in Oslo")
+    assert eng.search("oslo")[0]["text"] == "User lives in Oslo"
+    assert eng.version > version
+
+
+def test_legacy_ids_never_collide_with_explicit_ones(store):
+    store.write_text(json.dumps({"notes": [], "tasks": [], "facts": [
+        "User likes tea", {"id": 1, "text": "User lives in Oslo"}, "User drives a bike"]}))
+    facts = FactsEngine().list_facts()
+    assert sorted(f["id"] for f in facts) == [1, 2, 3]
+    assert {f["text"] for f in facts} == {"User likes tea", "User lives in Oslo", "User drives a bike"}
+
+
+def test_missing_facts_key_is_fine(store):
+    store.write_text(json.dumps({"notes": [], "tasks": []}))
+    eng = FactsEngine()
+    eng.add_fact("User is vegetarian")
+    data = json.loads(store.read_text())
+    assert data["notes"] == [] and data["facts"][0]["text"] == "User is vegetarian"
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from agent.agents.smart_planner import SmartPlanner
+from agent.llm.generation import answer_profile, current_profile, generation_scope, repair_json
+from agent.llm.gemini_client import GeminiClient
+from agent.llm.openrouter_client import OpenRouterClient
+from agent.llm.stub_server import StubSettings, start_stub_server
+
+LONG_ANSWER = " ".join(f"word{i}" for i in range(600))
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = start_stub_server(StubSettings(mode="canned", canned=LONG_ANSWER))
+    monkeypatch.setenv("OPENROUTER_API_KEY", "stub-key")
+    monkeypatch.setenv("OPENROUTER_URL", server.openrouter_url)
+    yield server
+    server.shutdown()
+
+
+def test_answer_profile_from_query_features():
+    assert answer_profile("What is the capital of France?") == "short"
+    assert answer_profile("Explain how RAG works") == "explain"
+    assert answer_profile("compare sqlite vs postgres") == "explain"
+    assert answer_profile(" ".join(["word"] * 30) + "?") == "explain"
+
+
+def test_profiles_and_env_override(monkeypatch):
+    assert current_profile().name == "default" and current_profile().max_tokens == 512
+    with generation_scope("planner"):
+        assert current_profile().stop and current_profile().temperature == 0.0
+    monkeypatch.setenv("LLM_MAX_TOKENS_SHORT", "64")
+    with generation_scope("short"):
+        assert current_profile().max_tokens == 64
+    monkeypatch.setenv("LLM_GENERATION_PROFILES", "0")
+    with generation_scope("explain"):
+        assert current_profile().name == "default"
+
+
+def test_repair_json_closes_truncated_plans():
+    plan = '{"action": "multi", "actions": [{"id": "1", "action": "add_task", "input": "milk"}'
+    assert json.loads(repair_json(plan))["actions"][0]["input"] == "milk"
+    assert json.loads(repair_json('```json\n{"action": "clarify", "input": "hm'))["input"] == "hm"
+    assert json.loads(repair_json('{"a": [1, 2,')) == {"a": [1, 2]}
+    assert repair_json('Sure! {"a": "}"} trailing') == '{"a": "}"}'
+
+
+def test_repair_json_keeps_every_step_of_a_bare_list_plan():
+    from agent.agents.smart_planner import normalize_plan
+    steps = '[{"action": "add_task", "input": "x"}, {"action": "add_note", "input": "y"}]'
+    plan = normalize_plan(json.loads(repair_json("Plan:\n" + steps)))
+    assert [s["action"] for s in plan["actions"]] == ["add_task", "add_note"]
+    assert json.loads(repair_json(steps[:-2])) == json.loads(steps)       # truncated list is closed
+
+
+def test_openrouter_sends_profile_limits(stub):
+    client = OpenRouterClient()
+    with generation_scope("short"):
+        short = client.generate("hello")
+    with generation_scope("explain"):
+        explain = client.generate("hello")
+    assert len(short.split()) == 192 and len(explain.split()) == 600
+
+
+def test_gemini_sends_generation_config(stub):
+    genai = pytest.importorskip("google.genai")
+    client = GeminiClient()
+    client.client = genai.Client(api_key="stub-key", http_options={"base_url": stub.base_url})
+    client.provider, client.mode, client.prompt_cache = "gemini", "gemini", None
+    with generation_scope("short"):
+        assert len(client.generate("hello").split()) == 192
+
+
+def test_planner_parses_plan_cut_at_stop_sequence(stub):
+    stub.settings.canned = '{\n  "action": "add_task",\n  "input": "buy milk"\n}\n\nI chose add_task because...'
+    plan = SmartPlanner(llm=OpenRouterClient()).decide("what is rag")
+    assert plan["action"] == "add_task" and plan["input"] == "buy milk"
@@ -0,0 +1,74 @@
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.listing import Listing, is_more_cmd
+from agent.notes_engine import NotesEngine
+
+
+def _fetcher(n, calls):
+    def fetch(cursor, limit):
+        calls.append(cursor)
+        start = cursor or 0
+        items = [{"id": i} for i in range(start + 1, min(n, start + limit) + 1)]
+        more = start + limit < n
+        return {"items": items, "next_cursor": items[-1]["id"] if more else None, "total": n}
+    return fetch
+
+
+def test_listing_fetches_pages_lazily():
+    calls = []
+    listing = Listing("things", _fetcher(7, calls), lambda t: f"#{t['id']}", page_size=3)
+    assert calls == []
+
+    first = listing.next_page()
+    assert list(first)[:3] == ["#1", "#2", "#3"] and "say 'more'" in list(first)[-1]
+    assert first.summary == "Listed things 1-3 of 7; more available."
+    assert calls == [None]
+
+    rest = list(listing)
+    assert [p.start for p in rest] == [4, 7]
+    assert str(rest[-1]) == "#7"
+    assert listing.exhausted and listing.next_page() is None
+    assert calls == [None, 3, 6]
+
+
+def test_empty_listing_and_first_page_reuse():
+    calls = []
+    empty = Listing("notes", _fetcher(0, calls), str).next_page()
+    assert str(empty) == "You have no notes." and empty.summary == "Listed notes: none."
+
+    first = _fetcher(5, [])(None, 2)
+    listing = Listing("tasks", _fetcher(5, calls), str, page_size=2, first_page=first)
+    listing.next_page()
+    assert calls == [None]     # only the empty listing fetched; first page was reused
+
+
+def test_more_commands():
+    assert is_more_cmd("More") and is_more_cmd("next page.") and not is_more_cmd("more about RAG")
+
+
+def test_notes_page_by_id_cursor(tmp_path, monkeypatch):
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(tmp_path / "store.json"))
+    eng = NotesEngine()
+    for i in range(5):
+        eng.add_note_raw(f"note {i}")
+    page = eng.list_notes_page(limit=2)
+    assert [n["id"] for n in page["items"]] == [1, 2] and page["next_cursor"] == 2
+    page = eng.list_notes_page(limit=2, cursor=4)
+    assert [n["id"] for n in page["items"]] == [5] and page["next_cursor"] is None
+
+
+def test_more_continues_a_listing_from_a_multi_step_plan(tmp_path, monkeypatch):
+    import agent.agents.worker_agent as worker_agent
+    from agent.main_agent import MainAgent
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(tmp_path / "store.json"))
+    monkeypatch.setattr(worker_agent, "PAGE_SIZE", 2)
+    agent = MainAgent()
+    agent.planner.decide = lambda q, c="": agent.planner._fallback(q)
+    for t in ("one", "two", "three"):
+        agent.worker.tasks.add_task(t)
+
+    first = agent.handle("add task: four then list tasks")
+    assert "one" in first and "three" not in first and "say 'more'" in first
+    rest = str(agent.handle("more"))
+    assert "three" in rest and "four" in rest and "one" not in rest
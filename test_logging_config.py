@@ -0,0 +1,57 @@
+import json
+import logging
+
+from agent.logging_config import JsonFormatter, RequestContextFilter, SamplingFilter
+from agent.tracing import request_scope
+
+
+def _record(msg, level=logging.WARNING):
+    return logging.LogRecord("agent.test", level, __file__, 1, msg, None, None)
+
+
+def test_sampling_suppresses_repeats_and_reports_count():
+    f = SamplingFilter(burst=2, window=60)
+    passed = [f.filter(_record("SmartPlanner failed: %s")) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert f.filter(_record("different warning"))
+    assert f.filter(_record("info is never sampled", logging.INFO))
+
+    f.window = 0  # roll the window over
+    rec = _record("SmartPlanner failed: %s")
+    assert f.filter(rec)
+    assert "suppressed 3 similar" in rec.msg
+
+
+def test_json_records_carry_request_id():
+    rec = _record("hello")
+    with request_scope("rid-42"):
+        RequestContextFilter().filter(rec)
+    payload = json.loads(JsonFormatter().format(rec))
+    assert payload["request_id"] == "rid-42"
+    assert payload["msg"] == "hello"
+
+
+def test_sampling_collapses_real_planner_failures():
+    from agent.agents.smart_planner import SmartPlanner
+
+    class FailingLLM:
+        calls = 0
+
+        def generate(self, *args, **kwargs):
+            FailingLLM.calls += 1
+            raise RuntimeError(f"upstream 503 (attempt {FailingLLM.calls})")     # unique text every time
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    handler.addFilter(SamplingFilter(burst=2, window=60))
+    logger = logging.getLogger("agent.agents.smart_planner")
+    logger.addHandler(handler)
+    try:
+        planner = SmartPlanner(llm=FailingLLM())
+        for _ in range(5):
+            planner.decide("what is rag")
+    finally:
+        logger.removeHandler(handler)
+    warnings = [r for r in records if r.levelno == logging.WARNING]
+    assert len(warnings) == 2 and "attempt 1" in warnings[0].getMessage()
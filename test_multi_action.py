@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
+
+import agent.notes_engine as notes_engine
+from agent.agents.smart_planner import SmartPlanner, normalize_plan
+from agent.agents.worker_agent import WorkerAgent, plan_levels
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(tmp_path / "memory_store.json"))
+    return WorkerAgent()
+
+
+def _slow(name, delay, active):
+    def fn(arg):
+        active.append(threading.current_thread().name)
+        time.sleep(delay)
+        return {"status": "ok", "action": name, "output": f"{name}:{arg}"}
+    return fn
+
+
+def test_levels_follow_dependencies_and_store_conflicts():
+    steps = [
+        {"id": "a", "action": "web_search", "input": "x"},
+        {"id": "b", "action": "add_task", "input": "y"},
+        {"id": "c", "action": "add_note", "input": "z"},          # shares the store file with b
+        {"id": "d", "action": "list_tasks", "input": ""},          # reads what b wrote
+        {"id": "e", "action": "answer_directly", "depends_on": ["a"]},
+    ]
+    assert plan_levels(steps) == [[0, 1], [2, 3, 4]]
+    with pytest.raises(ValueError):
+        plan_levels([{"id": "a", "action": "clarify", "depends_on": ["b"]},
+                     {"id": "b", "action": "clarify", "depends_on": ["a"]}])
+    with pytest.raises(ValueError):
+        plan_levels([{"action": "clarify", "depends_on": ["missing"]}])
+
+
+def test_independent_steps_run_concurrently(worker):
+    active = []
+    worker.tools["web_search"] = _slow("web_search", 0.2, active)
+    worker.tools["clarify"] = _slow("clarify", 0.2, active)
+    started = time.perf_counter()
+    result = worker.execute({"action": "multi", "actions": [
+        {"action": "web_search", "input": "rust"},
+        {"action": "clarify", "input": "what?"},
+    ]})
+    elapsed = time.perf_counter() - started
+    assert result["status"] == "ok" and result["action"] == "multi"
+    assert [r["output"] for r in result["output"]] == ["web_search:rust", "clarify:what?"]
+    assert elapsed < 0.35 and len(set(active)) == 2
+
+
+def test_workers_share_one_step_pool(worker):
+    threads = threading.active_count()
+    others = [WorkerAgent() for _ in range(5)]
+    assert all(w._pool is worker._pool for w in others)
+    assert threading.active_count() == threads
+
+
+def test_failed_dependency_skips_dependents(worker):
+    worker.tools["web_search"] = lambda q: {"status": "error", "error": "offline"}
+    result = worker.execute({"actions": [
+        {"id": "1", "action": "web_search", "input": "rust"},
+        {"id": "2", "action": "add_task", "input": "read results", "depends_on": ["1"]},
+        {"id": "3", "action": "add_note", "input": "unrelated"},
+    ]})
+    assert result["status"] == "partial"
+    assert result["output"][1]["error"].startswith("Skipped")
+    assert result["output"][2]["status"] == "ok"
+    assert worker.tasks.count() == 0
+
+
+def test_planner_splits_compound_requests():
+    planner = SmartPlanner.__new__(SmartPlanner)
+    plan = planner._fallback("add task buy milk, note call mom and search rust")
+    assert [s["action"] for s in plan["actions"]] == ["add_task", "add_note", "web_search"]
+    plan = planner._fallback("add task: pay rent then list tasks")
+    assert plan["actions"][1]["depends_on"] == ["1"]
+    assert planner._fallback("salt and pepper")["action"] == "answer_directly"
+    assert normalize_plan([{"action": "add_note", "input": "x"}])["action"] == "add_note"
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+genai = pytest.importorskip("google.genai")
+
+from agent.llm.prompt_cache import PromptCache
+from agent.llm.stub_server import StubSettings, start_stub_server
+
+PREFIX = "You are the planner. Choose one action.\n" * 20
+
+
+@pytest.fixture
+def stub():
+    server = start_stub_server(StubSettings(seed=1))
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def client(stub):
+    return genai.Client(api_key="stub-key", http_options={"base_url": stub.base_url})
+
+
+def test_prefix_is_uploaded_once_and_reused(stub, client):
+    cache = PromptCache(client, "gemini-test", min_tokens=0)
+    first = cache.handle(PREFIX, "planner")
+    assert first and cache.handle(PREFIX, "planner") == first
+    assert cache.stats["creates"] == 1 and cache.stats["hits"] == 1
+    assert stub.stats["cache_creates"] == 1
+
+
+def test_changed_prefix_replaces_and_deletes_old_handle(stub, client):
+    cache = PromptCache(client, "gemini-test", min_tokens=0)
+    old = cache.handle(PREFIX, "planner")
+    new = cache.handle(PREFIX + "New rule.\n", "planner")
+    assert new != old and cache.stats["invalidations"] == 1
+    assert old not in stub.caches and new in stub.caches
+
+
+def test_handle_near_expiry_is_refreshed(stub, client):
+    cache = PromptCache(client, "gemini-test", ttl_s=2, min_tokens=0, refresh_margin_s=1.5)
+    name = cache.handle(PREFIX)
+    time.sleep(1.1)
+    assert cache.handle(PREFIX) == name
+    assert cache.stats["refreshes"] == 1 and stub.stats["cache_refreshes"] == 1
+
+
+def test_small_prefix_and_failures_fall_back(stub, client):
+    assert PromptCache(client, "gemini-test", min_tokens=10_000).handle(PREFIX) is None
+
+    dead = genai.Client(api_key="stub-key", http_options={"base_url": "http://127.0.0.1:9"})
+    cache = PromptCache(dead, "gemini-test", min_tokens=0)
+    assert cache.handle(PREFIX) is None
+    assert cache.handle(PREFIX) is None      # backed off: no second create attempt
+    assert cache.stats["errors"] == 1 and cache.stats["fallbacks"] == 2
+
+
+def test_forget_drops_a_rejected_handle(stub, client):
+    cache = PromptCache(client, "gemini-test", min_tokens=0)
+    name = cache.handle(PREFIX)
+    cache.forget(name)
+    assert cache.handle(PREFIX) != name and cache.stats["creates"] == 2
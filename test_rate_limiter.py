@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+from agent.llm.rate_limiter import BATCH, INTERACTIVE, ProviderLimiter, RateLimitExceeded, RateLimiterRegistry
+
+
+def test_requests_per_second_is_enforced():
+    limiter = ProviderLimiter("t", rps=20)
+    started = time.monotonic()
+    for _ in range(30):
+        limiter.acquire()
+    # 20 burst, then 10 more at 20/s
+    assert 0.4 <= time.monotonic() - started < 1.0
+
+
+def test_interactive_calls_jump_the_queue():
+    limiter = ProviderLimiter("t", rps=10)
+    for _ in range(10):
+        limiter.acquire()           # drain the burst
+    order = []
+
+    def call(name, prio):
+        limiter.acquire(priority=prio)
+        order.append(name)
+
+    threads = [threading.Thread(target=call, args=(f"batch{i}", BATCH)) for i in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.02)
+    urgent = threading.Thread(target=call, args=("interactive", INTERACTIVE))
+    urgent.start()
+    for t in threads + [urgent]:
+        t.join()
+    assert order[0] == "interactive"
+
+
+def test_full_queue_sheds_lowest_priority():
+    limiter = ProviderLimiter("t", rps=1, max_queue=1)
+    limiter.acquire()
+    errors = []
+
+    def batch():
+        try:
+            limiter.acquire(priority=BATCH)
+        except RateLimitExceeded as e:
+            errors.append(e)
+
+    t = threading.Thread(target=batch)
+    t.start()
+    time.sleep(0.02)
+    limiter.acquire(priority=INTERACTIVE)
+    t.join()
+    assert errors and limiter.stats["shed"] == 1
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(priority=BATCH, timeout=0.01)
+
+
+def test_unconfigured_provider_is_unlimited():
+    reg = RateLimiterRegistry({"gemini": {"rps": 5}})
+    assert reg.get("openrouter", "x").queue_depth == 0
+    assert reg.get("gemini", "m") is reg.get("gemini", "other")
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from agent.llm.generation import generation_scope
+from agent.llm.gemini_client import GeminiClient
+from agent.llm.openrouter_client import OpenRouterClient
+from agent.llm.response_cache import CacheMiss, ResponseCache
+from agent.llm.stub_server import StubSettings, start_stub_server
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = start_stub_server(StubSettings(mode="echo"))
+    monkeypatch.setenv("OPENROUTER_API_KEY", "stub-key")
+    monkeypatch.setenv("OPENROUTER_URL", server.openrouter_url)
+    yield server
+    server.shutdown()
+
+
+def _use_cache(monkeypatch, path, mode):
+    monkeypatch.setenv("LLM_CACHE_MODE", mode)
+    monkeypatch.setenv("LLM_CACHE_PATH", str(path))
+
+
+def test_record_then_replay_offline(stub, tmp_path, monkeypatch):
+    db = tmp_path / "llm.sqlite3"
+    _use_cache(monkeypatch, db, "record")
+    recorded = OpenRouterClient().generate("what is rag", prefix="be brief")
+    stub.shutdown()
+
+    _use_cache(monkeypatch, db, "replay")          # fresh process-wide cache, same file
+    client = OpenRouterClient()
+    assert client.generate("what is rag", prefix="be brief") == recorded
+    with pytest.raises(CacheMiss):
+        client.generate("never recorded")
+    with generation_scope("explain"), pytest.raises(CacheMiss):
+        client.generate("what is rag", prefix="be brief")     # other params → other key
+
+
+def test_read_through_calls_provider_once(stub, tmp_path, monkeypatch):
+    _use_cache(monkeypatch, tmp_path / "llm.sqlite3", "read-through")
+    client = OpenRouterClient()
+    first = client.generate("hello cache")
+    calls = stub.stats["requests"]
+    assert client.generate("hello cache") == first
+    assert stub.stats["requests"] == calls and client.response_cache.stats["hits"] == 1
+
+
+def test_gemini_stream_is_recorded_and_replayed(stub, tmp_path, monkeypatch):
+    genai = pytest.importorskip("google.genai")
+    db = tmp_path / "llm.sqlite3"
+    _use_cache(monkeypatch, db, "record")
+    client = GeminiClient()
+    client.client = genai.Client(api_key="stub-key", http_options={"base_url": stub.base_url})
+    client.provider, client.mode, client.prompt_cache = "gemini", "gemini", None
+    pieces = list(client.generate_stream("tell me a story about caching"))
+    assert len(pieces) > 1
+
+    client.response_cache = ResponseCache(str(db), "replay")
+    assert list(client.generate_stream("tell me a story about caching")) == ["".join(pieces)]
+    assert client.generate("tell me a story about caching") == "".join(pieces)
+
+
+def test_ttl_and_lru_size_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite3"), "read-through", ttl_s=0.2, max_bytes=250)
+    for i in range(3):
+        cache.put(f"k{i}", "p", "m", str(i) * 100)
+        time.sleep(0.01)
+    assert cache.get("k0") is None and cache.size() == (2, 200)     # LRU row evicted
+    cache.get("k1")                                                   # k1 now most recent
+    cache.put("k3", "p", "m", "3" * 100)
+    assert cache.get("k2") is None and cache.get("k1") is not None
+    time.sleep(0.25)
+    assert cache.get("k3") is None and cache.stats["expired"] >= 1
+
+    replay = ResponseCache(str(tmp_path / "c.sqlite3"), "replay", ttl_s=0.2)
+    assert replay.get("k1") == "1" * 100            # recordings don't expire in replay
+
+
+def test_writes_keep_a_running_total_instead_of_scanning(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "c.sqlite3"), "read-through", ttl_s=3600, max_bytes=1000)
+    monkeypatch.setattr(cache, "_total", lambda: pytest.fail("SUM(size) scan on an ordinary write"))
+    for i in range(5):
+        cache.put(f"k{i}", "p", "m", "x" * 100)
+    cache.put("k0", "p", "m", "y" * 50)            # replacing a row adjusts the total
+    assert cache._bytes == 450 == cache.size()[1]
+
+    monkeypatch.undo()
+    for i in range(5, 12):
+        cache.put(f"k{i}", "p", "m", "z" * 100)
+    # 50 bytes over the limit evicts two rows: down to the 90% low-water mark, not just under it
+    assert cache._bytes == cache.size()[1] <= 1000 and cache.stats["evicted"] == 2
@@ -0,0 +1,216 @@
+import asyncio
+import base64
+import http.client
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from agent.llm.streaming import current_sink
+from agent.server import AgentServer, _TokenPipe
+
+
+class FakeAgent:
+    delay = 0.0
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.turns = 0
+
+    def handle_stream(self, message, request_id=None):
+        self.turns += 1
+        if message.startswith("list"):
+            yield from ["1. first", "2. second"]
+            return
+        words = [f"turn{self.turns}:", *message.split()]
+        sink = current_sink()
+        for w in words:
+            if sink is not None:
+                sink(w + " ")
+            time.sleep(self.delay)
+        yield " ".join(words)
+
+
+class SlowAgent(FakeAgent):
+    delay = 0.1
+
+
+@pytest.fixture
+def serve():
+    running = []
+
+    def start(**kw):
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        kw.setdefault("agent_factory", FakeAgent)
+        srv = AgentServer(host="127.0.0.1", port=0, **kw)
+        asyncio.run_coroutine_threadsafe(srv.start(), loop).result(5)
+        running.append((srv, loop))
+        return srv, loop
+
+    yield start
+    for srv, loop in running:
+        if not srv.draining:
+            asyncio.run_coroutine_threadsafe(srv.stop(1), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def _request(srv, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.port, timeout=5)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    data = json.loads(resp.read() or b"{}")
+    conn.close()
+    return resp.status, data, resp
+
+
+def _ws_connect(srv, query=""):
+    sock = socket.create_connection(("127.0.0.1", srv.port), timeout=5)
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall((f"GET /ws{query} HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    head = b""
+    while b"\r\n\r\n" not in head:
+        head += sock.recv(1)
+    assert head.startswith(b"HTTP/1.1 101")
+    return sock
+
+
+def _ws_send(sock, obj):
+    payload = json.dumps(obj).encode()
+    mask = os.urandom(4)
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    sock.sendall(struct.pack("!BB", 0x81, 0x80 | len(payload)) + mask + masked)
+
+
+def _recv_exact(sock, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        assert chunk, "connection closed"
+        buf += chunk
+    return buf
+
+
+def _ws_recv(sock):
+    b1, b2 = _recv_exact(sock, 2)
+    n = b2 & 0x7F
+    if n == 126:
+        (n,) = struct.unpack("!H", _recv_exact(sock, 2))
+    data = _recv_exact(sock, n)
+    return json.loads(data) if b1 & 0x0F == 0x1 else ("close", struct.unpack("!H", data[:2])[0])
+
+
+def test_http_chat_keeps_session_and_reports_health(serve):
+    srv, _ = serve()
+    status, first, _ = _request(srv, "POST", "/chat", {"message": "hello there"})
+    assert status == 200 and first["reply"] == "turn1: hello there"
+    status, second, _ = _request(srv, "POST", "/chat", {"message": "again", "session_id": first["session_id"]})
+    assert second["reply"] == "turn2: again"
+
+    assert _request(srv, "GET", "/health")[1]["sessions"] == 1
+    assert _request(srv, "GET", "/ready")[0] == 200
+    assert _request(srv, "POST", "/chat", {"message": ""})[0] == 400
+    assert _request(srv, "POST", "/chat", {"message": "x", "session_id": "../etc"})[0] == 400
+    assert _request(srv, "GET", "/nope")[0] == 404
+
+
+def test_user_id_is_bound_to_the_session(serve):
+    users = {}
+
+    def factory(session_id, user_id=None):
+        users[session_id] = user_id
+        return FakeAgent(session_id)
+
+    srv, _ = serve(agent_factory=factory)
+    assert _request(srv, "POST", "/chat", {"message": "hi", "session_id": "s1", "user_id": "alice"})[0] == 200
+    assert _request(srv, "POST", "/chat", {"message": "hi", "session_id": "s1", "user_id": "alice"})[0] == 200
+    assert _request(srv, "POST", "/chat", {"message": "hi", "session_id": "s1", "user_id": "bob"})[0] == 403
+    assert _request(srv, "POST", "/chat", {"message": "hi", "user_id": "a/b"})[0] == 400
+    assert users == {"s1": "alice"}
+
+
+def test_bound_session_rejects_missing_user_id(serve):
+    srv, _ = serve(agent_factory=lambda session_id, user_id=None: FakeAgent(session_id))
+    assert _request(srv, "POST", "/chat", {"message": "secret", "session_id": "s1", "user_id": "alice"})[0] == 200
+    status, body, _ = _request(srv, "POST", "/chat", {"message": "hi", "session_id": "s1"})
+    assert status == 403 and "reply" not in body
+    # and an anonymous session cannot be claimed by a user afterwards
+    assert _request(srv, "POST", "/chat", {"message": "hi", "session_id": "s2"})[0] == 200
+    assert _request(srv, "POST", "/chat", {"message": "hi", "session_id": "s2", "user_id": "bob"})[0] == 403
+
+
+def test_inflight_limit_rejects_with_retry_after(serve):
+    srv, _ = serve(agent_factory=SlowAgent, max_inflight=1, queue_timeout_s=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(
+        _request(srv, "POST", "/chat", {"message": "one two three", "session_id": f"s{i}"}))) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    statuses = sorted(r[0] for r in results)
+    assert statuses == [200, 503]
+    rejected = next(r for r in results if r[0] == 503)
+    assert rejected[2].getheader("Retry-After") == "1" and srv.stats["rejected"] == 1
+
+
+def test_websocket_streams_tokens_then_done(serve):
+    srv, _ = serve()
+    sock = _ws_connect(srv, "?session_id=abc")
+    assert _ws_recv(sock) == {"type": "session", "session_id": "abc"}
+
+    _ws_send(sock, {"message": "stream me"})
+    frames = []
+    while True:
+        frame = _ws_recv(sock)
+        frames.append(frame)
+        if frame["type"] == "done":
+            break
+    assert [f["text"] for f in frames if f["type"] == "token"] == ["turn1: ", "stream ", "me "]
+    assert frames[-1]["reply"] == "turn1: stream me" and frames[-1]["session_id"] == "abc"
+
+    _ws_send(sock, {"message": "list notes"})
+    chunks = []
+    while (frame := _ws_recv(sock))["type"] != "done":
+        chunks.append(frame["text"])
+    assert chunks == ["1. first", "2. second"]
+    sock.close()
+
+
+def test_stop_drains_inflight_turns(serve):
+    srv, loop = serve(agent_factory=SlowAgent)
+    result = {}
+    t = threading.Thread(target=lambda: result.update(r=_request(srv, "POST", "/chat", {"message": "a b c d"})))
+    t.start()
+    time.sleep(0.1)                         # turn is running
+    started = time.perf_counter()
+    asyncio.run_coroutine_threadsafe(srv.stop(5), loop).result(10)
+    t.join()
+    assert result["r"][0] == 200 and result["r"][1]["reply"] == "turn1: a b c d"
+    assert time.perf_counter() - started >= 0.2 and not srv.ready
+    with pytest.raises(OSError):
+        socket.create_connection(("127.0.0.1", srv.port), timeout=1)
+
+
+def test_token_pipe_blocks_producer_when_full():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    pipe = asyncio.run_coroutine_threadsafe(_make_pipe(loop), loop).result(5)
+    producer = threading.Thread(target=lambda: [pipe.put("token", str(i)) for i in range(3)])
+    producer.start()
+    time.sleep(0.3)
+    assert pipe.queue.qsize() == 1 and producer.is_alive()     # waits for the reader
+    pipe.close()
+    producer.join(2)
+    assert not producer.is_alive()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+async def _make_pipe(loop):
+    return _TokenPipe(loop, 1)
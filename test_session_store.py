@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from agent.context_buffer import ContextBuffer
+from agent.session_store import (
+    DirectorySessionStore, SessionFormatError, SQLiteSessionStore,
+    decode_session, encode_snapshot, encode_state, encode_turns,
+)
+
+
+def _buffer(n, capacity=20):
+    buf = ContextBuffer(capacity)
+    for i in range(n):
+        buf.append("user" if i % 2 == 0 else "assistant", f"turn {i} — ünïcode")
+    return buf
+
+
+def test_snapshot_round_trip():
+    buf = _buffer(6)
+    state = decode_session(encode_snapshot(buf, "last answer", "rag"))
+    assert [str(t) for t in state.turns] == buf.lines()
+    assert state.turns[0].ts == buf[0].ts
+    assert (state.last_answer, state.last_topic) == ("last answer", "rag")
+
+
+def test_replay_keeps_newest_turns_and_ignores_torn_tail():
+    buf = _buffer(30, capacity=30)
+    data = encode_snapshot(buf, "a", "t") + encode_turns(_buffer(1))[:-3]
+    state = decode_session(data, capacity=20)
+    assert len(state.turns) == 20
+    assert state.turns[-1].text == "turn 29 — ünïcode"
+
+
+def test_bad_magic():
+    with pytest.raises(SessionFormatError):
+        decode_session(b"NOPE\x01")
+
+
+@pytest.mark.parametrize("backend", ["dir", "sqlite"])
+def test_incremental_appends(tmp_path, backend):
+    store = DirectorySessionStore(str(tmp_path)) if backend == "dir" else SQLiteSessionStore(str(tmp_path / "s.db"))
+    buf = _buffer(4)
+    store.append("sess-1", encode_turns(buf.last(2)))
+    store.append("sess-1", encode_turns(buf.last(2)) + encode_state("ans", "topic"))
+    assert store.load("missing") is None
+
+    started = time.perf_counter()
+    state = decode_session(store.load("sess-1"))
+    assert time.perf_counter() - started < 0.01
+    assert len(state.turns) == 4 and state.last_answer == "ans"
+
+    store.write("sess-1", encode_snapshot([], "", ""))
+    assert decode_session(store.load("sess-1")).turns == []
+    store.close()
+
+
+def test_torn_tail_is_cut_before_later_appends(tmp_path):
+    store = DirectorySessionStore(str(tmp_path))
+    store.append("s", encode_turns(_buffer(2)))
+    with open(store._path("s"), "ab") as f:
+        f.write(encode_turns(_buffer(1))[:-3])          # crash mid-append
+    assert len(decode_session(store.load("s")).turns) == 2
+    store.append("s", encode_turns(_buffer(1)) + encode_state("after", "crash"))
+    state = decode_session(store.load("s"))
+    assert len(state.turns) == 3 and state.last_answer == "after"
+
+
+def test_corrupt_session_starts_fresh(tmp_path, monkeypatch):
+    import agent.notes_engine as notes_engine
+    from agent.main_agent import MainAgent
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(tmp_path / "memory_store.json"))
+    store = DirectorySessionStore(str(tmp_path / "sessions"))
+    bad = bytearray(encode_snapshot(_buffer(2), "a", "t"))
+    bad[-4:] = b"\xff\xfe\xfd\xfc"                       # invalid utf-8 inside the last record
+    store.write("broken", bytes(bad))
+
+    agent = MainAgent(session_id="broken", session_store=store)
+    assert len(agent.context) == 0
+    agent.planner.decide = lambda q, c="": agent.planner._fallback(q)
+    agent.handle("add task recover")
+    assert len(decode_session(store.load("broken")).turns) == 2      # rewritten as a clean snapshot
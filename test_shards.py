@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.memory.shards import ShardPool
+
+
+@pytest.fixture
+def shared_store(tmp_path, monkeypatch):
+    path = tmp_path / "memory_store.json"
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(path))
+    return path
+
+
+def test_users_write_to_their_own_shard(tmp_path, shared_store):
+    pool = ShardPool(str(tmp_path / "users"))
+    alice, bob = pool.get("alice"), pool.get("bob")
+    alice.tasks.add_task("alice task")
+    alice.notes.add_note_raw("alice note")
+    bob.facts.add_fact("Bob prefers tea")
+
+    a = json.loads((tmp_path / "users" / "alice.json").read_text())
+    b = json.loads((tmp_path / "users" / "bob.json").read_text())
+    assert [t["text"] for t in a["tasks"]] == ["alice task"] and a["facts"] == []
+    assert [f["text"] for f in b["facts"]] == ["Bob prefers tea"] and b["tasks"] == []
+    assert not shared_store.exists()
+    assert pool.get("alice") is alice and pool.stats["hits"] == 1
+    assert pool.path_for("../etc/passwd").startswith(str(tmp_path / "users"))
+
+
+def test_shard_locks_are_independent(tmp_path, shared_store):
+    pool = ShardPool(str(tmp_path / "users"))
+    alice, bob = pool.get("alice"), pool.get("bob")
+    held, release = threading.Event(), threading.Event()
+
+    def hold_alice():
+        with notes_engine.store_lock(alice.path):
+            held.set()
+            release.wait(5)
+
+    t = threading.Thread(target=hold_alice)
+    t.start()
+    held.wait(5)
+    start = time.monotonic()
+    bob.tasks.add_task("not blocked by alice")
+    assert time.monotonic() - start < 1
+    release.set()
+    t.join()
+
+
+def test_lru_and_idle_handles_are_closed_and_reopened(tmp_path, shared_store):
+    pool = ShardPool(str(tmp_path / "users"), max_open=2, idle_s=0.1)
+    first = pool.get("u1")
+    first.tasks.add_task("persisted")
+    pool.get("u2")
+    pool.get("u3")
+    assert len(pool) == 2 and pool.stats["evicted"] == 1
+
+    reopened = pool.get("u1")
+    assert reopened is not first and [t["text"] for t in reopened.tasks.list_tasks()["items"]] == ["persisted"]
+
+    time.sleep(0.15)
+    assert pool.close_idle() == 2 and len(pool) == 0
+
+
+def test_main_agent_uses_the_users_shard(tmp_path, shared_store, monkeypatch):
+    from agent.main_agent import MainAgent
+    monkeypatch.setenv("STORE_SHARDS_DIR", str(tmp_path / "users"))
+    monkeypatch.setenv("STORE_SHARDS_IDLE_S", "0")
+    agent = MainAgent(user_id="carol")
+    agent.planner.decide = lambda q, c="": agent.planner._fallback(q)
+    agent.handle("add task water the plants")
+
+    shard = json.loads((tmp_path / "users" / "carol.json").read_text())
+    assert [t["text"] for t in shard["tasks"]] == ["water the plants"]
+    assert "water the plants" in agent.handle("list tasks")
+
+    # a closed handle is reopened and rebound on the next turn
+    agent.shards.close("carol")
+    assert "water the plants" in agent.handle("list tasks")
+    assert agent.worker.tasks is agent.shards.get("carol").tasks
+    assert not shared_store.exists() or "water" not in shared_store.read_text()
+
+
+def test_session_history_is_keyed_by_user(tmp_path, shared_store, monkeypatch):
+    from agent.main_agent import MainAgent
+    from agent.session_store import DirectorySessionStore
+    monkeypatch.setenv("STORE_SHARDS_DIR", str(tmp_path / "users"))
+    sessions = DirectorySessionStore(str(tmp_path / "sessions"))
+    alice = MainAgent(session_id="s1", session_store=sessions, user_id="alice")
+    alice.planner.decide = lambda q, c="": alice.planner._fallback(q)
+    alice.handle("add task alice only")
+
+    assert len(MainAgent(session_id="s1", session_store=sessions, user_id="alice").context)
+    assert not len(MainAgent(session_id="s1", session_store=sessions, user_id="bob").context)
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent.llm.single_flight import SingleFlight, prompt_key
+
+
+def test_concurrent_identical_calls_share_one_leader():
+    sf = SingleFlight()
+    calls = []
+
+    def slow(prompt):
+        calls.append(prompt)
+        time.sleep(0.05)
+        return prompt.upper()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sf.do("k", slow, "hi"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == ["hi"]
+    assert results == ["HI"] * 8
+    stats = sf.stats()
+    assert stats["leaders"] == 1 and stats["followers"] == 7
+    assert stats["coalescing_ratio"] == pytest.approx(7 / 8)
+
+
+def test_errors_reach_every_waiter():
+    sf = SingleFlight()
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def boom():
+        time.sleep(0.05)
+        raise RuntimeError("provider down")
+
+    def call():
+        barrier.wait()
+        try:
+            sf.do("k", boom)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == ["provider down"] * 4
+
+
+def test_asyncio_mode_coalesces_and_propagates_errors():
+    sf = SingleFlight()
+    calls = 0
+
+    async def answer():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "42"
+
+    async def fail():
+        await asyncio.sleep(0.02)
+        raise ValueError("bad")
+
+    async def main():
+        ok = await asyncio.gather(*(sf.ado("a", answer) for _ in range(5)))
+        bad = await asyncio.gather(*(sf.ado("b", fail) for _ in range(3)), return_exceptions=True)
+        return ok, bad
+
+    ok, bad = asyncio.run(main())
+    assert ok == ["42"] * 5 and calls == 1
+    assert all(isinstance(e, ValueError) for e in bad)
+
+
+def test_prompt_key_depends_on_model_and_prompt():
+    assert prompt_key("gemini", "m", "p") == prompt_key("gemini", "m", "p")
+    assert prompt_key("gemini", "m", "p") != prompt_key("gemini", "m2", "p")
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from agent.llm.usage import tracker
+from agent.speculation import SpeculativeAnswerer
+
+PLAN = {"action": "answer_directly", "input": "what is rust", "context": ""}
+
+
+def _answer(delay=0.05, tokens=(10, 5)):
+    def fn(plan):
+        time.sleep(delay)
+        tracker.record("stub", "stub-model", tokens[0], tokens[1], delay * 1000)
+        return {"status": "ok", "action": "answer_directly", "output": f"answer: {plan['input']}"}
+    return fn
+
+
+def test_hit_returns_speculative_result_and_counts_overlap():
+    spec_ans = SpeculativeAnswerer(_answer(), max_workers=1)
+    spec = spec_ans.start(PLAN)
+    time.sleep(0.03)                       # "planner" runs while the answer is generated
+    result = spec.use(time.perf_counter())
+    assert result["output"] == "answer: what is rust"
+    stats = spec_ans.stats()
+    assert stats["hits"] == 1 and stats["hit_rate"] == 1.0
+    assert stats["saved_ms"] >= 20
+    spec_ans.shutdown()
+
+
+def test_hit_replays_the_answer_to_the_stream_sink():
+    from agent.llm.streaming import stream_scope
+    pieces = []
+    spec_ans = SpeculativeAnswerer(_answer(delay=0), max_workers=1)
+    with stream_scope(pieces.append):
+        spec = spec_ans.start(PLAN)
+        spec.future.result()
+        assert pieces == []                # nothing reaches the client before the plan agrees
+        result = spec.use(time.perf_counter())
+    assert len(pieces) > 1 and "".join(pieces) == result["output"]
+    spec_ans.shutdown()
+
+
+def test_miss_counts_wasted_tokens():
+    spec_ans = SpeculativeAnswerer(_answer(tokens=(40, 2)), max_workers=1)
+    spec = spec_ans.start(PLAN)
+    time.sleep(0.01)
+    spec.discard()
+    spec.future.result()
+    stats = spec_ans.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 0
+    assert stats["wasted_calls"] == 1 and stats["wasted_tokens"] == 42
+    spec_ans.shutdown()
+
+
+def test_queued_speculation_is_cancelled_without_cost():
+    gate = threading.Event()
+    spec_ans = SpeculativeAnswerer(lambda plan: gate.wait(1) and {"status": "ok"}, max_workers=1)
+    busy = spec_ans.start(PLAN)            # occupies the only worker
+    queued = spec_ans.start(PLAN)
+    queued.discard()
+    gate.set()
+    busy.use(time.perf_counter())
+    stats = spec_ans.stats()
+    assert stats["cancelled"] == 1 and stats["wasted_calls"] == 0
+    spec_ans.shutdown()
+
+
+def test_predictor_skips_tool_queries():
+    calls = []
+    spec_ans = SpeculativeAnswerer(lambda plan: calls.append(plan), predict=lambda q: not q.startswith("add"))
+    assert spec_ans.start({"action": "answer_directly", "input": "add task buy milk"}) is None
+    assert spec_ans.stats()["skipped"] == 1 and not calls
+    spec_ans.shutdown()
+
+
+def test_answerers_share_the_pool_and_shutdown_cancels_only_their_own():
+    gate = threading.Event()
+    a = SpeculativeAnswerer(lambda plan: gate.wait(1) and {"status": "ok"}, max_workers=1)
+    b = SpeculativeAnswerer(lambda plan: {"status": "ok", "output": "b"}, max_workers=1)
+    assert a._pool is b._pool
+    busy = a.start(PLAN)
+    while not busy.future.running():
+        time.sleep(0.001)
+    queued = a.start(PLAN)
+    a.shutdown()
+    assert queued.future.cancelled()
+    gate.set()
+    busy.use(time.perf_counter())
+    assert b.start(PLAN).use(time.perf_counter())["output"] == "b"      # the shared pool is still up
@@ -0,0 +1,97 @@
+import io
+import json
+
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.store_transfer import _walk_store, export_jsonl, import_jsonl, iter_records
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = tmp_path / "memory" / "memory_store.json"
+    path.parent.mkdir()
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(path))
+    path.write_text(json.dumps({
+        "notes": [{"id": 1, "text": "Buy milk", "fp": "0"}, {"id": 4, "text": "Call the dentist", "fp": "0"}],
+        "tasks": [{"id": 2, "text": "Renew passport", "status": "pending", "done": False,
+                   "created_at": "2024-01-01T00:00:00", "completed_at": None}],
+        "facts": [{"id": 1, "text": "I prefer tea", "kind": "preference", "created_at": ""}],
+        "task_seq": 7,
+    }, indent=2))
+    return path
+
+
+def test_streaming_reader_survives_tiny_buffers():
+    doc = json.dumps({"notes": [{"id": i, "text": "x" * i} for i in range(20)], "task_seq": 12345, "tasks": []})
+    events = list(_walk_store(io.StringIO(doc), chunk=3))
+    assert [e[2]["id"] for e in events if e[0] == "item"] == list(range(20))
+    assert ("value", "task_seq", 12345) in events and ("start", "tasks") in events
+
+
+def test_export_then_import_remaps_ids_and_dedups(store, tmp_path):
+    out = tmp_path / "backup.jsonl"
+    assert export_jsonl(str(out)) == {"notes": 2, "tasks": 1, "facts": 1}
+    lines = [json.loads(line) for line in out.read_text().splitlines()]
+    assert lines[0]["type"] == "header" and lines[1] == {"type": "note", "record": {"id": 1, "text": "Buy milk", "fp": "0"}}
+
+    # re-importing our own export changes nothing
+    stats = import_jsonl(str(out))
+    assert stats["duplicates"] == 4 and sum(stats["imported"].values()) == 0
+
+    extra = io.StringIO(
+        '{"type": "note", "record": {"id": 1, "text": "Water the plants"}}\n'
+        '{"type": "note", "record": {"id": 2, "text": "  buy   MILK "}}\n'
+        '{"type": "task", "record": {"id": 1, "title": "File taxes", "status": "done"}}\n'
+        '{"type": "fact", "record": {"id": 1, "text": "My birthday is in May"}}\n'
+        'not json\n{"type": "note", "record": {"text": ""}}\n{"type": "bogus"}\n')
+    stats = import_jsonl(extra)
+    assert stats["imported"] == {"notes": 1, "tasks": 1, "facts": 1}
+    assert stats["duplicates"] == 1 and stats["invalid"] == 3
+
+    data = json.loads(store.read_text())
+    assert [n["id"] for n in data["notes"]] == [1, 4, 5] and data["notes"][-1]["fp"] != "0"
+    assert data["tasks"][-1]["id"] == 8 and data["tasks"][-1]["done"] and data["task_seq"] == 8
+    assert data["facts"][-1] == {"id": 2, "text": "My birthday is in May", "kind": data["facts"][-1]["kind"],
+                                 "created_at": ""}
+
+
+def test_import_commits_in_batches_and_reports_progress(store, monkeypatch):
+    import agent.store_transfer as store_transfer
+    scans = []
+    real_scan = store_transfer._scan_store
+    monkeypatch.setattr(store_transfer, "_scan_store", lambda *a: scans.append(a) or real_scan(*a))
+    src = io.StringIO("".join(json.dumps({"type": "note", "record": {"text": f"note number {i}"}}) + "\n"
+                              for i in range(25)))
+    seen = []
+    stats = import_jsonl(src, batch_size=10, progress=seen.append, progress_every=10)
+    assert stats["commits"] == 3 and stats["imported"]["notes"] == 25
+    assert len(scans) == 1          # nobody else wrote: ids carry over, no re-scan per batch
+    assert [s["read"] for s in seen] == [10, 20, 25] and seen[-1]["done"]
+    notes = [r for section, r in iter_records() if section == "notes"]
+    assert len(notes) == 27 and [n["id"] for n in notes][-1] == 29
+
+    # the engines read the streamed rewrite like any other store
+    from agent.notes_engine import NotesEngine
+    assert len(NotesEngine().list_notes()) == 27
+
+
+def test_store_lock_is_released_between_batches(store):
+    import threading
+    from agent.tasks_engine import TasksEngine
+    src = io.StringIO("".join(json.dumps({"type": "task", "record": {"text": f"imported {i}"}}) + "\n"
+                              for i in range(25)))
+    added = []
+
+    def between_batches(stats):
+        if not stats.get("done") and not added:
+            writer = threading.Thread(target=lambda: added.append(TasksEngine(str(store)).add_task("written meanwhile")))
+            writer.start()
+            writer.join(5)
+            assert not writer.is_alive(), "import held the store lock between batches"
+
+    import_jsonl(src, batch_size=10, progress=between_batches, progress_every=10)
+    tasks = json.loads(store.read_text())["tasks"]
+    ids = [t["id"] for t in tasks]
+    assert len(tasks) == 27 and len(set(ids)) == 27          # no id handed out twice
+    assert added[0]["id"] in ids and json.loads(store.read_text())["task_seq"] == max(ids)
@@ -0,0 +1,46 @@
+import pytest
+import requests
+
+from agent.llm.stub_server import StubSettings, parse_latency, start_stub_server
+from agent.llm.openrouter_client import OpenRouterClient
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = start_stub_server(StubSettings(seed=1))
+    monkeypatch.setenv("OPENROUTER_API_KEY", "stub-key")
+    monkeypatch.setenv("OPENROUTER_URL", server.openrouter_url)
+    yield server
+    server.shutdown()
+
+
+def test_openrouter_echo(stub):
+    assert OpenRouterClient().generate("hello stub") == "Echo: hello stub"
+
+
+def test_planner_prompt_gets_json_plan(stub):
+    out = OpenRouterClient().generate("...\nUser: what is rag\nReturn ONLY VALID JSON.\n")
+    assert '"action": "answer_directly"' in out
+
+
+def test_injected_errors_surface_as_client_errors(stub):
+    stub.settings.error_rate = 1.0
+    with pytest.raises(RuntimeError):
+        OpenRouterClient().generate("boom")
+
+
+def test_rate_limit_sends_retry_after(stub):
+    stub.settings.rate_limit_rate = 1.0
+    stub.settings.retry_after = 2
+    resp = requests.post(stub.openrouter_url, json={"messages": []})
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "2"
+
+
+def test_latency_specs():
+    import random
+    rng = random.Random(0)
+    assert parse_latency("fixed:250")(rng) == 0.25
+    assert 0.05 <= parse_latency("uniform:50,60")(rng) <= 0.06
+    with pytest.raises(ValueError):
+        parse_latency("weird:1")
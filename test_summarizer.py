@@ -0,0 +1,61 @@
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.notes_engine import NotesEngine
+from agent.summarizer import IncrementalSummarizer, split_sentences
+
+RAG = ("Retrieval augmented generation combines a retriever with a generator. "
+       "The retriever fetches relevant documents from a vector store. "
+       "The generator conditions on the retrieved documents to produce grounded answers.")
+
+
+def test_split_sentences_handles_bullets_and_newlines():
+    assert split_sentences("- First point here.\n2. Second one! Third?") == ["First point here.", "Second one!", "Third?"]
+
+
+def test_keeps_top_k_in_conversation_order():
+    s = IncrementalSummarizer(k=3)
+    s.add(RAG)
+    s.add("A vector store indexes document embeddings for nearest neighbour search.")
+    s.add("The weather was nice on that particular afternoon, honestly.")
+    text = s.text()
+    assert len(s) == 3
+    assert "weather" not in text
+    assert text.index("retriever fetches") < text.index("vector store indexes")
+
+
+def test_near_repeats_share_one_slot():
+    s = IncrementalSummarizer(k=5)
+    s.add("The retriever fetches relevant documents from a vector store.")
+    s.add("The retriever fetches the relevant documents from the vector store!")
+    assert len(s) == 1
+
+
+def test_term_weight_counts_every_occurrence():
+    s = IncrementalSummarizer(k=5)
+    s.add("Caching helps, and caching again and again means caching wins.")
+    assert s._cf["caching"] == 3 and s._df["caching"] == 1
+    assert s._score({"caching"}) > s._score({"helps"})       # same df, more occurrences
+
+
+def test_skips_short_and_question_sentences_and_caps_words():
+    s = IncrementalSummarizer(k=10, max_words=12)
+    s.add("Yes. Do you want more detail on that topic? " + RAG)
+    assert "detail" not in s.text() and "Yes." not in s.text()
+    assert len(s.text().split()) <= 12
+
+
+def test_work_per_turn_stays_bounded():
+    s = IncrementalSummarizer(k=4)
+    for i in range(3000):
+        s.add(f"Session fact number {i} mentions topic{i % 50} and detail{i % 7} again.")
+    assert len(s) == 4 and len(s._heap) == 4
+
+
+def test_note_all_persists_running_summary(tmp_path, monkeypatch):
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(tmp_path / "store.json"))
+    eng = NotesEngine()
+    s = IncrementalSummarizer()
+    s.add(RAG)
+    assert eng.note_all(None, summary=s.text()) == s.text()
+    assert eng.list_notes()[0]["text"] == s.text()
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.tasks_engine import TasksEngine
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = tmp_path / "memory_store.json"
+    monkeypatch.setattr(notes_engine, "MEM_PATH", str(path))
+    return path
+
+
+def test_ids_are_never_reused_after_delete(store):
+    engine = TasksEngine()
+    a, b = engine.add_task("one"), engine.add_task("two")
+    engine.delete_task(b["id"])
+    c = engine.add_task("three")
+    assert (a["id"], c["id"]) == (1, 3)
+    # counter survives a reload
+    assert TasksEngine().add_task("four")["id"] == 4
+
+
+def test_complete_task_moves_status_and_persists(store):
+    engine = TasksEngine()
+    task = engine.add_task("buy milk")
+    done = engine.complete_task(task["id"])
+    assert done["status"] == "done" and done["done"] and done["completed_at"]
+    assert engine.complete_task(999) is None
+    assert engine.count("pending") == 0 and engine.count("done") == 1
+
+    reloaded = TasksEngine()
+    assert reloaded.get_task(task["id"])["status"] == "done"
+
+
+def test_list_tasks_filters_and_paginates(store):
+    engine = TasksEngine()
+    for i in range(1, 26):
+        engine.add_task(f"task {i}")
+    for i in range(2, 26, 2):
+        engine.complete_task(i)
+
+    page = engine.list_tasks(status="pending", limit=5)
+    assert [t["id"] for t in page["items"]] == [1, 3, 5, 7, 9]
+    assert page["total"] == 13 and page["next_cursor"] == 9
+
+    seen = []
+    cursor = None
+    while True:
+        page = engine.list_tasks(status="pending", limit=5, cursor=cursor)
+        seen += [t["id"] for t in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == list(range(1, 26, 2))
+    assert [t["id"] for t in engine.iter_tasks(status="done", page_size=4)] == list(range(2, 26, 2))
+
+
+def test_pages_follow_deletes_and_date_ranges(store):
+    store.write_text(json.dumps({"notes": [], "tasks": [
+        {"id": i, "text": f"t{i}", "status": "done" if i % 3 == 0 else "pending",
+         "created_at": f"2025-01-{i:02d}T00:00:00"} for i in range(1, 21)]}))
+    engine = TasksEngine()
+    engine.delete_task(4)
+    engine.complete_task(5)
+    assert [t["id"] for t in engine.list_tasks(status="pending", limit=4)["items"]] == [1, 2, 7, 8]
+    assert [t["id"] for t in engine.list_tasks(limit=3, cursor=3)["items"]] == [5, 6, 7]
+
+    # narrow window → scanned by date; wide window → scanned by id
+    narrow = engine.list_tasks(status="done", created_after="2025-01-05", created_before="2025-01-10")
+    assert [t["id"] for t in narrow["items"]] == [5, 6, 9]
+    wide = engine.list_tasks(status="pending", limit=3, cursor=2, created_after="2025-01-02")
+    assert [t["id"] for t in wide["items"]] == [7, 8, 10] and wide["next_cursor"] == 10
+
+
+def test_loads_legacy_task_shapes(store):
+    store.write_text(json.dumps({"notes": [], "tasks": [
+        {"id": 1, "text": "worker style", "done": True},
+        {"id": 2, "title": "tool style", "status": "pending", "created_at": "2025-01-01T00:00:00"},
+    ]}))
+    engine = TasksEngine()
+    assert engine.get_task(1)["status"] == "done"
+    assert engine.get_task(2)["text"] == "tool style"
+    assert engine.add_task("next")["id"] == 3
+    assert json.loads(store.read_text())["notes"] == []
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from agent import tracing
+from agent.tracing import LatencyHistogram, request_scope, span
+
+
+@pytest.fixture
+def traced(tmp_path):
+    trace_file = tmp_path / "trace.jsonl"
+    tracing.configure_tracing(enabled=True, trace_file=str(trace_file))
+    tracing.registry.reset()
+    yield trace_file
+    tracing.configure_tracing(enabled=False, trace_file="", metrics_file="")
+    tracing.registry.reset()
+
+
+def test_histogram_percentiles_are_within_bucket_error():
+    h = LatencyHistogram()
+    for v in range(1, 10_001):
+        h.record(v)
+    assert h.count == 10_000
+    assert abs(h.percentile(50) - 5_000) / 5_000 < 0.04
+    assert abs(h.percentile(99) - 9_900) / 9_900 < 0.04
+    assert h.percentile(100) == 10_000
+
+
+def test_disabled_span_is_shared_noop():
+    tracing.configure_tracing(enabled=False)
+    assert span("plan") is span("execute")
+
+
+def test_spans_record_histograms_and_json_lines(traced):
+    with request_scope("req-1"):
+        with span("plan"):
+            with span("llm", provider="gemini"):
+                pass
+        with span("execute", action="answer_directly"):
+            pass
+
+    stages = {s["stage"] for s in tracing.iter_snapshots()}
+    assert stages == {"plan", "llm", "execute"}
+
+    records = [json.loads(line) for line in traced.read_text().splitlines()]
+    assert all(r["request_id"] == "req-1" for r in records)
+    llm = next(r for r in records if r["stage"] == "llm")
+    assert llm["parent"] == "plan" and llm["provider"] == "gemini"
+
+    text = tracing.export_prometheus()
+    assert 'agent_stage_latency_seconds_count{stage="execute",action="answer_directly"} 1' in text
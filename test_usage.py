@@ -0,0 +1,37 @@
+from agent.llm.usage import PriceTable, UsageTracker, action_scope, session_scope
+
+
+def make_tracker(**kw):
+    prices = PriceTable({"m": {"prompt": 1_000_000, "completion": 2_000_000}})
+    return UsageTracker(prices=prices, usage_file="", **kw)
+
+
+def test_records_are_attributed_to_session_and_action():
+    t = make_tracker()
+    with session_scope("s1"):
+        with action_scope("plan"):
+            t.record("gemini", "m", 10, 2, 5.0)
+        with action_scope("answer_directly"):
+            t.record("openrouter", "m", 4, 8, 15.0)
+
+    s = t.summary("s1")
+    assert s["calls"] == 2
+    assert s["by_action"]["plan"]["prompt_tokens"] == 10
+    assert s["cost_usd"] == 10 + 4 + 2 * (2 + 8)
+    assert set(t.summary()["by_model"]) == {"gemini:m", "openrouter:m"}
+
+
+def test_missing_usage_is_estimated():
+    t = make_tracker()
+    r = t.record("openrouter", "m", None, None, 1.0, prompt="x" * 40, completion="y" * 8)
+    assert r.estimated and r.prompt_tokens == 10 and r.completion_tokens == 2
+
+
+def test_budget_alert_fires_once_per_session():
+    alerts = []
+    t = make_tracker(session_budget_usd=5)
+    t.add_alert_handler(lambda scope, spent, budget: alerts.append(scope))
+    with session_scope("s1"):
+        for _ in range(3):
+            t.record("gemini", "m", 3, 0, 1.0)
+    assert alerts == ["s1"]
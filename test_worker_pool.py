@@ -0,0 +1,80 @@
+import multiprocessing as mp
+import os
+import time
+
+import pytest
+
+import agent.notes_engine as notes_engine
+from agent.tasks_engine import TasksEngine
+from agent.worker_pool import WorkerCrashed, WorkerPool
+
+
+class EchoAgent:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.turns = 0
+
+    def handle(self, message, request_id=None):
+        self.turns += 1
+        if message == "crash":
+            os._exit(3)
+        if message == "slow":
+            time.sleep(0.3)
+        return f"{os.getpid()}:{self.session_id}:{self.turns}:{message}"
+
+
+def echo_factory(session_id):
+    return EchoAgent(session_id)
+
+
+@pytest.fixture
+def pool():
+    p = WorkerPool(workers=2, agent_factory=echo_factory)
+    yield p
+    p.close()
+
+
+def test_sessions_stick_to_one_worker(pool):
+    replies = [pool.handle(f"s{i % 4}", "hi", timeout=30) for i in range(8)]
+    by_session = {}
+    for r in replies:
+        pid, sid, turns, _ = r.split(":")
+        by_session.setdefault(sid, set()).add(pid)
+    assert all(len(pids) == 1 for pids in by_session.values())
+    # the session's agent lives on: turn counter keeps growing in its worker
+    assert pool.handle("s0", "again", timeout=30).split(":")[2] == "3"
+    assert len(set(pool.pids())) == 2
+
+
+def test_crashed_worker_is_restarted(pool):
+    sid = "crashy"
+    before = pool.pids()[pool.worker_for(sid)]
+    with pytest.raises(WorkerCrashed):
+        pool.handle(sid, "crash", timeout=30)
+    deadline = time.time() + 10
+    while pool.stats["restarts"] == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    after = pool.pids()[pool.worker_for(sid)]
+    assert after != before and pool.stats["restarts"] == 1
+    assert pool.handle(sid, "hello", timeout=30).endswith(":1:hello")   # fresh agent
+
+
+def _add_tasks(path, n):
+    notes_engine.MEM_PATH = path
+    eng = TasksEngine()
+    for i in range(n):
+        eng.add_task(f"task {os.getpid()}-{i}")
+
+
+def test_store_writes_from_processes_are_not_lost(tmp_path, monkeypatch):
+    path = str(tmp_path / "memory_store.json")
+    monkeypatch.setattr(notes_engine, "MEM_PATH", path)
+    ctx = mp.get_context("spawn")
+    procs = [ctx.Process(target=_add_tasks, args=(path, 15)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+    eng = TasksEngine()
+    assert eng.count() == 45
+    assert sorted(t["id"] for t in eng.iter_tasks()) == list(range(1, 46))